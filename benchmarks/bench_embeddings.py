@@ -0,0 +1,121 @@
+"""Compare embedding backends on throughput and retrieval recall.
+
+Usage:
+    python -m benchmarks.bench_embeddings --limit 1000 --batch-size 64 --threads 4
+
+The corpus is read from the existing Chroma collection in tax_guides_db. The
+torch backend is the reference: recall@k is the overlap between each
+candidate's top-k chunks and the reference top-k for the same query.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import chromadb
+import numpy as np
+
+from embeddings import DEFAULT_EMBEDDING_MODEL, create_embeddings
+
+QUERIES = [
+    "box 12 code DD cost of employer-sponsored health coverage",
+    "Form 1099-B wash sale loss disallowed",
+    "standard deduction for married filing jointly",
+    "social security wage base and tax rate",
+    "when is nonemployee compensation reported on Form 1099-NEC",
+    "qualified dividends tax rate",
+    "early withdrawal penalty on savings interest",
+    "taxable amount of a retirement plan distribution",
+    "dependent care benefits exclusion limit",
+    "self-employment tax on freelance income",
+]
+
+
+def load_corpus(persist_directory: str, limit: int) -> List[str]:
+    client = chromadb.PersistentClient(path=persist_directory)
+    collection = client.get_collection("langchain")
+    return collection.get(limit=limit, include=["documents"])["documents"]
+
+
+def run_backend(backend: str, corpus: List[str], batch_size: int, threads: int) -> Dict:
+    load_start = time.perf_counter()
+    embeddings = create_embeddings(
+        DEFAULT_EMBEDDING_MODEL, backend=backend, batch_size=batch_size, threads=threads
+    )
+    load_seconds = time.perf_counter() - load_start
+
+    # Warm up so one-time graph/session setup is not counted
+    embeddings.embed_documents(corpus[:batch_size])
+
+    start = time.perf_counter()
+    doc_vectors = np.asarray(embeddings.embed_documents(corpus), dtype=np.float32)
+    ingest_seconds = time.perf_counter() - start
+
+    query_times = []
+    query_vectors = []
+    for query in QUERIES:
+        start = time.perf_counter()
+        query_vectors.append(embeddings.embed_query(query))
+        query_times.append(time.perf_counter() - start)
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 3),
+        "docs_per_second": round(len(corpus) / ingest_seconds, 1),
+        "query_ms_p50": round(float(np.percentile(query_times, 50)) * 1000, 2),
+        "query_ms_p95": round(float(np.percentile(query_times, 95)) * 1000, 2),
+        "doc_vectors": doc_vectors,
+        "query_vectors": np.asarray(query_vectors, dtype=np.float32),
+    }
+
+
+def top_k(doc_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall(reference_top: np.ndarray, candidate_top: np.ndarray, k: int) -> float:
+    return float(np.mean([
+        len(set(ref) & set(cand)) / k
+        for ref, cand in zip(reference_top, candidate_top)
+    ]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--persist-directory", default="tax_guides_db")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--backends", default="torch,onnx")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.persist_directory, args.limit)
+    backends = args.backends.split(",")
+    if backends[0] != "torch":
+        backends.insert(0, "torch")
+
+    results = [run_backend(b, corpus, args.batch_size, args.threads) for b in backends]
+    reference = results[0]
+    reference_top = top_k(reference["doc_vectors"], reference["query_vectors"], args.k)
+
+    report = {"corpus_size": len(corpus), "k": args.k, "backends": []}
+    for result in results:
+        # Candidate queries against the existing (torch-built) collection, and
+        # against a collection re-embedded with the candidate backend
+        existing_top = top_k(reference["doc_vectors"], result["query_vectors"], args.k)
+        own_top = top_k(result["doc_vectors"], result["query_vectors"], args.k)
+        # Cosine agreement between candidate and reference document vectors
+        agreement = np.mean(np.sum(result["doc_vectors"] * reference["doc_vectors"], axis=1))
+        entry = {key: value for key, value in result.items() if not key.endswith("_vectors")}
+        entry["recall_at_k_existing_index"] = round(recall(reference_top, existing_top, args.k), 3)
+        entry["recall_at_k_reembedded_index"] = round(recall(reference_top, own_top, args.k), 3)
+        entry["mean_cosine_vs_torch"] = round(float(agreement), 4)
+        report["backends"].append(entry)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Time each stage of the form parsing pipeline on synthetic W-2/1099 documents.
+
+Usage:
+    python -m benchmarks.bench_stages                       # compare against the baseline
+    python -m benchmarks.bench_stages --save-baseline       # record a new baseline
+    python -m benchmarks.bench_stages --stages rasterize,preprocess,register,crop,ocr,rag,llm
+
+Documents come from benchmarks/synthetic_forms.py, so every run scores the
+box extractor field by field against known ground truth. The "pipeline",
+"rag" and "llm" stages are opt-in: "pipeline" times the tiered
+extract_fields_from_pdf end to end on PDF cases, "rag" needs a built
+tax_guides_db, and "llm" runs main.process_with_claude with a stubbed
+Anthropic client so only prompt assembly and response parsing are timed. A stage whose median is more than
+--tolerance slower than the baseline (and at least --min-ms slower), or a case
+whose accuracy drops by more than --accuracy-drop, is reported as a regression
+and the script exits with status 1.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from PIL import Image
+
+from benchmarks.synthetic_forms import make_document, save_image, save_pdf
+from box_extraction import (
+    LAYOUT_DPI, crop_boxes, extract_fields_from_pdf, locate_page, ocr_boxes, parse_fields,
+    preprocess_page, rasterize_pdf, scale_boxes
+)
+from form_schemas import CHECKBOX_FIELDS, MONEY_FIELDS, get_form_boxes, parse_money_cents
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "stages.json"
+
+DEFAULT_STAGES = ("rasterize", "preprocess", "register", "crop", "ocr")
+ALL_STAGES = DEFAULT_STAGES + ("pipeline", "rag", "llm")
+
+CASES = [
+    {"form_type": "W-2", "input": "pdf", "pages": 1, "dpi": 200, "noise": 0.0},
+    {"form_type": "W-2", "input": "pdf", "pages": 3, "dpi": 200, "noise": 0.0},
+    {"form_type": "W-2", "input": "pdf", "pages": 1, "dpi": 300, "noise": 0.5},
+    {"form_type": "W-2", "input": "image", "pages": 1, "dpi": 150, "noise": 1.0},
+    {"form_type": "1099-NEC", "input": "pdf", "pages": 1, "dpi": 200, "noise": 0.0},
+    {"form_type": "1099-INT", "input": "pdf", "pages": 2, "dpi": 300, "noise": 0.5},
+    {"form_type": "1099-DIV", "input": "image", "pages": 1, "dpi": 200, "noise": 0.5},
+    {"form_type": "1099-MISC", "input": "pdf", "pages": 1, "dpi": 150, "noise": 1.0},
+    {"form_type": "1099-B", "input": "pdf", "pages": 1, "dpi": 200, "noise": 0.0},
+    {"form_type": "1099-R", "input": "image", "pages": 1, "dpi": 300, "noise": 0.0},
+]
+
+
+def case_id(case: Dict) -> str:
+    return f"{case['form_type']}-{case['input']}-p{case['pages']}-dpi{case['dpi']}-n{case['noise']}"
+
+
+def _normalize(value) -> str:
+    return " ".join(str(value).split()).lower()
+
+
+def field_matches(field: str, expected, actual) -> bool:
+    if field in CHECKBOX_FIELDS:
+        return bool(actual) == bool(expected)
+    if field in MONEY_FIELDS:
+        return parse_money_cents(actual) == parse_money_cents(expected)
+    return _normalize(actual) == _normalize(expected)
+
+
+def field_accuracy(expected: Dict, actual: Dict) -> Dict:
+    misses = [field for field in expected if not field_matches(field, expected[field], actual.get(field, ""))]
+    total = len(expected)
+    return {
+        "fields": total,
+        "correct": total - len(misses),
+        "accuracy": round((total - len(misses)) / total, 4) if total else 1.0,
+        "misses": misses
+    }
+
+
+def _timed(samples: List[float], fn: Callable, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def _summary(samples: List[float]) -> Dict:
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "min_ms": round(ordered[0], 3)
+    }
+
+
+class _StubMessages:
+    def __init__(self, response_text: str):
+        self.response_text = response_text
+
+    def create(self, **kwargs):
+        block = type("TextBlock", (), {"text": self.response_text})()
+        return type("Message", (), {"content": [block]})()
+
+
+class StubAnthropicClient:
+    """Stands in for anthropic.Anthropic and answers with a fixed JSON body."""
+
+    def __init__(self, response: Dict):
+        self.messages = _StubMessages(json.dumps(response))
+
+
+def load_pages(path: str, case: Dict) -> List[Image.Image]:
+    """The rasterize stage: render a PDF, or decode a scanned image."""
+    if case["input"] == "pdf":
+        return rasterize_pdf(path)
+    with Image.open(path) as image:
+        image.load()
+        return [image.copy()]
+
+
+def run_case(case: Dict, stages: List[str], repeats: int, work_dir: str) -> Dict:
+    form_type = case["form_type"]
+    images, truth = make_document(form_type, case["pages"], case["dpi"], case["noise"])
+    if case["input"] == "pdf":
+        path = os.path.join(work_dir, f"{case_id(case)}.pdf")
+        save_pdf(images, path, case["dpi"])
+    else:
+        # Scanned images carry one page
+        path = os.path.join(work_dir, f"{case_id(case)}.png")
+        save_image(images, path)
+
+    # PDFs are rendered at the layout resolution; images keep their scan resolution
+    dpi = LAYOUT_DPI if case["input"] == "pdf" else case["dpi"]
+    boxes = scale_boxes(get_form_boxes(form_type), dpi)
+    samples = {stage: [] for stage in stages}
+    fields = {}
+    for _ in range(repeats):
+        pages = _timed(samples["rasterize"], load_pages, path, case) if "rasterize" in samples else load_pages(path, case)
+        fields = {}
+        for page in pages:
+            if "preprocess" in samples:
+                page = _timed(samples["preprocess"], preprocess_page, page)
+            else:
+                page = preprocess_page(page)
+            crop_args = (page, boxes)
+            if "register" in samples:
+                # Registered pages are cropped through the transform from layout coordinates
+                transform = _timed(samples["register"], locate_page, page, form_type, dpi)
+                crop_args = (page, get_form_boxes(form_type), transform)
+            crops = _timed(samples["crop"], crop_boxes, *crop_args) if "crop" in samples else crop_boxes(*crop_args)
+            if "ocr" in samples:
+                fields.update(_timed(samples["ocr"], lambda c: parse_fields(ocr_boxes(c)[0]), crops))
+    # Page-level stages were sampled per page; report per-document totals instead
+    for stage in ("preprocess", "register", "crop", "ocr"):
+        if stage in samples and case["pages"] > 1:
+            per_page = samples[stage]
+            samples[stage] = [sum(per_page[i:i + case["pages"]]) for i in range(0, len(per_page), case["pages"])]
+
+    result = {"case": case}
+    if "ocr" in samples:
+        result["accuracy"] = field_accuracy(truth, fields)
+    if "pipeline" in samples and case["input"] == "pdf":
+        # End-to-end tiered extraction (low-DPI pass plus selective high-DPI retries)
+        for _ in range(repeats):
+            pipeline_fields = _timed(samples["pipeline"], extract_fields_from_pdf, path, form_type)
+        result["pipeline_accuracy"] = field_accuracy(truth, pipeline_fields)
+
+    ocr_text = "\n".join(f"{field}: {value}" for field, value in (fields or truth).items())
+    if "rag" in samples:
+        from rag_handler import rag_handler
+        for _ in range(repeats):
+            # Clear caches so every sample measures a real retrieval
+            rag_handler.result_cache.clear()
+            rag_handler.embedding_cache.clear()
+            _timed(samples["rag"], rag_handler.get_relevant_context, ocr_text)
+    if "llm" in samples:
+        import main
+        original_client = main.client
+        main.client = StubAnthropicClient(dict(truth, form_type=form_type))
+        try:
+            for _ in range(repeats):
+                _timed(samples["llm"], main.process_with_claude, ocr_text, form_type)
+        finally:
+            main.client = original_client
+
+    result["stages"] = {stage: _summary(values) for stage, values in samples.items() if values}
+    return result
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float, min_ms: float, accuracy_drop: float) -> List[str]:
+    """List human-readable regressions of ``report`` against ``baseline``."""
+    regressions = []
+    for name, current in report["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if not previous:
+            continue
+        for stage, timing in current["stages"].items():
+            before = previous.get("stages", {}).get(stage)
+            if not before:
+                continue
+            slower = timing["median_ms"] - before["median_ms"]
+            if slower > min_ms and timing["median_ms"] > before["median_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"{name} {stage}: {before['median_ms']}ms -> {timing['median_ms']}ms"
+                )
+        if "accuracy" in current and "accuracy" in previous:
+            before, after = previous["accuracy"]["accuracy"], current["accuracy"]["accuracy"]
+            if before - after > accuracy_drop:
+                regressions.append(f"{name} accuracy: {before} -> {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", default=",".join(DEFAULT_STAGES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--forms", default="", help="Comma-separated form types to run (default: all)")
+    parser.add_argument("--output", default="", help="Also write the report to this path")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-ms", type=float, default=5.0)
+    parser.add_argument("--accuracy-drop", type=float, default=0.02)
+    args = parser.parse_args()
+    if args.repeats < 1:
+        parser.error("--repeats must be at least 1")
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in ALL_STAGES]
+    if unknown:
+        parser.error(f"Unknown stage: {', '.join(unknown)}")
+    forms = {form.strip().upper() for form in args.forms.split(",") if form.strip()}
+    cases = [case for case in CASES if not forms or case["form_type"] in forms]
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "stages": stages,
+        "repeats": args.repeats,
+        "cases": {}
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        for case in cases:
+            result = run_case(case, stages, args.repeats, work_dir)
+            report["cases"][case_id(case)] = result
+            timings = ", ".join(f"{stage} {t['median_ms']}ms" for stage, t in result["stages"].items())
+            accuracy = f" accuracy {result['accuracy']['accuracy']}" if "accuracy" in result else ""
+            print(f"{case_id(case)}: {timings}{accuracy}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(report, indent=2))
+        print(f"Saved baseline to {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+        return
+
+    regressions = compare(
+        report, json.loads(baseline_path.read_text()), args.tolerance, args.min_ms, args.accuracy_drop
+    )
+    if regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        raise SystemExit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
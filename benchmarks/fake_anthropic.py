@@ -0,0 +1,212 @@
+"""Local stand-in for the Anthropic Messages API, for load testing without real Claude calls.
+
+Usage:
+    python -m benchmarks.fake_anthropic --port 8088 --latency-ms 800 --jitter 0.5 \\
+        --error-rate 0.01 --rate-limit-rate 0.02 --rpm 600
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8088 ANTHROPIC_API_KEY=fake uvicorn main:app
+
+POST /v1/messages answers after a log-normally distributed delay (median
+--latency-ms, shape --jitter). Extraction prompts get a JSON object with the
+fields of the form type named in the OCR text; other prompts get a short HTML
+answer. Requests with "stream": true receive the same text as server-sent
+events, one delta every --stream-chunk-ms. A fraction of requests fail with
+529 overloaded errors (--error-rate) or 429 rate-limit errors
+(--rate-limit-rate), and --rpm caps the sustained request rate with a token
+bucket that also answers 429 with a retry-after header.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from form_schemas import CHECKBOX_FIELDS, FORM_BOXES, MONEY_FIELDS, form_fields
+
+GUIDANCE_TEXT = (
+    "<h3>Summary</h3><p>Based on the forms you uploaded, your total wages are "
+    "<strong>$52,340.00</strong> and federal income tax withheld is "
+    "<strong>$6,120.00</strong>.</p><ul><li>File by April 15, 2025.</li>"
+    "<li>Keep copies of every W-2 and 1099.</li></ul>"
+)
+
+
+class FakeAnthropicSettings:
+    def __init__(self, latency_ms: float = 800.0, jitter: float = 0.5, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, rpm: int = 0, stream_chunk_ms: float = 20.0,
+                 seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.stream_chunk_ms = stream_chunk_ms
+        self.rng = random.Random(seed)
+
+
+class TokenBucket:
+    """Allows ``rate_per_minute`` requests per minute with bursts up to the same size."""
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token; returns 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def _error(status: int, error_type: str, message: str, headers: Dict = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status,
+        content={"type": "error", "error": {"type": error_type, "message": message}},
+        headers=headers
+    )
+
+
+def _prompt_text(body: Dict) -> str:
+    parts = []
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get("text", "") for block in content if isinstance(block, dict))
+    return "\n".join(parts)
+
+
+def response_text(prompt: str) -> str:
+    """A plausible reply: form JSON for extraction prompts, HTML advice otherwise."""
+    if "tax document parser" not in prompt:
+        return GUIDANCE_TEXT
+    ocr_text = prompt.rsplit("Here is the OCR text to process:", 1)[-1]
+    form_type = next((name for name in FORM_BOXES if name in ocr_text), "W-2")
+    values = {"form_type": form_type}
+    for field in form_fields(form_type):
+        if field in CHECKBOX_FIELDS:
+            values[field] = False
+        elif field in MONEY_FIELDS:
+            values[field] = "1,234.56"
+        else:
+            values[field] = "SAMPLE"
+    return json.dumps(values, indent=2)
+
+
+def _usage(prompt: str, text: str) -> Dict:
+    # Roughly four characters per token, like the context assembler's estimate
+    return {"input_tokens": max(1, len(prompt) // 4), "output_tokens": max(1, len(text) // 4)}
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def create_app(settings: FakeAnthropicSettings) -> FastAPI:
+    app = FastAPI(title="Fake Anthropic API")
+    bucket = TokenBucket(settings.rpm) if settings.rpm else None
+    stats = {"requests": 0, "rate_limited": 0, "errors": 0, "streams": 0}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/messages")
+    async def create_message(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        rng = settings.rng
+
+        retry_after = bucket.take() if bucket else 0.0
+        if retry_after or rng.random() < settings.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return _error(429, "rate_limit_error", "Number of requests has exceeded your rate limit",
+                          {"retry-after": str(max(1, round(retry_after)))})
+
+        delay = settings.latency_ms * rng.lognormvariate(0, settings.jitter) / 1000
+        if rng.random() < settings.error_rate:
+            await asyncio.sleep(delay / 2)
+            stats["errors"] += 1
+            return _error(529, "overloaded_error", "Overloaded")
+
+        prompt = _prompt_text(body)
+        text = response_text(prompt)
+        usage = _usage(prompt, text)
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake-model"),
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": usage
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(delay)
+            return dict(message, content=[{"type": "text", "text": text}])
+
+        stats["streams"] += 1
+
+        async def events():
+            # Time to first token is the sampled delay; the text then trickles out
+            await asyncio.sleep(delay)
+            start = dict(message, content=[], stop_reason=None, usage=dict(usage, output_tokens=1))
+            yield _sse("message_start", {"type": "message_start", "message": start})
+            yield _sse("content_block_start", {
+                "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+            })
+            for offset in range(0, len(text), 40):
+                await asyncio.sleep(settings.stream_chunk_ms / 1000)
+                yield _sse("content_block_delta", {
+                    "type": "content_block_delta", "index": 0,
+                    "delta": {"type": "text_delta", "text": text[offset:offset + 40]}
+                })
+            yield _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield _sse("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": usage["output_tokens"]}
+            })
+            yield _sse("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Median response latency")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Log-normal shape (0 = constant)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0, help="Sustained requests per minute (0 = unlimited)")
+    parser.add_argument("--stream-chunk-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = FakeAnthropicSettings(
+        latency_ms=args.latency_ms, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, rpm=args.rpm,
+        stream_chunk_ms=args.stream_chunk_ms, seed=args.seed
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Drive mixed upload/chat traffic at a running app and report latency and event-loop lag.
+
+Usage:
+    python -m benchmarks.fake_anthropic --latency-ms 800 &
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8088 ANTHROPIC_API_KEY=fake uvicorn main:app &
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --duration 60 --concurrency 16
+
+Each virtual user loops for --duration seconds, sending either an upload to
+/parse-tax-form (a synthetic PDF or scanned image) or a question to
+/tax-guidance, mixed by --upload-ratio. A separate probe polls /healthz every
+--probe-interval-ms on its own connection; since the handler does no work, its
+latency above the idle baseline is time the app's event loop spent blocked.
+Each probe is attributed to the endpoints that had requests in flight, which
+gives a per-endpoint view of which traffic stalls the loop.
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.synthetic_forms import make_document, save_pdf
+
+QUESTIONS = [
+    "What is my total income from all uploaded forms?",
+    "How much federal tax was withheld this year?",
+    "Do I need to pay estimated taxes on my 1099-NEC income?",
+    "Which deductions should I consider for 2024?",
+    "When is the filing deadline and how do I request an extension?",
+]
+
+FORM_TYPES = ("W-2", "1099-NEC", "1099-INT")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def latency_summary(values: List[float]) -> Dict:
+    return {
+        "p50_ms": round(percentile(values, 50), 1),
+        "p95_ms": round(percentile(values, 95), 1),
+        "p99_ms": round(percentile(values, 99), 1),
+        "max_ms": round(max(values), 1) if values else 0.0
+    }
+
+
+def build_uploads(form_types: List[str]) -> List[Dict]:
+    """Synthetic PDF and PNG uploads rendered once up front."""
+    uploads = []
+    for form_type in form_types:
+        images, _ = make_document(form_type, pages=1, noise=0.3)
+        pdf = io.BytesIO()
+        save_pdf(images, pdf, 200)
+        png = io.BytesIO()
+        images[0].convert("RGB").save(png, format="PNG")
+        uploads.append({"form_type": form_type, "filename": "form.pdf",
+                        "content": pdf.getvalue(), "content_type": "application/pdf"})
+        uploads.append({"form_type": form_type, "filename": "form.png",
+                        "content": png.getvalue(), "content_type": "image/png"})
+    return uploads
+
+
+class LoadTest:
+    def __init__(self, url: str, duration: float, concurrency: int, upload_ratio: float,
+                 probe_interval_ms: float, timeout: float, form_types: List[str], seed: int = 0):
+        self.url = url.rstrip("/")
+        self.duration = duration
+        self.concurrency = concurrency
+        self.upload_ratio = upload_ratio
+        self.probe_interval = probe_interval_ms / 1000
+        self.timeout = timeout
+        self.uploads = build_uploads(form_types)
+        self.rng = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.in_flight: Counter = Counter()
+        self.probes: List[Dict] = []
+
+    async def _request(self, client: httpx.AsyncClient, endpoint: str, **kwargs):
+        self.in_flight[endpoint] += 1
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{self.url}{endpoint}", **kwargs)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        finally:
+            self.in_flight[endpoint] -= 1
+        self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+        self.statuses[endpoint][status] += 1
+
+    async def _user(self, user_id: int, deadline: float):
+        conversation_id = f"load-{user_id}-{uuid.uuid4().hex[:8]}"
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            turns = 0
+            while time.perf_counter() < deadline:
+                if self.rng.random() < self.upload_ratio:
+                    upload = self.rng.choice(self.uploads)
+                    await self._request(
+                        client, "/parse-tax-form",
+                        params={"form_type": upload["form_type"], "conversation_id": conversation_id},
+                        files={"file": (upload["filename"], upload["content"], upload["content_type"])}
+                    )
+                else:
+                    await self._request(
+                        client, "/tax-guidance",
+                        json={"message": self.rng.choice(QUESTIONS), "conversation_id": conversation_id}
+                    )
+                    turns += 1
+                    # Start a new conversation every few turns so prompts stay a realistic size
+                    if turns % 5 == 0:
+                        conversation_id = f"load-{user_id}-{uuid.uuid4().hex[:8]}"
+
+    async def _probe_once(self, client: httpx.AsyncClient) -> float:
+        start = time.perf_counter()
+        await client.get(f"{self.url}/healthz")
+        return (time.perf_counter() - start) * 1000
+
+    async def _probe(self, deadline: float, idle_ms: float):
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            while time.perf_counter() < deadline:
+                active = [endpoint for endpoint, count in self.in_flight.items() if count > 0]
+                try:
+                    latency = await self._probe_once(client)
+                except httpx.HTTPError:
+                    latency = self.timeout * 1000
+                self.probes.append({"lag_ms": max(0.0, latency - idle_ms), "active": active})
+                await asyncio.sleep(self.probe_interval)
+
+    async def run(self) -> Dict:
+        # Idle probe latency is the network/handler floor subtracted from every sample
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            idle = [await self._probe_once(client) for _ in range(20)]
+        idle_ms = percentile(idle, 50)
+
+        start = time.perf_counter()
+        deadline = start + self.duration
+        await asyncio.gather(
+            self._probe(deadline, idle_ms),
+            *(self._user(user_id, deadline) for user_id in range(self.concurrency))
+        )
+        elapsed = time.perf_counter() - start
+
+        lags = [probe["lag_ms"] for probe in self.probes]
+        report = {
+            "url": self.url,
+            "duration_s": round(elapsed, 1),
+            "concurrency": self.concurrency,
+            "upload_ratio": self.upload_ratio,
+            "requests": sum(len(values) for values in self.latencies.values()),
+            "throughput_rps": round(sum(len(values) for values in self.latencies.values()) / elapsed, 2),
+            "idle_probe_ms": round(idle_ms, 2),
+            "event_loop_lag": latency_summary(lags),
+            "endpoints": {}
+        }
+        for endpoint, values in self.latencies.items():
+            endpoint_lags = [probe["lag_ms"] for probe in self.probes if endpoint in probe["active"]]
+            report["endpoints"][endpoint] = {
+                "requests": len(values),
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "statuses": dict(self.statuses[endpoint]),
+                "latency": latency_summary(values),
+                "event_loop_lag_while_in_flight": latency_summary(endpoint_lags)
+            }
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--upload-ratio", type=float, default=0.3)
+    parser.add_argument("--probe-interval-ms", type=float, default=100.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--forms", default=",".join(FORM_TYPES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="", help="Also write the report to this path")
+    args = parser.parse_args()
+
+    load_test = LoadTest(
+        args.url, args.duration, args.concurrency, args.upload_ratio, args.probe_interval_ms,
+        args.timeout, [form.strip() for form in args.forms.split(",") if form.strip()], args.seed
+    )
+    report = asyncio.run(load_test.run())
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
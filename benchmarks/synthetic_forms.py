@@ -0,0 +1,104 @@
+"""Synthetic filled W-2 and 1099 documents with known ground truth.
+
+Values are drawn into the box regions from form_schemas.FORM_BOXES on a
+letter-size page laid out at LAYOUT_DPI, so the box extractor's output can be
+scored field by field. Pages can be "scanned" at other DPIs and degraded with
+noise, blur and a slight rotation.
+"""
+import random
+from typing import Dict, List, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from box_extraction import LAYOUT_DPI
+from form_schemas import CHECKBOX_FIELDS, MONEY_FIELDS, form_fields, get_form_boxes
+
+# Letter-size page at the layout resolution
+PAGE_SIZE = (int(8.5 * LAYOUT_DPI), int(11 * LAYOUT_DPI))
+
+STATES = ["CA", "NY", "TX", "WA", "IL", "MA"]
+NAMES = ["Acme Payroll Inc", "Jordan Lee", "Northwind Bank", "Sam Rivera", "Contoso LLC"]
+
+
+def _font(size: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size=size)
+        except TypeError:
+            # Pillow < 10.1 only ships a fixed-size bitmap font
+            return ImageFont.load_default()
+
+
+def ground_truth(form_type: str, seed: int = 0) -> Dict:
+    """Deterministic random field values for a form type."""
+    rng = random.Random(f"{form_type}-{seed}")
+    values = {}
+    for field in form_fields(form_type):
+        if field in CHECKBOX_FIELDS:
+            values[field] = rng.random() < 0.5
+        elif field in MONEY_FIELDS:
+            values[field] = f"{rng.randint(0, 120000):,}.{rng.randint(0, 99):02d}"
+        elif field.endswith("ssn") or field.endswith("tin"):
+            values[field] = f"{rng.randint(100, 899)}-{rng.randint(10, 99)}-{rng.randint(1000, 9999)}"
+        elif field.endswith("ein"):
+            values[field] = f"{rng.randint(10, 99)}-{rng.randint(1000000, 9999999)}"
+        elif field == "state":
+            values[field] = rng.choice(STATES)
+        elif field.startswith("date"):
+            values[field] = f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024"
+        else:
+            values[field] = rng.choice(NAMES)
+    return values
+
+
+def render_page(form_type: str, values: Dict) -> Image.Image:
+    """Draw values into their boxes on a blank page at the layout resolution."""
+    page = Image.new("L", PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(page)
+    for field, (x, y, width, height) in get_form_boxes(form_type).items():
+        draw.rectangle((x - 4, y - 4, x + width + 4, y + height + 4), outline=120)
+        value = values[field]
+        if field in CHECKBOX_FIELDS:
+            if value:
+                draw.text((x + 6, y + 2), "X", fill=0, font=_font(height - 6))
+        else:
+            draw.text((x + 4, y + 4), str(value), fill=0, font=_font(min(height - 8, 22)))
+    return page
+
+
+def degrade(page: Image.Image, dpi: int, noise: float, seed: int = 0) -> Image.Image:
+    """Simulate a scan at ``dpi`` with ``noise`` in [0, 1] (speckle, blur, skew)."""
+    rng = random.Random(seed)
+    if dpi != LAYOUT_DPI:
+        scale = dpi / LAYOUT_DPI
+        page = page.resize((int(page.width * scale), int(page.height * scale)), Image.BILINEAR)
+    if noise <= 0:
+        return page
+    page = page.rotate(rng.uniform(-noise, noise), fillcolor=255)
+    page = page.filter(ImageFilter.GaussianBlur(radius=noise))
+    pixels = page.load()
+    for _ in range(int(page.width * page.height * noise * 0.01)):
+        x, y = rng.randrange(page.width), rng.randrange(page.height)
+        pixels[x, y] = 0 if pixels[x, y] > 127 else 255
+    return page
+
+
+def make_document(form_type: str, pages: int = 1, dpi: int = LAYOUT_DPI,
+                  noise: float = 0.0, seed: int = 0) -> Tuple[List[Image.Image], Dict]:
+    """Return scanned page images and the ground truth of the last page."""
+    images, values = [], {}
+    for page_number in range(pages):
+        values = ground_truth(form_type, seed + page_number)
+        images.append(degrade(render_page(form_type, values), dpi, noise, seed + page_number))
+    return images, values
+
+
+def save_pdf(images: List[Image.Image], path: str, dpi: int):
+    """Save page images as a PDF whose pages rasterize back to the layout size."""
+    images[0].save(path, format="PDF", save_all=True, append_images=images[1:], resolution=dpi)
+
+
+def save_image(images: List[Image.Image], path: str):
+    images[0].convert("RGB").save(path)
@@ -0,0 +1,117 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+# Keeps form and box identifiers such as "1099-b", "w-2" or "12a" intact
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "if", "in",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "with",
+    "you", "your", "what", "how", "do", "does", "i", "my"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; hyphenated terms also contribute their parts."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "-" in token:
+            tokens.extend(part for part in token.split("-") if part not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring over guide chunks.
+
+    Postings map each term to ``{chunk_id: term_frequency}``. The whole index,
+    including postings, is persisted as JSON so loading it does not re-tokenize
+    the corpus.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, Dict] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "r") as f:
+            data = json.load(f)
+        self.docs = data["docs"]
+        self.postings = data["postings"]
+        self.total_length = sum(doc["length"] for doc in self.docs.values())
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"docs": self.docs, "postings": self.postings}, f)
+        os.replace(temp_path, self.path)
+
+    def ids(self) -> List[str]:
+        return list(self.docs.keys())
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        # Re-added ids (a forced re-index keeps chunk ids) are dropped in one batch
+        self.delete([id_ for id_ in ids if id_ in self.docs])
+        for id_, text, metadata in zip(ids, texts, metadatas):
+            term_counts = Counter(tokenize(text))
+            length = sum(term_counts.values())
+            self.docs[id_] = {"text": text, "metadata": metadata, "length": length}
+            self.total_length += length
+            for term, count in term_counts.items():
+                self.postings.setdefault(term, {})[id_] = count
+
+    def delete(self, ids: List[str]):
+        """Remove chunks; only the postings of their own terms are touched."""
+        for id_ in set(ids):
+            doc = self.docs.pop(id_, None)
+            if doc is None:
+                continue
+            self.total_length -= doc["length"]
+            for term in set(tokenize(doc["text"])):
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                posting.pop(id_, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[Document, float]]:
+        """Return the top-k chunks by BM25 score."""
+        doc_count = len(self.docs)
+        if not doc_count:
+            return []
+        average_length = self.total_length / doc_count
+
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for id_, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.docs[id_]["length"] / average_length)
+                scores[id_] = scores.get(id_, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [
+            (Document(page_content=self.docs[id_]["text"], metadata=self.docs[id_]["metadata"]), score)
+            for id_, score in top
+        ]
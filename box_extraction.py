@@ -0,0 +1,289 @@
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pytesseract
+from PIL import Image
+from pdf2image import convert_from_path
+
+from copy_detection import copy_regions, field_signature, group_copies, pdf_text_fingerprints
+from form_registration import LAYOUT_DPI, PageTransform, register_page
+from form_schemas import CHECKBOX_FIELDS, get_form_boxes
+from metrics import DUPLICATE_COPIES, stage
+
+# Tiered OCR: pages are rendered at OCR_BASE_DPI, and only fields whose
+# tesseract confidence falls below OCR_CONFIDENCE_THRESHOLD are re-rendered
+# and re-read at OCR_HIGH_DPI
+OCR_BASE_DPI = int(os.getenv("OCR_BASE_DPI", "150"))
+OCR_HIGH_DPI = int(os.getenv("OCR_HIGH_DPI", "300"))
+OCR_CONFIDENCE_THRESHOLD = float(os.getenv("OCR_CONFIDENCE_THRESHOLD", "80"))
+
+# Locate the box grid on each page instead of assuming an upright page that
+# fills the image (see form_registration.py)
+FORM_REGISTRATION = os.getenv("FORM_REGISTRATION", "true").lower() in ("1", "true", "yes")
+# A registration within this many layout pixels of plain scaling is treated
+# as an upright rendering and the exact scaling is used
+REGISTRATION_TOLERANCE = 3.0
+# OCR one copy of forms printed several times (multi-copy W-2 sheets, repeated pages)
+COPY_DETECTION = os.getenv("COPY_DETECTION", "true").lower() in ("1", "true", "yes")
+
+# Share of dark pixels below which a box is blank rather than unreadable
+BLANK_INK_RATIO = 0.005
+
+
+def rasterize_pdf(pdf_path: str, dpi: int = LAYOUT_DPI, first_page: Optional[int] = None,
+                  last_page: Optional[int] = None) -> List[Image.Image]:
+    """Render the pages of a PDF (all of them unless a 1-based range is given)."""
+    with stage("rasterize"):
+        return convert_from_path(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page)
+
+
+def preprocess_page(image: Image.Image) -> Image.Image:
+    """Convert a page to grayscale before cropping; tesseract binarizes internally."""
+    with stage("preprocess"):
+        return image.convert("L")
+
+
+def scale_boxes(boxes: Dict[str, tuple], dpi: int) -> Dict[str, tuple]:
+    """Box layout for a page rendered at ``dpi`` instead of LAYOUT_DPI."""
+    if dpi == LAYOUT_DPI:
+        return boxes
+    scale = dpi / LAYOUT_DPI
+    return {
+        box_name: tuple(round(value * scale) for value in box)
+        for box_name, box in boxes.items()
+    }
+
+
+def locate_page(image: Image.Image, form_type: str, dpi: int) -> PageTransform:
+    """Transform from layout coordinates to this page's pixels.
+
+    Falls back to plain scaling for ``dpi`` when registration is disabled,
+    fails, or finds the page upright and in place anyway. A failed
+    registration is marked with a score of 0, since the page may not show
+    the form at all.
+    """
+    expected = PageTransform.for_dpi(dpi)
+    if not FORM_REGISTRATION:
+        return expected
+    with stage("register"):
+        transform = register_page(image, form_type)
+    if transform is None:
+        return PageTransform(expected.matrix, score=0.0)
+    # Largest corner displacement from plain scaling, in layout pixels
+    corners = [(0, 0), (LAYOUT_DPI * 8.5, 0), (0, LAYOUT_DPI * 11), (LAYOUT_DPI * 8.5, LAYOUT_DPI * 11)]
+    drift = max(
+        abs(a - b) for x, y in corners
+        for a, b in zip(transform.apply(x, y), expected.apply(x, y))
+    ) * LAYOUT_DPI / dpi
+    return expected if drift <= REGISTRATION_TOLERANCE else transform
+
+
+def crop_boxes(image: Image.Image, boxes: Dict[str, tuple],
+               transform: Optional[PageTransform] = None) -> Dict[str, Image.Image]:
+    """Crop each (x, y, width, height) box region out of a page.
+
+    Without ``transform`` the boxes are in page pixels; with one they are in
+    layout coordinates and mapped through it.
+    """
+    with stage("crop"):
+        if transform is not None:
+            return {box_name: transform.crop(image, box) for box_name, box in boxes.items()}
+        return {
+            box_name: image.crop((x, y, x + width, y + height))
+            for box_name, (x, y, width, height) in boxes.items()
+        }
+
+
+def _is_blank(crop: Image.Image) -> bool:
+    histogram = crop.convert("L").histogram()
+    dark = sum(histogram[:128])
+    return dark < BLANK_INK_RATIO * crop.width * crop.height
+
+
+def ocr_box(crop: Image.Image) -> Tuple[str, float]:
+    """OCR one box; returns its text and the mean word confidence (0-100).
+
+    A blank box is read as "" with full confidence; ink that tesseract cannot
+    turn into words scores 0 so it is retried at a higher resolution.
+    """
+    data = pytesseract.image_to_data(crop, output_type=pytesseract.Output.DICT)
+    lines: Dict[tuple, List[str]] = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        confidence = float(data["conf"][i])
+        if not word or confidence < 0:
+            continue
+        lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(word)
+        confidences.append(confidence)
+    if not confidences:
+        return "", 100.0 if _is_blank(crop) else 0.0
+    text = "\n".join(" ".join(words) for words in lines.values())
+    return text, sum(confidences) / len(confidences)
+
+
+def ocr_boxes(crops: Dict[str, Image.Image]) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """OCR each cropped box; returns texts and confidences by box name."""
+    texts, confidences = {}, {}
+    for box_name, crop in crops.items():
+        with stage("ocr"):
+            texts[box_name], confidences[box_name] = ocr_box(crop)
+    return texts, confidences
+
+
+def parse_fields(texts: Dict[str, str]) -> dict:
+    """Turn raw box text into field values, detecting marks in checkbox fields."""
+    result = {}
+    for box_name, text in texts.items():
+        if box_name in CHECKBOX_FIELDS:
+            # Convert to boolean based on presence of marks
+            result[box_name] = bool(re.search(r'[Xx✓]', text))
+        else:
+            result[box_name] = text
+    return result
+
+
+def ocr_page(page: Image.Image, boxes: Dict[str, tuple],
+             transform: PageTransform) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """Crop and OCR the given layout boxes of a preprocessed page."""
+    return ocr_boxes(crop_boxes(page, boxes, transform))
+
+
+def locate_copies(page: Image.Image, form_type: str, dpi: int) -> List[PageTransform]:
+    """Transform for each copy of the form printed on a page.
+
+    Employer W-2 sheets often carry two or four copies; each is registered
+    within its own region. Pages with a single copy get one transform.
+    """
+    regions = copy_regions(page) if COPY_DETECTION else []
+    if len(regions) <= 1:
+        return [locate_page(page, form_type, dpi)]
+    transforms = []
+    for left, top, right, bottom in regions:
+        # A copy is a scaled-down page fitted into its region
+        copy_dpi = dpi * min((right - left) / page.width, (bottom - top) / page.height)
+        copy = page.crop((left, top, right, bottom))
+        transforms.append(locate_page(copy, form_type, copy_dpi).translated(left, top))
+    return transforms
+
+
+def _read_fields(page: Image.Image, boxes: Dict[str, tuple], transform: PageTransform,
+                 texts: Dict[str, str], confidences: Dict[str, float]):
+    """OCR ``boxes`` on another reading of the page, keeping whichever reading is more confident."""
+    new_texts, new_confidences = ocr_page(page, boxes, transform)
+    for field in boxes:
+        if new_confidences[field] >= confidences[field]:
+            texts[field] = new_texts[field]
+            confidences[field] = new_confidences[field]
+
+
+def _extract_fields(pages: List[Image.Image], form_type: str, dpi: int,
+                    fingerprints: List[Optional[tuple]],
+                    rerender: Optional[Callable[[int], Image.Image]] = None) -> dict:
+    """Box pipeline over preprocessed pages rendered at ``dpi``.
+
+    Every copy of the form (pages, or regions of multi-copy sheets) is
+    located first, and copies holding the same values are grouped so each
+    group is OCR'd once. Fields below OCR_CONFIDENCE_THRESHOLD are
+    cross-checked on a second copy of the group when there is one, then
+    re-read on ``rerender(page_number)``, a rendering at OCR_HIGH_DPI that is
+    made once per page even when the page holds several copies. Later copies
+    overwrite earlier ones.
+    """
+    boxes = get_form_boxes(form_type)
+    copies, copy_fingerprints = [], []
+    for page_number, page in enumerate(pages, start=1):
+        transforms = locate_copies(page, form_type, dpi)
+        # A page's text layer covers all of its copies, so it only tells single-copy pages apart
+        fingerprint = None
+        if len(transforms) == 1 and page_number <= len(fingerprints):
+            fingerprint = fingerprints[page_number - 1]
+        for transform in transforms:
+            copies.append((page_number, page, transform))
+            copy_fingerprints.append(fingerprint)
+
+    if COPY_DETECTION and len(copies) > 1:
+        with stage("copy_detection"):
+            signatures = [
+                field_signature({field: transform.crop(page, box) for field, box in boxes.items()})
+                for _, page, transform in copies
+            ]
+            groups = group_copies(signatures, copy_fingerprints)
+        DUPLICATE_COPIES.inc(len(copies) - len(groups))
+    else:
+        groups = [[index] for index in range(len(copies))]
+
+    result, confidence, registration, unlocated = {}, {}, [], []
+    high_dpi_pages: Dict[int, Image.Image] = {}
+    for group in groups:
+        page_number, page, transform = copies[group[0]]
+        # Plain scaling scores 1.0 and failed registration 0; registered copies report their fit
+        if transform.score == 0.0:
+            unlocated.append(page_number)
+        elif transform.score < 1.0:
+            registration.append(transform.to_dict())
+        texts, confidences = ocr_page(page, boxes, transform)
+        low = [field for field, value in confidences.items() if value < OCR_CONFIDENCE_THRESHOLD]
+        if low and len(group) > 1:
+            _, other_page, other_transform = copies[group[1]]
+            _read_fields(other_page, {field: boxes[field] for field in low}, other_transform, texts, confidences)
+            low = [field for field in low if confidences[field] < OCR_CONFIDENCE_THRESHOLD]
+        if low and rerender is not None and OCR_HIGH_DPI > dpi:
+            if page_number not in high_dpi_pages:
+                high_dpi_pages[page_number] = preprocess_page(rerender(page_number))
+            _read_fields(
+                high_dpi_pages[page_number], {field: boxes[field] for field in low},
+                transform.scaled(OCR_HIGH_DPI / dpi), texts, confidences
+            )
+        result.update(parse_fields(texts))
+        confidence.update(confidences)
+    result["_confidence"] = {field: round(value, 1) for field, value in confidence.items()}
+    if registration:
+        result["_registration"] = registration
+    if unlocated:
+        result["_unlocated_pages"] = sorted(set(unlocated))
+    if len(groups) < len(copies):
+        result["_copies"] = {"found": len(copies), "ocr_passes": len(groups)}
+    return result
+
+
+def extract_fields_from_images(images: List[Image.Image], form_type: str, dpi: int = LAYOUT_DPI) -> dict:
+    """Run the box pipeline over already-rendered pages; later pages overwrite earlier ones.
+
+    Field confidences are returned under the ``_confidence`` key, the
+    registration of each copy that needed one under ``_registration``, pages
+    registration could not locate under ``_unlocated_pages``, and repeated
+    copies that were OCR'd once under ``_copies``.
+    """
+    return _extract_fields([preprocess_page(image) for image in images], form_type, dpi, [])
+
+
+def extract_fields_from_image_file(image_path: str, form_type: str) -> dict:
+    """Box OCR over a scanned page or photo, assumed to span a letter-size page
+    when registration cannot locate it."""
+    with Image.open(image_path) as image:
+        image.load()
+        dpi = max(1, round(image.width / 8.5))
+        return extract_fields_from_images([image], form_type, dpi)
+
+
+def extract_fields_from_pdf(pdf_path: str, form_type: str) -> dict:
+    """Extract form fields from a PDF by specific box regions based on form type.
+
+    Pages are OCR'd at OCR_BASE_DPI first. Repeated copies of the form (on
+    consecutive pages, or two or four to a sheet) are detected by their text
+    layer or by hashing their fields, and only one copy of each is OCR'd. A
+    field scoring below OCR_CONFIDENCE_THRESHOLD is cross-checked on a second
+    copy if there is one; if it is still low, its page is rendered again at
+    OCR_HIGH_DPI and only the low fields are re-read, reusing the base
+    resolution registration. The higher-confidence reading wins. Field
+    confidences are returned under the ``_confidence`` key, registrations
+    under ``_registration`` and copy counts under ``_copies``.
+    """
+    pages = [preprocess_page(image) for image in rasterize_pdf(pdf_path, OCR_BASE_DPI)]
+    fingerprints = pdf_text_fingerprints(pdf_path) if COPY_DETECTION else []
+    return _extract_fields(
+        pages, form_type, OCR_BASE_DPI, fingerprints,
+        rerender=lambda page_number: rasterize_pdf(pdf_path, OCR_HIGH_DPI, page_number, page_number)[0]
+    )
@@ -0,0 +1,199 @@
+import hashlib
+import re
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+# Lines such as "Chapter 5. Wages, Salaries, and Other Earnings" or "Part Two"
+CHAPTER_PATTERN = re.compile(r"^(chapter|part)\s+(\d+|[a-z]+)\b", re.IGNORECASE)
+
+# Bare page numbers, e.g. "12" or "Page 12"
+PAGE_NUMBER_PATTERN = re.compile(r"^(page\s+)?\d{1,4}$", re.IGNORECASE)
+
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+# Large prime for the MinHash permutations (2**61 - 1)
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+class StructureAwareChunker:
+    """Chunker for IRS publications that respects section boundaries.
+
+    Running headers and footers (lines repeated at the top or bottom of many
+    pages, ignoring page numbers) are stripped first. The remaining text is
+    split into sections at detected headings, and paragraphs are packed into
+    chunks of at most ``chunk_size`` characters without overlap; each chunk is
+    prefixed with its section heading instead. Near-identical chunks within a
+    publication are dropped using MinHash signatures with LSH banding.
+    """
+
+    def __init__(self, chunk_size: int = 1000, edge_lines: int = 3, repeat_ratio: float = 0.3,
+                 dedup_threshold: float = 0.9, shingle_size: int = 5, num_perm: int = 64,
+                 bands: int = 16):
+        self.chunk_size = chunk_size
+        self.edge_lines = edge_lines
+        self.repeat_ratio = repeat_ratio
+        self.dedup_threshold = dedup_threshold
+        self.shingle_size = shingle_size
+        self.num_perm = num_perm
+        self.bands = bands
+        self.last_stats: Dict[str, int] = {}
+
+        # Deterministic permutation coefficients so signatures are reproducible
+        self._permutations = []
+        for i in range(num_perm):
+            digest = hashlib.sha1(f"minhash-{i}".encode()).digest()
+            a = int.from_bytes(digest[:8], "big") % MERSENNE_PRIME or 1
+            b = int.from_bytes(digest[8:16], "big") % MERSENNE_PRIME
+            self._permutations.append((a, b))
+
+    def settings(self) -> Dict:
+        """Settings recorded in the index manifest."""
+        return {
+            "splitter": "StructureAwareChunker",
+            "chunk_size": self.chunk_size,
+            "edge_lines": self.edge_lines,
+            "repeat_ratio": self.repeat_ratio,
+            "dedup_threshold": self.dedup_threshold,
+            "shingle_size": self.shingle_size,
+            "num_perm": self.num_perm,
+            "bands": self.bands
+        }
+
+    @staticmethod
+    def _line_key(line: str) -> str:
+        return re.sub(r"\d+", "#", " ".join(line.lower().split()))
+
+    def strip_running_lines(self, pages: List[str]) -> Tuple[List[List[str]], int]:
+        """Remove repeated headers/footers and page numbers from each page."""
+        page_lines = [[line.strip() for line in page.splitlines() if line.strip()] for page in pages]
+
+        counts = Counter()
+        for lines in page_lines:
+            edges = lines[:self.edge_lines] + lines[-self.edge_lines:]
+            counts.update({self._line_key(line) for line in edges})
+        min_count = max(3, int(len(pages) * self.repeat_ratio))
+        running = {key for key, count in counts.items() if count >= min_count}
+
+        stripped = 0
+        cleaned = []
+        for lines in page_lines:
+            kept = []
+            for index, line in enumerate(lines):
+                at_edge = index < self.edge_lines or index >= len(lines) - self.edge_lines
+                if at_edge and (self._line_key(line) in running or PAGE_NUMBER_PATTERN.match(line)):
+                    stripped += 1
+                    continue
+                kept.append(line)
+            cleaned.append(kept)
+        return cleaned, stripped
+
+    @staticmethod
+    def is_heading(line: str) -> bool:
+        """Heuristic for publication headings: chapter lines or short title-cased lines."""
+        if CHAPTER_PATTERN.match(line):
+            return True
+        words = line.split()
+        if not 1 <= len(words) <= 10 or len(line) > 80 or line[-1] in ".,;:":
+            return False
+        if not line[0].isupper() or sum(c.isdigit() for c in line) > len(line) // 3:
+            return False
+        capitalized = sum(1 for word in words if word[0].isupper() or len(word) <= 3)
+        return capitalized == len(words)
+
+    def sections(self, lines: List[str]) -> Iterator[Tuple[str, List[str]]]:
+        """Group lines into (heading, paragraphs) sections."""
+        heading, paragraphs, current = "", [], []
+        for line in lines:
+            if self.is_heading(line):
+                if current:
+                    paragraphs.append(" ".join(current))
+                    current = []
+                if paragraphs:
+                    yield heading, paragraphs
+                    paragraphs = []
+                heading = line
+                continue
+            current.append(line)
+            # PDF text layers rarely keep blank lines; treat sentence-final lines as paragraph ends
+            if line.endswith((".", ":", "?")):
+                paragraphs.append(" ".join(current))
+                current = []
+        if current:
+            paragraphs.append(" ".join(current))
+        if paragraphs:
+            yield heading, paragraphs
+
+    def _pieces(self, paragraph: str, limit: int) -> Iterator[str]:
+        """Split an oversized paragraph at sentence boundaries, hard-splitting if needed."""
+        if len(paragraph) <= limit:
+            yield paragraph
+            return
+        for sentence in SENTENCE_END_PATTERN.split(paragraph):
+            for start in range(0, len(sentence), limit):
+                yield sentence[start:start + limit]
+
+    def _pack(self, heading: str, paragraphs: List[str]) -> Iterator[str]:
+        prefix = f"{heading}\n" if heading else ""
+        limit = max(self.chunk_size - len(prefix), self.chunk_size // 2)
+        buffer, size = [], 0
+        for paragraph in paragraphs:
+            for piece in self._pieces(paragraph, limit):
+                if buffer and size + len(piece) + 1 > limit:
+                    yield prefix + " ".join(buffer)
+                    buffer, size = [], 0
+                buffer.append(piece)
+                size += len(piece) + 1
+        if buffer:
+            yield prefix + " ".join(buffer)
+
+    def _signature(self, text: str) -> Tuple[int, ...]:
+        words = text.lower().split()
+        shingles = {
+            " ".join(words[i:i + self.shingle_size])
+            for i in range(max(1, len(words) - self.shingle_size + 1))
+        }
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles]
+        return tuple(
+            min((a * h + b) % MERSENNE_PRIME for h in hashes)
+            for a, b in self._permutations
+        )
+
+    def _deduplicate(self, chunks: List[Dict]) -> List[Dict]:
+        rows = self.num_perm // self.bands
+        buckets: Dict[Tuple, List[Tuple[int, ...]]] = {}
+        kept = []
+        for chunk in chunks:
+            signature = self._signature(chunk["text"])
+            bands = [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+            candidates = {other for key in bands for other in buckets.get(key, [])}
+            if any(
+                sum(x == y for x, y in zip(signature, other)) / self.num_perm >= self.dedup_threshold
+                for other in candidates
+            ):
+                continue
+            for key in bands:
+                buckets.setdefault(key, []).append(signature)
+            kept.append(chunk)
+        return kept
+
+    def split_pages(self, pages: List[str]) -> List[Dict]:
+        """Chunk a publication given the text of each page.
+
+        Returns dicts with the chunk ``text`` and its ``section`` heading.
+        """
+        cleaned, stripped = self.strip_running_lines(pages)
+        lines = [line for page in cleaned for line in page]
+
+        chunks = [
+            {"text": text, "section": heading}
+            for heading, paragraphs in self.sections(lines)
+            for text in self._pack(heading, paragraphs)
+        ]
+        unique = self._deduplicate(chunks)
+
+        self.last_stats = {
+            "running_lines_stripped": stripped,
+            "chunks": len(unique),
+            "near_duplicates_dropped": len(chunks) - len(unique)
+        }
+        return unique
@@ -0,0 +1,137 @@
+import re
+from typing import Dict, List, Tuple
+
+from bm25_index import tokenize
+
+HEADER = "Relevant IRS Tax Guide Information:\n\n"
+
+SENTENCE_END_PATTERN = re.compile(r"[.!?]\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Claude token estimate (about four characters per token for English)."""
+    return (len(text) + 3) // 4
+
+
+def _overlap(left: str, right: str, max_overlap: int = 400) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``."""
+    for size in range(min(max_overlap, len(left), len(right)), 20, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class ContextAssembler:
+    """Builds the retrieved-context block for prompts under a token budget.
+
+    Candidates are picked with maximal marginal relevance (retrieval rank for
+    relevance, token-set Jaccard similarity for redundancy), adjacent chunks of
+    the same publication are merged with their shared overlap removed, and the
+    result is trimmed to ``token_budget`` tokens.
+    """
+
+    def __init__(self, token_budget: int = 1000, mmr_lambda: float = 0.7):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+
+    @staticmethod
+    def _similarity(a: set, b: set) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    def select(self, docs: List, k: int) -> List:
+        """Pick up to k documents balancing rank-based relevance and diversity."""
+        if len(docs) <= 1:
+            return list(docs)
+        token_sets = [set(tokenize(doc.page_content)) for doc in docs]
+        relevance = [1 - i / len(docs) for i in range(len(docs))]
+
+        selected: List[int] = []
+        remaining = list(range(len(docs)))
+        while remaining and len(selected) < k:
+            best = max(
+                remaining,
+                key=lambda i: self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * max(
+                    (self._similarity(token_sets[i], token_sets[j]) for j in selected), default=0.0
+                )
+            )
+            selected.append(best)
+            remaining.remove(best)
+        return [docs[i] for i in selected]
+
+    @staticmethod
+    def merge_adjacent(docs: List) -> List[Tuple[str, str]]:
+        """Merge consecutive chunks of the same source, keeping selection order.
+
+        Returns (title, text) blocks.
+        """
+        blocks: List[Dict] = []
+        for doc in docs:
+            source = doc.metadata.get("source")
+            chunk = doc.metadata.get("chunk")
+            for block in blocks:
+                if block["source"] != source or not isinstance(chunk, int):
+                    continue
+                if chunk == block["last"] + 1:
+                    text = doc.page_content
+                    block["text"] += " " + text[_overlap(block["text"], text):]
+                    block["last"] = chunk
+                    break
+                if chunk == block["first"] - 1:
+                    text = doc.page_content
+                    block["text"] = text + " " + block["text"][_overlap(text, block["text"]):]
+                    block["first"] = chunk
+                    break
+            else:
+                blocks.append({
+                    "source": source,
+                    "title": doc.metadata.get("title", "IRS Guide"),
+                    "first": chunk,
+                    "last": chunk,
+                    "text": doc.page_content
+                })
+        return [(block["title"], block["text"].strip()) for block in blocks]
+
+    def _trim(self, text: str, tokens: int) -> str:
+        """Cut text to roughly ``tokens`` tokens, preferring a sentence boundary."""
+        limit = tokens * 4
+        if len(text) <= limit:
+            return text
+        cut = text[:limit]
+        ends = [match.end() for match in SENTENCE_END_PATTERN.finditer(cut)]
+        if ends and ends[-1] > limit // 2:
+            cut = cut[:ends[-1]]
+        return cut.rstrip()
+
+    def assemble(self, docs: List, k: int) -> Tuple[str, Dict[str, int]]:
+        """Return the formatted context and token statistics for ``docs``.
+
+        ``baseline_tokens`` is what concatenating the top-k chunks verbatim would
+        have cost; ``tokens_saved`` is the difference to the assembled context.
+        """
+        baseline = HEADER + "".join(
+            f"Source {i} ({doc.metadata.get('title', 'IRS Guide')}):\n{doc.page_content}\n\n"
+            for i, doc in enumerate(docs[:k], 1)
+        )
+
+        parts = [HEADER]
+        remaining = self.token_budget - estimate_tokens(HEADER)
+        for i, (title, text) in enumerate(self.merge_adjacent(self.select(docs, k)), 1):
+            label = f"Source {i} ({title}):\n"
+            available = remaining - estimate_tokens(label) - 1
+            if available < 50:
+                break
+            text = self._trim(text, available)
+            parts.append(f"{label}{text}\n\n")
+            remaining -= estimate_tokens(parts[-1])
+
+        context = "".join(parts) if len(parts) > 1 else ""
+        baseline_tokens = estimate_tokens(baseline) if docs else 0
+        context_tokens = estimate_tokens(context) if context else 0
+        return context, {
+            "candidates": len(docs),
+            "baseline_tokens": baseline_tokens,
+            "context_tokens": context_tokens,
+            "tokens_saved": max(0, baseline_tokens - context_tokens)
+        }
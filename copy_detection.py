@@ -0,0 +1,135 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Grid of the page/region difference hash used to spot repeated copies (256 bits)
+LAYOUT_HASH_SIZE = (16, 16)
+# Share of differing bits up to which two regions show the same form layout
+LAYOUT_HASH_DISTANCE = 0.1
+# Grid of the per-field hash; fine enough that a changed digit flips many bits
+FIELD_HASH_SIZE = (32, 8)
+# Share of differing bits up to which a field holds the same value on two copies.
+# Kept strict: a missed duplicate only costs an extra OCR pass, a false one loses a form
+FIELD_HASH_DISTANCE = float(os.getenv("COPY_FIELD_HASH_DISTANCE", "0.04"))
+# Share of dark pixels below which a region or field is blank
+MIN_INK_RATIO = 0.001
+# Copy layouts tried on each page, most copies first: (columns, rows)
+COPY_GRIDS = ((2, 2), (1, 2))
+
+# "Copy B", "Copy 2" labels differ between otherwise equal copies
+COPY_LABEL_PATTERN = re.compile(r"\bcopy\s+[a-z0-9]\b", re.IGNORECASE)
+# Tokens carrying digits: amounts, SSNs, EINs, ZIP codes, box numbers
+DIGIT_TOKEN_PATTERN = re.compile(r"\S*\d\S*")
+
+Region = Tuple[int, int, int, int]
+Signature = Dict[str, Optional[int]]
+
+
+def dhash(image: Image.Image, size: Tuple[int, int] = LAYOUT_HASH_SIZE) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a width x height thumbnail."""
+    width, height = size
+    pixels = np.asarray(image.convert("L").resize((width + 1, height), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hash_distance(a: int, b: int, size: Tuple[int, int] = LAYOUT_HASH_SIZE) -> float:
+    """Share of differing bits between two hashes."""
+    return bin(a ^ b).count("1") / (size[0] * size[1])
+
+
+def _ink_ratio(image: Image.Image) -> float:
+    histogram = image.convert("L").histogram()
+    return sum(histogram[:128]) / max(1, image.width * image.height)
+
+
+def copy_regions(page: Image.Image) -> List[Region]:
+    """(left, top, right, bottom) of each copy of the form printed on ``page``.
+
+    The page is split into quadrants, then halves; when every region has ink
+    and hashes like the first one, the page holds that many copies.
+    Otherwise the whole page is one copy. This only says the regions share a
+    layout; whether they hold the same values is up to ``same_fields``.
+    """
+    for columns, rows in COPY_GRIDS:
+        width, height = page.width // columns, page.height // rows
+        regions = [
+            (column * width, row * height, (column + 1) * width, (row + 1) * height)
+            for row in range(rows) for column in range(columns)
+        ]
+        crops = [page.crop(region) for region in regions]
+        if any(_ink_ratio(crop) < MIN_INK_RATIO for crop in crops):
+            continue
+        first = dhash(crops[0])
+        if all(hash_distance(first, dhash(crop)) <= LAYOUT_HASH_DISTANCE for crop in crops[1:]):
+            return regions
+    return [(0, 0, page.width, page.height)]
+
+
+def field_signature(crops: Dict[str, Image.Image]) -> Signature:
+    """Fine hash of each cropped field; None for blank fields."""
+    return {
+        field: None if _ink_ratio(crop) < MIN_INK_RATIO else dhash(crop, FIELD_HASH_SIZE)
+        for field, crop in crops.items()
+    }
+
+
+def same_fields(a: Signature, b: Signature, max_distance: float = FIELD_HASH_DISTANCE) -> bool:
+    """Whether two copies show the same value in every field."""
+    for field, a_hash in a.items():
+        b_hash = b.get(field)
+        if a_hash is None or b_hash is None:
+            if a_hash != b_hash:
+                return False
+        elif hash_distance(a_hash, b_hash, FIELD_HASH_SIZE) > max_distance:
+            return False
+    return True
+
+
+def text_fingerprint(text: str) -> Optional[Tuple[str, ...]]:
+    """The digit-bearing tokens of a page's text layer, ignoring copy labels.
+
+    Copies of a form differ only in their labels and instructions, so equal
+    fingerprints mean the same filled values. None for pages without a
+    usable text layer.
+    """
+    tokens = tuple(DIGIT_TOKEN_PATTERN.findall(COPY_LABEL_PATTERN.sub(" ", text)))
+    return tokens or None
+
+
+def pdf_text_fingerprints(pdf_path: str) -> List[Optional[Tuple[str, ...]]]:
+    """Text-layer fingerprint of each page; empty when the PDF cannot be read."""
+    try:
+        from pypdf import PdfReader
+        reader = PdfReader(pdf_path)
+        return [text_fingerprint(page.extract_text() or "") for page in reader.pages]
+    except Exception as e:
+        print(f"Could not read text layer of {pdf_path}: {str(e)}")
+        return []
+
+
+def group_copies(signatures: List[Signature],
+                 fingerprints: List[Optional[Tuple[str, ...]]]) -> List[List[int]]:
+    """Group copies (in document order) that hold the same form.
+
+    Two copies with text-layer fingerprints are compared by those alone;
+    otherwise their field signatures decide. Each group is listed by copy
+    index, its first member being the copy to OCR.
+    """
+    groups: List[List[int]] = []
+    for index, signature in enumerate(signatures):
+        for group in groups:
+            first = group[0]
+            if fingerprints[index] is not None and fingerprints[first] is not None:
+                match = fingerprints[index] == fingerprints[first]
+            else:
+                match = same_fields(signatures[first], signature)
+            if match:
+                group.append(index)
+                break
+        else:
+            groups.append([index])
+    return groups
@@ -0,0 +1,189 @@
+"""Shared embedding service for all worker processes.
+
+One process holds the sentence-transformers model and serves embedding
+requests over a Unix socket. Requests that arrive within a short coalescing
+window are batched into a single model call, so N uvicorn workers share one
+copy of the model and the CPU sees larger, more efficient batches.
+
+Run it next to the app:
+    python embedding_server.py --socket /tmp/taxai-embeddings.sock
+and start the workers with EMBEDDING_BACKEND=remote.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_SOCKET_PATH = "/tmp/taxai-embeddings.sock"
+
+# Frames are a 4-byte big-endian length followed by a JSON payload
+HEADER = struct.Struct(">I")
+
+
+def _encode(payload: Dict) -> bytes:
+    body = json.dumps(payload).encode()
+    return HEADER.pack(len(body)) + body
+
+
+class EmbeddingServer:
+    """Coalesces embedding requests from many clients into batched model calls."""
+
+    def __init__(self, embeddings, window_ms: float = 5.0, max_batch: int = 128):
+        self.embeddings = embeddings
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue = None
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "model_seconds": 0.0}
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending: List[Tuple[List[str], asyncio.Future]] = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.window
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            texts = [text for batch, _ in pending for text in batch]
+            start = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(None, self.embeddings.embed_documents, texts)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(texts)
+            self.stats["model_seconds"] += time.perf_counter() - start
+
+            offset = 0
+            for batch, future in pending:
+                future.set_result(vectors[offset:offset + len(batch)])
+                offset += len(batch)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                request = json.loads(await reader.readexactly(HEADER.unpack(header)[0]))
+                if request.get("stats"):
+                    batches = self.stats["batches"]
+                    response = dict(self.stats, mean_batch_size=self.stats["texts"] / batches if batches else 0)
+                else:
+                    self.stats["requests"] += 1
+                    future = loop.create_future()
+                    await self.queue.put((request["texts"], future))
+                    try:
+                        response = {"embeddings": await future}
+                    except Exception as e:
+                        response = {"error": str(e)}
+                writer.write(_encode(response))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str):
+        self.queue = asyncio.Queue()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=socket_path)
+        batcher = asyncio.create_task(self._batcher())
+        print(f"Embedding server listening on {socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+class RemoteEmbeddings(Embeddings):
+    """Embeddings client that forwards requests to the shared embedding server.
+
+    Each thread keeps its own connection; a dropped connection is re-opened once.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _read_exactly(self, conn: socket.socket, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Embedding server closed the connection")
+            data.extend(chunk)
+        return bytes(data)
+
+    def _request(self, payload: Dict) -> Dict:
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.sendall(_encode(payload))
+                size = HEADER.unpack(self._read_exactly(conn, HEADER.size))[0]
+                response = json.loads(self._read_exactly(conn, size))
+                break
+            except (ConnectionError, OSError):
+                conn = getattr(self._local, "conn", None)
+                if conn is not None:
+                    conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        if "error" in response:
+            raise RuntimeError(f"Embedding server error: {response['error']}")
+        return response
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._request({"texts": texts})["embeddings"]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def server_stats(self) -> Dict:
+        return self._request({"stats": True})
+
+
+if __name__ == "__main__":
+    from embeddings import DEFAULT_EMBEDDING_MODEL, create_embeddings
+
+    parser = argparse.ArgumentParser(description="Serve embeddings to all worker processes.")
+    parser.add_argument("--socket", default=os.getenv("EMBEDDING_SOCKET", DEFAULT_SOCKET_PATH))
+    parser.add_argument("--backend", default=os.getenv("EMBEDDING_SERVER_BACKEND", "torch"))
+    parser.add_argument("--window-ms", type=float, default=float(os.getenv("EMBEDDING_COALESCE_MS", "5")))
+    parser.add_argument("--max-batch", type=int, default=128)
+    args = parser.parse_args()
+
+    model = create_embeddings(DEFAULT_EMBEDDING_MODEL, backend=args.backend)
+    server = EmbeddingServer(model, window_ms=args.window_ms, max_batch=args.max_batch)
+    asyncio.run(server.serve(args.socket))
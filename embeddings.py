@@ -0,0 +1,92 @@
+import os
+import threading
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Quantized int8 export published in the all-MiniLM-L6-v2 model repository
+DEFAULT_ONNX_FILE = "onnx/model_qint8_avx2.onnx"
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "remote")
+
+
+def create_embeddings(
+    model_name: str = DEFAULT_EMBEDDING_MODEL,
+    backend: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    threads: Optional[int] = None,
+    onnx_file: Optional[str] = None
+):
+    """Create the CPU embedding function used for ingestion and queries.
+
+    Settings default to the EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE,
+    EMBEDDING_THREADS and EMBEDDING_ONNX_FILE environment variables. The "onnx"
+    backend runs a quantized export of the same model through onnxruntime, so
+    its vectors live in the same space as the existing collection. The "remote"
+    backend sends requests to the shared embedding server (embedding_server.py)
+    at EMBEDDING_SOCKET instead of loading a model in this process.
+    """
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).lower()
+    if backend == "remote":
+        # Workers talk to the shared embedding server and never load torch themselves
+        from embedding_server import DEFAULT_SOCKET_PATH, RemoteEmbeddings
+        return RemoteEmbeddings(os.getenv("EMBEDDING_SOCKET", DEFAULT_SOCKET_PATH))
+
+    batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    threads = threads or int(os.getenv("EMBEDDING_THREADS", "0"))
+    onnx_file = onnx_file or os.getenv("EMBEDDING_ONNX_FILE", DEFAULT_ONNX_FILE)
+
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    model_kwargs = {"device": "cpu"}
+    if backend == "onnx":
+        model_kwargs["backend"] = "onnx"
+        model_kwargs["model_kwargs"] = {
+            "file_name": onnx_file,
+            "provider": "CPUExecutionProvider"
+        }
+        if threads:
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = threads
+            model_kwargs["model_kwargs"]["session_options"] = session_options
+    elif threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": batch_size, "normalize_embeddings": True}
+    )
+
+
+class LazyEmbeddings(Embeddings):
+    """Embedding function that creates the underlying model on first use.
+
+    Lets lexical-only retrieval run without ever loading the embedding model,
+    while the vector store still gets an embedding function to hold on to.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        self.model_name = model_name
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    def _get(self) -> Embeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = create_embeddings(self.model_name)
+        return self._embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._get().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._get().embed_query(text)
@@ -0,0 +1,232 @@
+import io
+import json
+import os
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from metrics import stage
+from tax_export import TaxSoftwareExport, tax_export
+
+EXPORT_FORMATS = ("json", "proseries", "lacerte", "parquet")
+
+
+def _zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ExportJobManager:
+    """Runs multi-format exports in background threads and packages them as one archive.
+
+    Each job writes a single compressed tarball (zstd when the ``zstandard``
+    package is installed, gzip otherwise) into ``export_dir`` together with a
+    JSON status file, so any worker process can report on or serve the job.
+    Jobs older than ``retention_seconds`` are deleted by ``cleanup()`` unless
+    they were downloaded within the last ``download_grace_seconds``.
+    """
+
+    def __init__(self, export_dir: str = "exports", max_workers: int = 2,
+                 retention_seconds: int = 24 * 3600, download_grace_seconds: int = 3600,
+                 exporter: TaxSoftwareExport = tax_export):
+        self.export_dir = Path(export_dir)
+        self.retention_seconds = retention_seconds
+        self.download_grace_seconds = download_grace_seconds
+        self.exporter = exporter
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self.compression = "zstd" if _zstd_available() else "gzip"
+        self._lock = threading.Lock()
+
+    def _status_path(self, job_id: str) -> Path:
+        return self.export_dir / f"{job_id}.json"
+
+    def _save(self, job: Dict[str, Any]):
+        with self._lock:
+            temp_path = self._status_path(job["job_id"]).with_suffix(".tmp")
+            with open(temp_path, "w") as f:
+                json.dump(job, f, indent=2)
+            os.replace(temp_path, self._status_path(job["job_id"]))
+
+    def submit(self, forms: Dict[str, List[Dict[str, Any]]], formats: List[str]) -> Dict[str, Any]:
+        """Queue an export of ``forms`` (form type -> list of parsed forms)."""
+        formats = [fmt.strip().lower() for fmt in formats if fmt.strip()]
+        unsupported = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+        if unsupported:
+            raise ValueError(f"Unsupported export format: {', '.join(unsupported)}")
+        if not formats:
+            raise ValueError("At least one export format is required")
+
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+
+        extension = "tar.zst" if self.compression == "zstd" else "tar.gz"
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "formats": formats,
+            "form_counts": {form_type: len(items) for form_type, items in forms.items()},
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "created_ts": time.time(),
+            "archive": f"export_{job_id}.{extension}",
+            "compression": self.compression
+        }
+        self._save(job)
+        self.executor.submit(self._run, dict(job), forms)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        # Job ids are uuid4 hex strings; anything else never maps to a file
+        if len(job_id) != 32 or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        path = self._status_path(job_id)
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def archive_path(self, job: Dict[str, Any]) -> Path:
+        return self.export_dir / job["archive"]
+
+    def mark_accessed(self, job: Dict[str, Any]):
+        """Record a download so ``cleanup()`` keeps the archive while it streams."""
+        job["last_access_ts"] = time.time()
+        self._save(job)
+
+    def _write_member(self, tar: tarfile.TarFile, name: str, data: bytes):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BytesIO(data))
+
+    def _add_format(self, tar: tarfile.TarFile, fmt: str, forms: Dict[str, List[Dict]]) -> int:
+        """Write one format's files into the archive; returns uncompressed bytes."""
+        written = 0
+        if fmt == "json":
+            data = json.dumps(forms, indent=2).encode()
+            self._write_member(tar, "json/forms.json", data)
+            return len(data)
+
+        if fmt == "parquet":
+            with tempfile.TemporaryDirectory() as temp_dir:
+                for form_type, items in forms.items():
+                    self.exporter.export_to_parquet(items, form_type, temp_dir)
+                for path in sorted(Path(temp_dir).rglob("*.parquet")):
+                    written += path.stat().st_size
+                    tar.add(path, arcname=f"parquet/{path.relative_to(temp_dir)}")
+            return written
+
+        for form_type, items in forms.items():
+            data = "".join(self.exporter.iter_bulk_csv(items, form_type, fmt)).encode()
+            self._write_member(tar, f"{fmt}/{fmt}_{form_type}.csv", data)
+            written += len(data)
+        return written
+
+    def _run(self, job: Dict[str, Any], forms: Dict[str, List[Dict]]):
+        job["status"] = "running"
+        self._save(job)
+        start = time.perf_counter()
+        archive_path = self.archive_path(job)
+        temp_path = archive_path.with_name(archive_path.name + ".part")
+        try:
+            timings, uncompressed = {}, 0
+            with open(temp_path, "wb") as raw:
+                if self.compression == "zstd":
+                    import zstandard
+                    stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False)
+                    tar = tarfile.open(fileobj=stream, mode="w|")
+                else:
+                    stream = None
+                    tar = tarfile.open(fileobj=raw, mode="w:gz")
+                with tar:
+                    for fmt in job["formats"]:
+                        format_start = time.perf_counter()
+                        with stage(f"export_{fmt}"):
+                            uncompressed += self._add_format(tar, fmt, forms)
+                        timings[fmt] = round(time.perf_counter() - format_start, 4)
+                if stream is not None:
+                    stream.close()
+            os.replace(temp_path, archive_path)
+
+            job.update({
+                "status": "done",
+                "bytes": archive_path.stat().st_size,
+                "uncompressed_bytes": uncompressed,
+                "format_seconds": timings,
+                "total_seconds": round(time.perf_counter() - start, 4)
+            })
+            print(f"Export {job['job_id']}: {job['bytes']} bytes "
+                  f"({uncompressed} uncompressed) in {job['total_seconds']}s")
+        except Exception as e:
+            if temp_path.exists():
+                temp_path.unlink()
+            job.update({"status": "failed", "error": str(e)})
+        self._save(job)
+
+    def cleanup(self) -> int:
+        """Delete jobs past the retention period together with their archives.
+
+        A job downloaded within the grace period is kept even when expired, so
+        an archive is not deleted under a client still streaming it (from any
+        worker process). Files belonging to no job expire by modification time.
+        Other workers may clean up concurrently, so files vanishing mid-scan
+        are skipped and errors are logged per file.
+        """
+        if not self.export_dir.exists():
+            return 0
+        now = time.time()
+        cutoff = now - self.retention_seconds
+        access_cutoff = now - self.download_grace_seconds
+        removed = 0
+        kept = set()
+        for status_path in self.export_dir.glob("*.json"):
+            try:
+                job = self.get(status_path.stem)
+            except (OSError, ValueError) as e:
+                print(f"Error reading export status {status_path}: {str(e)}")
+                continue
+            if job is None:
+                continue
+            names = {status_path.name, job["archive"], job["archive"] + ".part"}
+            if job["created_ts"] >= cutoff or job.get("last_access_ts", 0) >= access_cutoff:
+                kept.update(names)
+                continue
+            for name in names:
+                removed += self._remove(self.export_dir / name)
+        for path in self.export_dir.iterdir():
+            if path.name in kept:
+                continue
+            try:
+                expired = path.is_file() and path.stat().st_mtime < cutoff
+            except FileNotFoundError:
+                continue
+            if expired:
+                removed += self._remove(path)
+        return removed
+
+    def _remove(self, path: Path) -> int:
+        """Delete one file; 1 if this call removed it."""
+        try:
+            path.unlink()
+            return 1
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            print(f"Error removing export file {path}: {str(e)}")
+            return 0
+
+
+# Initialize export job manager
+export_jobs = ExportJobManager(
+    export_dir=os.getenv("EXPORT_DIR", "exports"),
+    retention_seconds=int(os.getenv("EXPORT_RETENTION_SECONDS", str(24 * 3600))),
+    download_grace_seconds=int(os.getenv("EXPORT_DOWNLOAD_GRACE_SECONDS", "3600"))
+)
@@ -0,0 +1,107 @@
+from operator import itemgetter
+from typing import Any, Dict, List, Tuple
+
+from form_schemas import FORM_BOXES, form_fields, normalize_form_fields
+
+# Column names that are not simply the CamelCased field name. ProSeries and
+# Lacerte import the same column names, so both targets share this table.
+COLUMN_OVERRIDES = {
+    "employee_ssn": "SSN",
+    "employer_ein": "EIN",
+    "wages_tips_other": "Wages",
+    "federal_income_tax": "FederalWithholding",
+    "social_security_tax": "SocialSecurityWithheld",
+    "medicare_tax": "MedicareWithheld",
+    "state_id": "StateID",
+    "state_income_tax": "StateWithholding",
+    "state_tax_withheld": "StateWithholding",
+    "local_income_tax": "LocalWithholding",
+    "local_tax_withheld": "LocalWithholding",
+    "payer_tin": "PayerTIN",
+    "recipient_tin": "RecipientTIN"
+}
+
+# Per-target overrides layered on top of COLUMN_OVERRIDES
+TARGET_COLUMN_OVERRIDES = {
+    "proseries": {},
+    "lacerte": {}
+}
+
+TARGET_LABELS = {"proseries": "ProSeries", "lacerte": "Lacerte"}
+
+
+def column_name(field: str, target: str) -> str:
+    override = TARGET_COLUMN_OVERRIDES[target].get(field) or COLUMN_OVERRIDES.get(field)
+    return override or "".join(part.capitalize() for part in field.split("_"))
+
+
+class _BlankDefaults(dict):
+    """Dict that yields "" for missing keys so itemgetter never raises."""
+
+    def __missing__(self, key):
+        return ""
+
+
+class CompiledMapping:
+    """A target/form mapping compiled to an ordered key tuple and an itemgetter.
+
+    ``project`` turns a parsed form into a row tuple in column order with a
+    single C-level itemgetter call; records with missing keys or Claude-style
+    aliased keys fall back to a normalized copy with blank defaults.
+    """
+
+    __slots__ = ("target", "form_type", "keys", "columns", "_getter")
+
+    def __init__(self, target: str, form_type: str, pairs: List[Tuple[str, str]]):
+        self.target = target
+        self.form_type = form_type
+        self.keys = tuple(key for key, _ in pairs)
+        self.columns = tuple(column for _, column in pairs)
+        getter = itemgetter(*self.keys)
+        # itemgetter with a single key returns a bare value rather than a tuple
+        self._getter = getter if len(self.keys) > 1 else (lambda data: (getter(data),))
+
+    def project(self, data: Dict[str, Any]) -> Tuple:
+        try:
+            return self._getter(data)
+        except KeyError:
+            return self._getter(_BlankDefaults(normalize_form_fields(data)))
+
+
+class MappingRegistry:
+    """Declarative (target, form type) -> field/column pairs, compiled once on first use."""
+
+    def __init__(self):
+        self._specs: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        self._compiled: Dict[Tuple[str, str], CompiledMapping] = {}
+
+    def register(self, target: str, form_type: str, pairs: List[Tuple[str, str]]):
+        key = (target, form_type.upper())
+        self._specs[key] = list(pairs)
+        self._compiled.pop(key, None)
+
+    def get(self, target: str, form_type: str) -> CompiledMapping:
+        key = (target, form_type.upper())
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            if target not in TARGET_LABELS:
+                raise ValueError(f"Unsupported export target: {target}")
+            if key not in self._specs:
+                raise ValueError(f"Unsupported form type for {TARGET_LABELS[target]}: {form_type}")
+            compiled = self._compiled[key] = CompiledMapping(target, key[1], self._specs[key])
+        return compiled
+
+
+def build_default_registry() -> MappingRegistry:
+    """Register every parsed form type for every export target."""
+    registry = MappingRegistry()
+    for target in TARGET_LABELS:
+        for form_type in FORM_BOXES:
+            registry.register(
+                target, form_type,
+                [(field, column_name(field, target)) for field in form_fields(form_type)]
+            )
+    return registry
+
+
+mapping_registry = build_default_registry()
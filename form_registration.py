@@ -0,0 +1,213 @@
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from form_schemas import get_form_boxes
+
+# Resolution the box coordinates in form_schemas.FORM_BOXES are defined at
+LAYOUT_DPI = 200
+# Canonical letter page at the layout resolution
+LAYOUT_SIZE = (int(8.5 * LAYOUT_DPI), int(11 * LAYOUT_DPI))
+
+# Registration runs on an ink mask pooled down to at least this many pixels wide
+WORK_WIDTH = 850
+# Canonical layout pixels per template profile bin
+TEMPLATE_BIN = 2
+# Pixels darker than this share of the median (paper) brightness count as ink
+INK_RATIO = 0.8
+# Largest skew searched, in degrees
+MAX_SKEW_DEGREES = 6.0
+# Normalized profile correlation below which the fit is rejected
+MIN_REGISTRATION_SCORE = float(os.getenv("REGISTRATION_MIN_SCORE", "0.6"))
+
+
+class PageTransform:
+    """Affine map from canonical layout coordinates (LAYOUT_DPI pixels) to page pixels."""
+
+    __slots__ = ("matrix", "score", "angle")
+
+    def __init__(self, matrix: np.ndarray, score: float = 1.0, angle: float = 0.0):
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(2, 3)
+        self.score = score
+        self.angle = angle
+
+    @classmethod
+    def for_dpi(cls, dpi: float) -> "PageTransform":
+        """Plain scaling for a page rendered upright at ``dpi``."""
+        scale = dpi / LAYOUT_DPI
+        return cls([[scale, 0, 0], [0, scale, 0]])
+
+    def scaled(self, factor: float) -> "PageTransform":
+        """The same registration on a rendering ``factor`` times larger."""
+        return PageTransform(self.matrix * factor, self.score, self.angle)
+
+    def translated(self, dx: float, dy: float) -> "PageTransform":
+        """The same registration for a crop whose top-left corner sits at (dx, dy)."""
+        matrix = self.matrix.copy()
+        matrix[:, 2] += (dx, dy)
+        return PageTransform(matrix, self.score, self.angle)
+
+    def apply(self, x: float, y: float) -> Tuple[float, float]:
+        (a, b, c), (d, e, f) = self.matrix
+        return a * x + b * y + c, d * x + e * y + f
+
+    def crop(self, image: Image.Image, box: tuple) -> Image.Image:
+        """Sample a canonical (x, y, width, height) box out of the page as an upright crop."""
+        x, y, width, height = box
+        (a, b, c), (d, e, f) = self.matrix
+        if b == 0 and d == 0:
+            # Axis-aligned: a plain crop (with resize if scaled) is cheaper than resampling
+            left, top = a * x + c, e * y + f
+            return image.crop((round(left), round(top), round(left + a * width), round(top + e * height)))
+        # Output pixel (u, v) comes from canonical (x + u / s, y + v / s) at the page's own scale
+        scale = np.sqrt(abs(a * e - b * d))
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        coefficients = (
+            a / scale, b / scale, a * x + b * y + c,
+            d / scale, e / scale, d * x + e * y + f
+        )
+        return image.transform(size, Image.AFFINE, coefficients, resample=Image.BILINEAR, fillcolor=255)
+
+    def to_dict(self) -> Dict:
+        return {"score": round(self.score, 3), "angle": round(self.angle, 2),
+                "matrix": [[round(value, 4) for value in row] for row in self.matrix.tolist()]}
+
+
+def _template_profiles(form_type: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Row and column profiles of the form's box outlines in canonical bins."""
+    rows = np.zeros(LAYOUT_SIZE[1] // TEMPLATE_BIN + 1)
+    columns = np.zeros(LAYOUT_SIZE[0] // TEMPLATE_BIN + 1)
+    for x, y, width, height in get_form_boxes(form_type).values():
+        # Box outlines sit a few pixels outside the OCR region
+        left, top, right, bottom = x - 4, y - 4, x + width + 4, y + height + 4
+        rows[top // TEMPLATE_BIN] += right - left
+        rows[bottom // TEMPLATE_BIN] += right - left
+        columns[left // TEMPLATE_BIN] += bottom - top
+        columns[right // TEMPLATE_BIN] += bottom - top
+    return rows, columns
+
+
+def _smooth(profile: np.ndarray, width: int = 5) -> np.ndarray:
+    kernel = np.hanning(width + 2)[1:-1]
+    return np.convolve(profile, kernel / kernel.sum(), mode="same")
+
+
+def _estimate_skew(xs: np.ndarray, ys: np.ndarray) -> float:
+    """Angle (radians) whose row projection is sharpest: text lines and rules line up."""
+    def sharpness(angle: float) -> float:
+        rotated = ys * np.cos(angle) - xs * np.sin(angle)
+        histogram = np.bincount((rotated - rotated.min()).astype(np.int64))
+        return float(np.dot(histogram, histogram))
+
+    limit = np.radians(MAX_SKEW_DEGREES)
+    coarse = np.linspace(-limit, limit, 49)
+    best = max(coarse, key=sharpness)
+    step = coarse[1] - coarse[0]
+    fine = np.linspace(best - step, best + step, 11)
+    return float(max(fine, key=sharpness))
+
+
+def _fit_axis(observed: np.ndarray, template: np.ndarray, low: float,
+              high: float) -> Tuple[float, float, float]:
+    """Scale, offset and score aligning ``template`` bins onto ``observed`` pixels."""
+    observed = _smooth(observed)
+    observed_norm = np.linalg.norm(observed) or 1.0
+    best = (low, 0.0, -1.0)
+
+    def search(scales: np.ndarray):
+        nonlocal best
+        for scale in scales:
+            positions = np.arange(int(len(template) * scale))
+            if len(positions) < 2:
+                continue
+            resampled = _smooth(np.interp(positions / scale, np.arange(len(template)), template))
+            correlation = np.correlate(observed, resampled, mode="full")
+            index = int(np.argmax(correlation))
+            score = correlation[index] / (observed_norm * (np.linalg.norm(resampled) or 1.0))
+            if score > best[2]:
+                # In "full" mode index len(resampled) - 1 means zero offset
+                best = (float(scale), float(index - (len(resampled) - 1)), float(score))
+
+    coarse = np.geomspace(low, high, 48)
+    search(coarse)
+    # Refine between the neighbouring coarse scales
+    step = coarse[1] / coarse[0]
+    search(np.geomspace(best[0] / step, best[0] * step, 13))
+    return best
+
+
+def _line_profiles(ink: np.ndarray, rule_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row profile of horizontal rules and column profile of vertical rules.
+
+    A pixel run counts as a rule when at least ``rule_length`` consecutive
+    pixels are inked, which keeps text strokes out of the profiles.
+    """
+    ink = ink.astype(np.int32)
+    horizontal = np.cumsum(np.pad(ink, ((0, 0), (1, 0))), axis=1)
+    horizontal = (horizontal[:, rule_length:] - horizontal[:, :-rule_length]) == rule_length
+    vertical = np.cumsum(np.pad(ink, ((1, 0), (0, 0))), axis=0)
+    vertical = (vertical[rule_length:, :] - vertical[:-rule_length, :]) == rule_length
+    return horizontal.sum(axis=1).astype(np.float64), vertical.sum(axis=0).astype(np.float64)
+
+
+def register_page(image: Image.Image, form_type: str) -> Optional[PageTransform]:
+    """Locate the form's box grid on a scan or photo of the page.
+
+    The page is deskewed with row projection profiles. Long horizontal and
+    vertical rules are then projected onto rows and columns and correlated
+    with the box outlines of the form's canonical layout over a range of
+    scales, giving each axis's scale and offset. Returns None when the fit
+    is too weak to trust.
+    """
+    gray = np.asarray(image.convert("L"))
+    # Thin rules fade when averaged down, so find ink at full resolution and
+    # max-pool the mask to roughly WORK_WIDTH
+    ink = gray < INK_RATIO * np.median(gray)
+    pool = max(1, ink.shape[1] // WORK_WIDTH)
+    height, width = ink.shape[0] // pool, ink.shape[1] // pool
+    ink = ink[:height * pool, :width * pool].reshape(height, pool, width, pool).any(axis=(1, 3))
+    factor = 1 / pool
+    ys, xs = np.nonzero(ink)
+    if len(xs) < 200:
+        return None
+    xs = xs.astype(np.float64)
+    ys = ys.astype(np.float64)
+
+    sample = slice(None, None, max(1, len(xs) // 100000))
+    angle = _estimate_skew(xs[sample], ys[sample])
+    cos, sin = np.cos(angle), np.sin(angle)
+    # Rotate ink into the deskewed frame (about the work image's origin),
+    # keeping the whole rotated work image in view
+    corners = np.array([[0, 0], [width, 0], [0, height], [width, height]])
+    corner_x = corners[:, 0] * cos + corners[:, 1] * sin
+    corner_y = corners[:, 1] * cos - corners[:, 0] * sin
+    x_origin, y_origin = corner_x.min(), corner_y.min()
+    deskewed = np.zeros((int(corner_y.max() - y_origin) + 1, int(corner_x.max() - x_origin) + 1), dtype=bool)
+    deskewed[
+        (ys * cos - xs * sin - y_origin).astype(np.int64),
+        (xs * cos + ys * sin - x_origin).astype(np.int64)
+    ] = True
+    # Starting guess: the page fills the image width; photos may show it smaller
+    guess = width / (LAYOUT_SIZE[0] / TEMPLATE_BIN)
+    # Rules are at least ~16 layout pixels long; text strokes are shorter
+    rows, columns = _line_profiles(deskewed, max(6, round(8 * guess)))
+
+    template_rows, template_columns = _template_profiles(form_type)
+    scale_x, offset_x, score_x = _fit_axis(columns, template_columns, guess * 0.5, guess * 1.25)
+    # Rows share the column scale up to mild perspective
+    scale_y, offset_y, score_y = _fit_axis(rows, template_rows, scale_x * 0.9, scale_x * 1.1)
+    score = min(score_x, score_y)
+    if score < MIN_REGISTRATION_SCORE:
+        return None
+
+    # canonical -> deskewed work frame
+    deskew_matrix = np.array([
+        [scale_x / TEMPLATE_BIN, 0, offset_x + x_origin],
+        [0, scale_y / TEMPLATE_BIN, offset_y + y_origin]
+    ])
+    # deskewed -> work image (inverse rotation), then work image -> original pixels
+    rotation = np.array([[cos, -sin], [sin, cos]]) / factor
+    matrix = np.hstack([rotation @ deskew_matrix[:, :2], (rotation @ deskew_matrix[:, 2])[:, None]])
+    return PageTransform(matrix, score, float(np.degrees(angle)))
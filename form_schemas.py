@@ -0,0 +1,243 @@
+import re
+from typing import Any, Dict, List, Optional
+
+# Box regions for each supported form type, in pixels on a page rendered at
+# poppler's default 200 DPI: field name -> (x, y, width, height)
+FORM_BOXES = {
+    # W-2 box coordinates (x, y, width, height)
+    "W-2": {
+        "employee_ssn": (100, 100, 200, 30),  # Box a
+        "employer_ein": (100, 150, 200, 30),  # Box b
+        "wages_tips_other": (100, 200, 200, 30),  # Box 1
+        "federal_income_tax": (100, 250, 200, 30),  # Box 2
+        "social_security_wages": (100, 300, 200, 30),  # Box 3
+        "social_security_tax": (100, 350, 200, 30),  # Box 4
+        "medicare_wages": (100, 400, 200, 30),  # Box 5
+        "medicare_tax": (100, 450, 200, 30),  # Box 6
+        "social_security_tips": (100, 500, 200, 30),  # Box 7
+        "allocated_tips": (100, 550, 200, 30),  # Box 8
+        "dependent_care_benefits": (100, 600, 200, 30),  # Box 10
+        "nonqualified_plans": (100, 650, 200, 30),  # Box 11
+        "statutory_employee": (100, 700, 30, 30),  # Box 13 checkbox
+        "retirement_plan": (150, 700, 30, 30),  # Box 13 checkbox
+        "third_party_sick_pay": (200, 700, 30, 30),  # Box 13 checkbox
+        "state": (100, 750, 200, 30),  # Box 15
+        "state_id": (100, 800, 200, 30),  # Box 15
+        "state_wages": (100, 850, 200, 30),  # Box 16
+        "state_income_tax": (100, 900, 200, 30),  # Box 17
+        "local_wages": (100, 950, 200, 30),  # Box 18
+        "local_income_tax": (100, 1000, 200, 30),  # Box 19
+        "locality_name": (100, 1050, 200, 30),  # Box 20
+    },
+    # 1099-NEC box coordinates
+    "1099-NEC": {
+        "payer_name": (100, 100, 200, 30),
+        "payer_address": (100, 150, 200, 60),
+        "payer_tin": (100, 250, 200, 30),
+        "recipient_name": (100, 300, 200, 30),
+        "recipient_address": (100, 350, 200, 60),
+        "recipient_tin": (100, 450, 200, 30),
+        "nonemployee_compensation": (100, 500, 200, 30),
+        "federal_income_tax": (100, 550, 200, 30),
+        "state": (100, 600, 200, 30),
+        "state_income": (100, 650, 200, 30),
+        "state_tax_withheld": (100, 700, 200, 30),
+        "local_income": (100, 750, 200, 30),
+        "local_tax_withheld": (100, 800, 200, 30),
+    },
+    # 1099-MISC box coordinates
+    "1099-MISC": {
+        "payer_name": (100, 100, 200, 30),
+        "payer_address": (100, 150, 200, 60),
+        "payer_tin": (100, 250, 200, 30),
+        "recipient_name": (100, 300, 200, 30),
+        "recipient_address": (100, 350, 200, 60),
+        "recipient_tin": (100, 450, 200, 30),
+        "rents": (100, 500, 200, 30),
+        "royalties": (100, 550, 200, 30),
+        "other_income": (100, 600, 200, 30),
+        "federal_income_tax": (100, 650, 200, 30),
+        "fishing_boat_proceeds": (100, 700, 200, 30),
+        "medical_health_care_payments": (100, 750, 200, 30),
+        "nonemployee_compensation": (100, 800, 200, 30),
+        "substitute_payments": (100, 850, 200, 30),
+        "crop_insurance_proceeds": (100, 900, 200, 30),
+        "state": (100, 950, 200, 30),
+        "state_income": (100, 1000, 200, 30),
+        "state_tax_withheld": (100, 1050, 200, 30),
+    },
+    # 1099-INT box coordinates
+    "1099-INT": {
+        "payer_name": (100, 100, 200, 30),
+        "payer_address": (100, 150, 200, 60),
+        "payer_tin": (100, 250, 200, 30),
+        "recipient_name": (100, 300, 200, 30),
+        "recipient_address": (100, 350, 200, 60),
+        "recipient_tin": (100, 450, 200, 30),
+        "interest_income": (100, 500, 200, 30),
+        "early_withdrawal_penalty": (100, 550, 200, 30),
+        "federal_income_tax": (100, 600, 200, 30),
+        "state": (100, 650, 200, 30),
+        "state_income": (100, 700, 200, 30),
+        "state_tax_withheld": (100, 750, 200, 30),
+    },
+    # 1099-DIV box coordinates
+    "1099-DIV": {
+        "payer_name": (100, 100, 200, 30),
+        "payer_address": (100, 150, 200, 60),
+        "payer_tin": (100, 250, 200, 30),
+        "recipient_name": (100, 300, 200, 30),
+        "recipient_address": (100, 350, 200, 60),
+        "recipient_tin": (100, 450, 200, 30),
+        "ordinary_dividends": (100, 500, 200, 30),
+        "qualified_dividends": (100, 550, 200, 30),
+        "capital_gain_distributions": (100, 600, 200, 30),
+        "federal_income_tax": (100, 650, 200, 30),
+        "state": (100, 700, 200, 30),
+        "state_income": (100, 750, 200, 30),
+        "state_tax_withheld": (100, 800, 200, 30),
+    },
+    # 1099-B box coordinates
+    "1099-B": {
+        "payer_name": (100, 100, 200, 30),
+        "payer_address": (100, 150, 200, 60),
+        "payer_tin": (100, 250, 200, 30),
+        "recipient_name": (100, 300, 200, 30),
+        "recipient_address": (100, 350, 200, 60),
+        "recipient_tin": (100, 450, 200, 30),
+        "description": (100, 500, 200, 30),
+        "date_acquired": (100, 550, 200, 30),
+        "date_sold": (100, 600, 200, 30),
+        "proceeds": (100, 650, 200, 30),
+        "cost_basis": (100, 700, 200, 30),
+        "wash_sale_loss_disallowed": (100, 750, 200, 30),
+        "federal_income_tax": (100, 800, 200, 30),
+    },
+    # 1099-R box coordinates
+    "1099-R": {
+        "payer_name": (100, 100, 200, 30),
+        "payer_address": (100, 150, 200, 60),
+        "payer_tin": (100, 250, 200, 30),
+        "recipient_name": (100, 300, 200, 30),
+        "recipient_address": (100, 350, 200, 60),
+        "recipient_tin": (100, 450, 200, 30),
+        "gross_distribution": (100, 500, 200, 30),
+        "taxable_amount": (100, 550, 200, 30),
+        "federal_income_tax": (100, 600, 200, 30),
+        "employee_contributions": (100, 650, 200, 30),
+        "state": (100, 700, 200, 30),
+        "state_distribution": (100, 750, 200, 30),
+        "state_tax_withheld": (100, 800, 200, 30),
+    }
+}
+
+CHECKBOX_FIELDS = {"statutory_employee", "retirement_plan", "third_party_sick_pay"}
+
+# Fields holding dollar amounts; everything else except checkboxes is text
+MONEY_FIELDS = {
+    "wages_tips_other", "federal_income_tax", "social_security_wages",
+    "social_security_tax", "medicare_wages", "medicare_tax", "social_security_tips",
+    "allocated_tips", "dependent_care_benefits", "nonqualified_plans", "state_wages",
+    "state_income_tax", "local_wages", "local_income_tax", "nonemployee_compensation",
+    "state_income", "state_tax_withheld", "local_income", "local_tax_withheld", "rents",
+    "royalties", "other_income", "fishing_boat_proceeds", "medical_health_care_payments",
+    "substitute_payments", "crop_insurance_proceeds", "interest_income",
+    "early_withdrawal_penalty", "ordinary_dividends", "qualified_dividends",
+    "capital_gain_distributions", "proceeds", "cost_basis", "wash_sale_loss_disallowed",
+    "gross_distribution", "taxable_amount", "employee_contributions", "state_distribution"
+}
+
+# Keys produced by the Claude extraction templates that differ from the box names
+FIELD_ALIASES = {
+    "wages_tips_other_compensation": "wages_tips_other",
+    "federal_income_tax_withheld": "federal_income_tax",
+    "social_security_tax_withheld": "social_security_tax",
+    "medicare_tax_withheld": "medicare_tax",
+    "state_ID": "state_id"
+}
+
+MONEY_PATTERN = re.compile(r"-?\d+(?:\.\d{1,2})?")
+
+# Accepted formats used to validate OCR'd values before trusting them
+MONEY_FORMAT = re.compile(r"\(?-?\$?\s*\d{1,3}(?:,?\d{3})*(?:\.\d{1,2})?\)?")
+SSN_FORMAT = re.compile(r"(?:\d{3}|[X*]{3})-?(?:\d{2}|[X*]{2})-?\d{4}")
+EIN_FORMAT = re.compile(r"\d{2}-?\d{7}")
+STATE_FORMAT = re.compile(r"[A-Z]{2}")
+DATE_FORMAT = re.compile(r"\d{1,2}/\d{1,2}/\d{2,4}|VARIOUS", re.IGNORECASE)
+
+
+def field_format(field: str) -> Optional[str]:
+    """Short description of the value format expected in a field, if constrained."""
+    if field in CHECKBOX_FIELDS:
+        return "true or false"
+    if field in MONEY_FIELDS:
+        return "dollar amount like 1234.56"
+    if field.endswith("_ssn"):
+        return "SSN like 123-45-6789"
+    if field.endswith("_tin"):
+        return "SSN like 123-45-6789 or EIN like 12-3456789"
+    if field.endswith("_ein"):
+        return "EIN like 12-3456789"
+    if field == "state":
+        return "two-letter state code"
+    if field.startswith("date_"):
+        return "date like MM/DD/YYYY"
+    return None
+
+
+def validate_field(field: str, value: Any) -> bool:
+    """Whether an OCR'd value has the format its field requires; blanks are valid."""
+    if field in CHECKBOX_FIELDS:
+        return isinstance(value, bool)
+    text = str(value).strip()
+    if not text:
+        return True
+    if field in MONEY_FIELDS:
+        return bool(MONEY_FORMAT.fullmatch(text))
+    if field.endswith("_ssn"):
+        return bool(SSN_FORMAT.fullmatch(text))
+    if field.endswith("_tin"):
+        return bool(SSN_FORMAT.fullmatch(text) or EIN_FORMAT.fullmatch(text))
+    if field.endswith("_ein"):
+        return bool(EIN_FORMAT.fullmatch(text))
+    if field == "state":
+        return bool(STATE_FORMAT.fullmatch(text))
+    if field.startswith("date_"):
+        return bool(DATE_FORMAT.fullmatch(text))
+    return True
+
+
+def get_form_boxes(form_type: str) -> Dict[str, tuple]:
+    """Box layout for a form type (case-insensitive)."""
+    boxes = FORM_BOXES.get(form_type.upper())
+    if boxes is None:
+        raise ValueError(f"Unsupported form type: {form_type}")
+    return boxes
+
+
+def form_fields(form_type: str) -> List[str]:
+    """Field names of a form type in box order."""
+    return list(get_form_boxes(form_type).keys())
+
+
+def normalize_form_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Rename Claude template keys to the box field names used everywhere else."""
+    return {FIELD_ALIASES.get(key, key): value for key, value in data.items()}
+
+
+def parse_money_cents(value: Any) -> Optional[int]:
+    """Parse an OCR'd dollar amount such as "$1,234.5" or "(12.00)" to integer cents."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value * 100))
+    text = str(value).strip()
+    negative = text.startswith("(") and text.endswith(")")
+    match = MONEY_PATTERN.search(text.replace(",", "").replace("$", "").replace(" ", ""))
+    if not match:
+        return None
+    whole, _, fraction = match.group().partition(".")
+    cents = abs(int(whole)) * 100 + int(fraction.ljust(2, "0") or 0)
+    if negative or whole.startswith("-"):
+        cents = -cents
+    return cents
@@ -0,0 +1,127 @@
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+from box_extraction import extract_fields_from_image_file, extract_fields_from_pdf
+from form_schemas import CHECKBOX_FIELDS, FORM_BOXES, field_format, validate_field
+from metrics import LLM_REPAIRED_FIELDS, PARSE_PATHS
+
+# Output tokens allowed per field in a repair call
+REPAIR_TOKENS_PER_FIELD = 40
+
+
+class HybridFormParser:
+    """Box OCR first, Claude only for the fields that fail.
+
+    PDFs and scanned images both go through box OCR. Each field is then
+    validated against its expected format and its OCR confidence; only the
+    fields that fail are sent to Claude, with their own OCR text and a
+    one-line format hint, so most uploads need no LLM call at all. When too
+    many fields fail, too few boxes hold any text, or an image could not be
+    registered to the layout (the upload does not match the box layout)
+    ``parse`` returns None and the caller falls back to full-page extraction.
+    """
+
+    def __init__(self, confidence_threshold: float = 60.0, max_failing_ratio: float = 0.5,
+                 min_filled_ratio: float = 0.25):
+        self.confidence_threshold = confidence_threshold
+        self.max_failing_ratio = max_failing_ratio
+        self.min_filled_ratio = min_filled_ratio
+
+    def box_fields(self, path: str, form_type: str) -> dict:
+        if path.lower().endswith(".pdf"):
+            return extract_fields_from_pdf(path, form_type)
+        return extract_fields_from_image_file(path, form_type)
+
+    def failing_fields(self, fields: dict) -> List[str]:
+        """Fields whose OCR confidence is too low or whose value has the wrong format."""
+        confidence = fields.get("_confidence", {})
+        return [
+            field for field, value in fields.items()
+            if not field.startswith("_") and (
+                confidence.get(field, 0.0) < self.confidence_threshold
+                or not validate_field(field, value)
+            )
+        ]
+
+    def matches_layout(self, path: str, fields: dict) -> bool:
+        """Whether the boxes landed on a filled-in form rather than empty paper.
+
+        Blank boxes read as "" with full confidence and pass validation, so
+        a page that is not this form would otherwise parse as an empty one.
+        """
+        if not path.lower().endswith(".pdf") and fields.get("_unlocated_pages"):
+            return False
+        text_fields = [
+            field for field in fields
+            if not field.startswith("_") and field not in CHECKBOX_FIELDS
+        ]
+        filled = [field for field in text_fields if str(fields[field]).strip()]
+        return bool(text_fields) and len(filled) >= self.min_filled_ratio * len(text_fields)
+
+    def repair_prompt(self, form_type: str, fields: dict, failing: List[str]) -> str:
+        lines = []
+        for field in failing:
+            hint = field_format(field)
+            label = f"{field} ({hint})" if hint else field
+            lines.append(f"- {label}: {json.dumps(str(fields.get(field, '')))}")
+        return (
+            f"These fields were read by OCR from a {form_type} tax form and may contain "
+            "recognition errors. Correct each value using only its OCR text, or use \"\" "
+            "if it cannot be determined. Return only a JSON object with exactly these keys.\n"
+            + "\n".join(lines)
+        )
+
+    def _parse_repair(self, response_text: str, failing: List[str]) -> Dict:
+        start_idx = response_text.find("{")
+        end_idx = response_text.rfind("}") + 1
+        if start_idx == -1 or end_idx == 0:
+            raise ValueError("No JSON found in Claude's response")
+        repaired = json.loads(response_text[start_idx:end_idx])
+        values = {}
+        for field in failing:
+            if field not in repaired:
+                continue
+            value = repaired[field]
+            if field in CHECKBOX_FIELDS and not isinstance(value, bool):
+                value = str(value).strip().lower() in ("true", "yes", "x", "1")
+            values[field] = value if field in CHECKBOX_FIELDS else str(value).strip()
+        return values
+
+    def parse(self, path: str, form_type: str, complete: Callable[[str, int], str]) -> Optional[dict]:
+        """Parse an uploaded form; ``complete(prompt, max_tokens)`` returns Claude's reply text."""
+        if form_type.upper() not in FORM_BOXES:
+            PARSE_PATHS.labels("full_page").inc()
+            return None
+        fields = self.box_fields(path, form_type)
+        failing = self.failing_fields(fields)
+        field_count = len([field for field in fields if not field.startswith("_")])
+        if (field_count == 0 or len(failing) > self.max_failing_ratio * field_count
+                or not self.matches_layout(path, fields)):
+            PARSE_PATHS.labels("full_page").inc()
+            return None
+        PARSE_PATHS.labels("repaired" if failing else "ocr").inc()
+        LLM_REPAIRED_FIELDS.inc(len(failing))
+
+        fields["form_type"] = form_type
+        fields["_llm_fields"] = failing
+        if failing:
+            prompt = self.repair_prompt(form_type, fields, failing)
+            try:
+                repaired = self._parse_repair(
+                    complete(prompt, REPAIR_TOKENS_PER_FIELD * len(failing) + 20), failing
+                )
+            except Exception as e:
+                # Keep the OCR readings rather than failing the whole upload
+                print(f"Field repair failed for {form_type}: {str(e)}")
+                repaired = {}
+            fields.update(repaired)
+        return fields
+
+
+# Initialize hybrid parser
+hybrid_parser = HybridFormParser(
+    confidence_threshold=float(os.getenv("HYBRID_CONFIDENCE_THRESHOLD", "60")),
+    max_failing_ratio=float(os.getenv("HYBRID_MAX_FAILING_RATIO", "0.5")),
+    min_filled_ratio=float(os.getenv("HYBRID_MIN_FILLED_RATIO", "0.25"))
+)
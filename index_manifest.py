@@ -0,0 +1,89 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class IndexManifest:
+    """Record of which IRS guides are in the vector store and how they were built.
+
+    Each entry is keyed by the guide's source URL and stores the content checksum,
+    the chunker settings, the embedding model and the chunk ids written for it, so
+    a refresh can tell exactly which documents need to be re-chunked and re-embedded.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.version = 0
+        self.documents: Dict[str, Dict] = {}
+        self._mtime = None
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk, starting empty if it does not exist."""
+        if not self.path.exists():
+            return
+        self._mtime = self.path.stat().st_mtime
+        with open(self.path, "r") as f:
+            data = json.load(f)
+        self.version = data.get("version", 0)
+        self.documents = data.get("documents", {})
+
+    def reload_if_changed(self) -> bool:
+        """Reload the manifest if another process (e.g. a CLI refresh) rewrote it."""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self.load()
+        return True
+
+    def save(self):
+        """Atomically write the manifest next to the vector store."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"version": self.version, "documents": self.documents}, f, indent=2)
+        os.replace(temp_path, self.path)
+        self._mtime = self.path.stat().st_mtime
+
+    def sources(self) -> List[str]:
+        return list(self.documents.keys())
+
+    def get(self, source: str) -> Optional[Dict]:
+        return self.documents.get(source)
+
+    def is_current(self, source: str, checksum: str, chunker: Dict, embedding_model: str) -> bool:
+        """Return True if the stored entry was built from the same content and settings."""
+        entry = self.documents.get(source)
+        return (
+            entry is not None
+            and entry["checksum"] == checksum
+            and entry["chunker"] == chunker
+            and entry["embedding_model"] == embedding_model
+        )
+
+    def record(self, source: str, title: str, checksum: str, chunker: Dict,
+               embedding_model: str, chunk_ids: List[str]):
+        """Record a freshly indexed document and bump the index version."""
+        self.documents[source] = {
+            "source": source,
+            "title": title,
+            "checksum": checksum,
+            "chunker": chunker,
+            "embedding_model": embedding_model,
+            "chunk_ids": chunk_ids,
+            "updated_at": datetime.now().isoformat(timespec="seconds")
+        }
+        self.version += 1
+
+    def remove(self, source: str) -> List[str]:
+        """Drop a document from the manifest, returning its chunk ids."""
+        entry = self.documents.pop(source, None)
+        if entry is None:
+            return []
+        self.version += 1
+        return entry["chunk_ids"]
@@ -1,7 +1,7 @@
 import os
-from typing import Optional
-from fastapi import FastAPI, UploadFile, HTTPException, Request, Depends
-from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
+from typing import Dict, List, Optional
+from fastapi import FastAPI, UploadFile, HTTPException, Request, Depends, Header
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 import pytesseract
 from PIL import Image
 from pdf2image import convert_from_path
@@ -13,9 +13,21 @@ from rag_handler import rag_handler
 from pydantic import BaseModel
 import asyncio
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import re
 from tax_export import tax_export
+from export_jobs import export_jobs
+from hybrid_extraction import hybrid_parser
+from metrics import (
+    GUIDANCE_ANSWERS, REQUEST_SECONDS, observe_stage, record_llm_call, render_metrics, server_timing_header,
+    stage, start_request_timings
+)
+from profiling import request_profiler
+from static_assets import static_assets
+from tax_aggregation import tax_aggregator
+from tax_facts import tax_fact_router
 from datetime import datetime
+import time
 
 # Load environment variables
 load_dotenv()
@@ -23,8 +35,33 @@ load_dotenv()
 # Initialize FastAPI app
 app = FastAPI(title="Tax Form Parser")
 
-# Initialize Anthropic client
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+class APIGZipMiddleware(GZipMiddleware):
+    """GZip API responses, leaving alone the UI assets (served precompressed)
+    and archive/profile downloads (already compressed or binary)."""
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "") if scope["type"] == "http" else ""
+        if path == "/" or path.startswith("/static/") or path.endswith("/download"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(APIGZipMiddleware, minimum_size=1000)
+
+# Initialize Anthropic client; ANTHROPIC_BASE_URL can point at a local stand-in
+# such as benchmarks/fake_anthropic.py for load testing
+client = anthropic.Anthropic(
+    api_key=os.getenv("ANTHROPIC_API_KEY"),
+    base_url=os.getenv("ANTHROPIC_BASE_URL") or None,
+    max_retries=int(os.getenv("ANTHROPIC_MAX_RETRIES", "2"))
+)
+
+# Model used to repair the few fields box OCR could not read confidently
+FIELD_REPAIR_MODEL = os.getenv("CLAUDE_FIELD_REPAIR_MODEL", "claude-3-haiku-20240307")
+
+# Add a Server-Timing breakdown of pipeline stages to every response; clients
+# can also ask for it per request with the "X-Server-Timing: 1" header
+SERVER_TIMING = os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes")
 
 # Configure paths
 if os.name == 'nt':  # Windows
@@ -37,718 +74,110 @@ if os.name == 'nt':  # Windows
 @app.on_event("startup")
 async def startup_event():
     rag_handler.build_vector_store()
+    # Keep a reference so the task is not garbage collected and can be cancelled
+    app.state.export_cleanup_task = asyncio.create_task(cleanup_exports_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    task = getattr(app.state, "export_cleanup_task", None)
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    return """
-    <html>
-        <head>
-            <title>Tax Assistant</title>
-            <style>
-                :root {
-                    --primary-bg: #ffffff;
-                    --secondary-bg: #f7f7f8;
-                    --border-color: #e5e5e5;
-                    --text-primary: #1a1a1a;
-                    --text-secondary: #666666;
-                    --accent-color: #10a37f;
-                }
-
-                body {
-                    font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
-                    margin: 0;
-                    padding: 0;
-                    background-color: var(--primary-bg);
-                    color: var(--text-primary);
-                }
-
-                .container {
-                    max-width: 1200px;
-                    margin: 0 auto;
-                    padding: 20px;
-                    height: 100vh;
-                    display: flex;
-                    flex-direction: column;
-                }
-
-                .main-content {
-                    display: flex;
-                    gap: 20px;
-                    flex: 1;
-                    overflow: hidden;
-                }
-
-                .forms-section {
-                    width: 40%;
-                    display: flex;
-                    flex-direction: column;
-                    overflow: hidden;
-                }
-
-                .chat-section {
-                    width: 60%;
-                    display: flex;
-                    flex-direction: column;
-                    overflow: hidden;
-                }
-
-                .header {
-                    text-align: center;
-                    padding: 20px 0;
-                    border-bottom: 1px solid var(--border-color);
-                }
-
-                .header h1 {
-                    color: var(--accent-color);
-                    margin: 0;
-                    font-size: 24px;
-                }
-
-                .upload-section {
-                    padding: 20px;
-                    background-color: var(--secondary-bg);
-                    border-radius: 8px;
-                    margin-bottom: 20px;
-                }
-
-                .upload-form {
-                    display: flex;
-                    flex-direction: column;
-                    gap: 10px;
-                }
-
-                .file-input-container {
-                    display: flex;
-                    gap: 10px;
-                    align-items: center;
-                }
-
-                .file-input {
-                    flex: 1;
-                }
-
-                .file-input::-webkit-file-upload-button {
-                    visibility: hidden;
-                }
-
-                .file-input::before {
-                    content: 'Select files';
-                    display: inline-block;
-                    background: var(--accent-color);
-                    color: white;
-                    padding: 8px 16px;
-                    border-radius: 4px;
-                    cursor: pointer;
-                    margin-right: 10px;
-                }
-
-                .file-input:hover::before {
-                    opacity: 0.9;
-                }
-
-                .file-list {
-                    display: flex;
-                    flex-direction: column;
-                    gap: 10px;
-                    margin-bottom: 10px;
-                }
-
-                .file-item {
-                    display: flex;
-                    gap: 10px;
-                    align-items: center;
-                    padding: 8px;
-                    background-color: var(--primary-bg);
-                    border-radius: 4px;
-                }
-
-                .file-name {
-                    flex: 1;
-                    white-space: nowrap;
-                    overflow: hidden;
-                    text-overflow: ellipsis;
-                }
-
-                .form-type-select {
-                    padding: 8px;
-                    border: 1px solid var(--border-color);
-                    border-radius: 4px;
-                    min-width: 120px;
-                }
-
-                .remove-file {
-                    background: none;
-                    border: none;
-                    color: var(--text-secondary);
-                    cursor: pointer;
-                    padding: 4px 8px;
-                    border-radius: 4px;
-                }
-
-                .remove-file:hover {
-                    background-color: rgba(0, 0, 0, 0.1);
-                }
-
-                .upload-button {
-                    background-color: var(--accent-color);
-                    color: white;
-                    border: none;
-                    padding: 8px 16px;
-                    border-radius: 4px;
-                    cursor: pointer;
-                    align-self: flex-end;
-                    display: flex;
-                    align-items: center;
-                    gap: 8px;
-                }
-
-                .upload-button:hover {
-                    opacity: 0.9;
-                }
-
-                .upload-button.loading {
-                    opacity: 0.7;
-                    cursor: not-allowed;
-                }
-
-                .loading-spinner {
-                    width: 16px;
-                    height: 16px;
-                    border: 2px solid rgba(255, 255, 255, 0.3);
-                    border-radius: 50%;
-                    border-top-color: white;
-                    animation: spin 1s linear infinite;
-                }
-
-                @keyframes spin {
-                    to { transform: rotate(360deg); }
-                }
-
-                .parsed-forms {
-                    flex: 1;
-                    overflow-y: auto;
-                    padding-right: 10px;
-                }
-
-                .form-card {
-                    background-color: var(--secondary-bg);
-                    padding: 15px;
-                    border-radius: 8px;
-                    margin-bottom: 10px;
-                }
-
-                .form-card h3 {
-                    color: var(--accent-color);
-                    margin-top: 0;
-                    display: flex;
-                    justify-content: space-between;
-                    align-items: center;
-                }
-
-                .form-card .delete-form {
-                    background: none;
-                    border: none;
-                    color: var(--text-secondary);
-                    cursor: pointer;
-                    padding: 4px 8px;
-                    border-radius: 4px;
-                }
-
-                .form-card .delete-form:hover {
-                    background-color: rgba(0, 0, 0, 0.1);
-                }
-
-                .form-data {
-                    display: grid;
-                    grid-template-columns: repeat(auto-fill, minmax(200px, 1fr));
-                    gap: 10px;
-                }
-
-                .data-item {
-                    background-color: var(--primary-bg);
-                    padding: 8px;
-                    border-radius: 4px;
-                }
-
-                .data-label {
-                    font-size: 12px;
-                    color: var(--text-secondary);
-                }
-
-                .data-value {
-                    font-weight: 500;
-                }
-
-                .chat-container {
-                    flex: 1;
-                    overflow-y: auto;
-                    padding: 20px 0;
-                    display: flex;
-                    flex-direction: column;
-                    gap: 20px;
-                }
-
-                .message {
-                    padding: 20px;
-                    border-radius: 8px;
-                    max-width: 85%;
-                    line-height: 1.5;
-                }
-
-                .user-message {
-                    background-color: var(--accent-color);
-                    color: white;
-                    align-self: flex-end;
-                    margin-left: auto;
-                }
-
-                .bot-message {
-                    background-color: var(--secondary-bg);
-                    color: var(--text-primary);
-                    align-self: flex-start;
-                }
-
-                .bot-message h3 {
-                    color: var(--accent-color);
-                    margin-top: 0;
-                    margin-bottom: 10px;
-                }
-
-                .bot-message ul {
-                    margin: 10px 0;
-                    padding-left: 20px;
-                }
-
-                .bot-message li {
-                    margin-bottom: 5px;
-                }
-
-                .bot-message p {
-                    margin: 10px 0;
-                }
-
-                .bot-message strong {
-                    color: var(--accent-color);
-                }
-
-                .input-container {
-                    padding: 20px 0;
-                    border-top: 1px solid var(--border-color);
-                    position: relative;
-                }
-
-                #chat-input {
-                    width: 100%;
-                    padding: 12px 20px;
-                    border: 1px solid var(--border-color);
-                    border-radius: 8px;
-                    font-size: 16px;
-                    background-color: var(--primary-bg);
-                    color: var(--text-primary);
-                    resize: none;
-                    min-height: 24px;
-                    max-height: 200px;
-                    overflow-y: auto;
-                }
-
-                #chat-input:focus {
-                    outline: none;
-                    border-color: var(--accent-color);
-                }
-
-                .send-button {
-                    position: absolute;
-                    right: 10px;
-                    bottom: 30px;
-                    background: none;
-                    border: none;
-                    cursor: pointer;
-                    color: var(--accent-color);
-                    padding: 8px;
-                }
-
-                .send-button:hover {
-                    opacity: 0.8;
-                }
-
-                .send-icon {
-                    width: 24px;
-                    height: 24px;
-                }
-
-                .typing-indicator {
-                    display: flex;
-                    align-items: center;
-                    gap: 5px;
-                    align-self: flex-start;
-                    background-color: var(--secondary-bg);
-                    padding: 20px;
-                    border-radius: 8px;
-                    color: var(--text-secondary);
-                }
-
-                .typing-dot {
-                    width: 8px;
-                    height: 8px;
-                    background-color: var(--text-secondary);
-                    border-radius: 50%;
-                    animation: typing 1s infinite;
-                }
-
-                .typing-dot:nth-child(2) {
-                    animation-delay: 0.2s;
-                }
-
-                .typing-dot:nth-child(3) {
-                    animation-delay: 0.4s;
-                }
-
-                @keyframes typing {
-                    0%, 100% { transform: translateY(0); }
-                    50% { transform: translateY(-5px); }
-                }
-
-                @media (max-width: 768px) {
-                    .main-content {
-                        flex-direction: column;
-                    }
-
-                    .forms-section, .chat-section {
-                        width: 100%;
-                    }
-
-                    .parsed-forms {
-                        max-height: 300px;
-                    }
-                }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Tax Assistant</h1>
-                </div>
-                
-                <div class="main-content">
-                    <div class="forms-section">
-                        <div class="upload-section">
-                            <form class="upload-form" id="upload-form">
-                                <div class="file-input-container">
-                                    <input type="file" class="file-input" id="file-input" accept=".pdf,.jpg,.jpeg,.png" multiple>
-                                </div>
-                                <div class="file-list" id="file-list">
-                                    <!-- File items will be added here -->
-                                </div>
-                                <button type="submit" class="upload-button">Upload All</button>
-                            </form>
-                        </div>
-
-                        <div class="parsed-forms" id="parsed-forms">
-                            <!-- Parsed forms will be displayed here -->
-                        </div>
-                    </div>
-                    
-                    <div class="chat-section">
-                        <div class="chat-container" id="chat-container">
-                            <div class="message bot-message">
-                                <h3>Welcome!</h3>
-                                <p>I'm your tax assistant. I can help you understand your tax filing requirements and guide you through the process.</p>
-                                <p>You can:</p>
-                                <ul>
-                                    <li>Upload your tax forms (W-2, 1099-NEC)</li>
-                                    <li>Ask questions about your specific tax situation</li>
-                                    <li>Get personalized advice based on your forms</li>
-                                    <li>Learn about tax deductions and credits</li>
-                                </ul>
-                                <p>What would you like to know?</p>
-                            </div>
-                        </div>
-                        
-                        <div class="input-container">
-                            <textarea 
-                                id="chat-input" 
-                                placeholder="Ask about your tax filing requirements..."
-                                rows="1"
-                                oninput="autoResize(this)"
-                            ></textarea>
-                            <button class="send-button" id="send-button" onclick="sendMessage()">
-                                <svg class="send-icon" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-                                    <path d="M22 2L11 13" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
-                                    <path d="M22 2L15 22L11 13L2 9L22 2Z" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
-                                </svg>
-                            </button>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-            <script>
-                let conversationId = "default";
-                let parsedForms = {};
-                let filesToUpload = [];
-
-                function autoResize(textarea) {
-                    textarea.style.height = 'auto';
-                    textarea.style.height = textarea.scrollHeight + 'px';
-                }
-
-                function createFormTypeSelect() {
-                    const select = document.createElement('select');
-                    select.className = 'form-type-select';
-                    select.innerHTML = `
-                        <option value="W-2">W-2</option>
-                        <option value="1099-NEC">1099-NEC</option>
-                        <option value="1099-INT">1099-INT</option>
-                        <option value="1099-DIV">1099-DIV</option>
-                        <option value="1099-B">1099-B</option>
-                        <option value="1099-R">1099-R</option>
-                        <option value="1099-MISC">1099-MISC</option>
-                    `;
-                    return select;
-                }
-
-                function addFileToList(file) {
-                    const fileList = document.getElementById('file-list');
-                    const fileItem = document.createElement('div');
-                    fileItem.className = 'file-item';
-                    
-                    const fileName = document.createElement('div');
-                    fileName.className = 'file-name';
-                    fileName.textContent = file.name;
-                    
-                    const formTypeSelect = createFormTypeSelect();
-                    
-                    const removeButton = document.createElement('button');
-                    removeButton.className = 'remove-file';
-                    removeButton.textContent = '×';
-                    removeButton.onclick = () => {
-                        fileItem.remove();
-                        filesToUpload = filesToUpload.filter(f => f !== file);
-                    };
-                    
-                    fileItem.appendChild(fileName);
-                    fileItem.appendChild(formTypeSelect);
-                    fileItem.appendChild(removeButton);
-                    
-                    fileList.appendChild(fileItem);
-                    filesToUpload.push(file);
-                }
-
-                document.getElementById('file-input').addEventListener('change', function(e) {
-                    const fileList = document.getElementById('file-list');
-                    fileList.innerHTML = ''; // Clear existing files
-                    filesToUpload = []; // Reset files array
-                    
-                    Array.from(e.target.files).forEach(file => {
-                        addFileToList(file);
-                    });
-                });
-
-                async function uploadForm(event) {
-                    event.preventDefault();
-                    
-                    if (filesToUpload.length === 0) {
-                        alert('Please select at least one file');
-                        return;
-                    }
-
-                    const uploadButton = document.querySelector('.upload-button');
-                    const originalButtonText = uploadButton.textContent;
-                    
-                    // Show loading state
-                    uploadButton.classList.add('loading');
-                    uploadButton.disabled = true;
-                    uploadButton.innerHTML = `
-                        <div class="loading-spinner"></div>
-                        Uploading...
-                    `;
-
-                    try {
-                        for (const file of filesToUpload) {
-                            const fileItem = Array.from(document.querySelectorAll('.file-item')).find(
-                                item => item.querySelector('.file-name').textContent === file.name
-                            );
-                            const formType = fileItem.querySelector('.form-type-select').value;
-                            
-                            const formData = new FormData();
-                            formData.append('file', file);
-                            formData.append('form_type', formType);
-                            formData.append('conversation_id', conversationId);
-
-                            const response = await fetch('/parse-tax-form', {
-                                method: 'POST',
-                                body: formData
-                            });
-
-                            const data = await response.json();
-                            
-                            // Store form data
-                            const formId = Date.now() + Math.random().toString(36).substr(2, 9);
-                            parsedForms[formId] = { type: formType, data: data };
-                            
-                            // Display parsed form data
-                            displayParsedForm(formId, formType, data);
-                        }
-                        
-                        // Clear file input and list
-                        document.getElementById('file-input').value = '';
-                        document.getElementById('file-list').innerHTML = '';
-                        filesToUpload = [];
-                        
-                    } catch (error) {
-                        console.error('Error:', error);
-                        alert('Error uploading files. Please try again.');
-                    } finally {
-                        // Reset button state
-                        uploadButton.classList.remove('loading');
-                        uploadButton.disabled = false;
-                        uploadButton.textContent = originalButtonText;
-                    }
-                }
-
-                function displayParsedForm(formId, formType, data) {
-                    const parsedForms = document.getElementById('parsed-forms');
-                    const formCard = document.createElement('div');
-                    formCard.className = 'form-card';
-                    formCard.id = `form-${formId}`;
-                    
-                    let html = `
-                        <h3>
-                            ${formType}
-                            <button class="delete-form" onclick="deleteForm('${formId}')">×</button>
-                        </h3>
-                        <div class="form-data">
-                    `;
-                    
-                    for (const [key, value] of Object.entries(data)) {
-                        html += `
-                            <div class="data-item">
-                                <div class="data-label">${key.replace(/_/g, ' ').toUpperCase()}</div>
-                                <div class="data-value">${value}</div>
-                            </div>
-                        `;
-                    }
-                    
-                    html += '</div>';
-                    formCard.innerHTML = html;
-                    parsedForms.appendChild(formCard);
-                }
-
-                function deleteForm(formId) {
-                    // Remove from DOM
-                    const formElement = document.getElementById(`form-${formId}`);
-                    if (formElement) {
-                        formElement.remove();
-                    }
-                    
-                    // Remove from storage
-                    delete parsedForms[formId];
-                }
-
-                async function sendMessage() {
-                    const input = document.getElementById('chat-input');
-                    const sendButton = document.getElementById('send-button');
-                    const message = input.value.trim();
-                    if (!message) return;
-
-                    // Disable input and button while processing
-                    input.classList.add('input-disabled');
-                    sendButton.disabled = true;
-
-                    // Add user message to chat
-                    const chatContainer = document.getElementById('chat-container');
-                    chatContainer.innerHTML += `
-                        <div class="message user-message">
-                            ${message}
-                        </div>
-                    `;
-
-                    // Show typing indicator
-                    chatContainer.innerHTML += `
-                        <div class="typing-indicator" id="typing-indicator">
-                            <div class="typing-dot"></div>
-                            <div class="typing-dot"></div>
-                            <div class="typing-dot"></div>
-                        </div>
-                    `;
-
-                    // Clear input and reset height
-                    input.value = '';
-                    input.style.height = 'auto';
-
-                    try {
-                        // Get all parsed forms data
-                        const parsedFormsData = {};
-                        for (const [formId, formData] of Object.entries(parsedForms)) {
-                            parsedFormsData[formId] = formData;
-                        }
-
-                        const response = await fetch('/tax-guidance', {
-                            method: 'POST',
-                            headers: {
-                                'Content-Type': 'application/json',
-                            },
-                            body: JSON.stringify({ 
-                                message: message,
-                                conversation_id: conversationId,
-                                parsed_forms: parsedFormsData
-                            })
-                        });
-
-                        const data = await response.json();
-                        
-                        // Update conversation ID if provided
-                        if (data.conversation_id) {
-                            conversationId = data.conversation_id;
-                        }
-                        
-                        // Remove typing indicator
-                        document.getElementById('typing-indicator').remove();
-                        
-                        // Add bot response to chat
-                        chatContainer.innerHTML += `
-                            <div class="message bot-message">
-                                ${data.response}
-                            </div>
-                        `;
-
-                        // Scroll to bottom
-                        chatContainer.scrollTop = chatContainer.scrollHeight;
-                    } catch (error) {
-                        console.error('Error:', error);
-                        document.getElementById('typing-indicator').remove();
-                        chatContainer.innerHTML += `
-                            <div class="message bot-message">
-                                Sorry, there was an error processing your request. Please try again.
-                            </div>
-                        `;
-                    } finally {
-                        // Re-enable input and button
-                        input.classList.remove('input-disabled');
-                        sendButton.disabled = false;
-                        input.focus();
-                    }
-                }
-
-                // Allow sending message with Enter key
-                document.getElementById('chat-input').addEventListener('keypress', function(e) {
-                    if (e.key === 'Enter' && !e.shiftKey) {
-                        e.preventDefault();
-                        sendMessage();
-                    }
-                });
-
-                // Handle form upload
-                document.getElementById('upload-form').addEventListener('submit', uploadForm);
-            </script>
-        </body>
-    </html>
-    """
+async def cleanup_exports_periodically():
+    """Delete export archives past their retention period once an hour."""
+    while True:
+        try:
+            await asyncio.to_thread(export_jobs.cleanup)
+        except Exception as e:
+            print(f"Error cleaning up exports: {str(e)}")
+        await asyncio.sleep(3600)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Observe request latency and optionally return a Server-Timing stage breakdown."""
+    timings = start_request_timings()
+    capture = request_profiler.start(request_profiler.requested(request.headers.get("x-profile")))
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        request_profiler.finish(capture, request.method, request.url.path, 500, time.perf_counter() - start, timings)
+        raise
+    total = time.perf_counter() - start
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(total)
+    entry = request_profiler.finish(capture, request.method, request.url.path, response.status_code, total, timings)
+    if entry is not None:
+        response.headers["X-Profile-Id"] = entry["id"]
+    if SERVER_TIMING or request.headers.get("x-server-timing") == "1":
+        response.headers["Server-Timing"] = server_timing_header(timings, total)
+    return response
+
+def require_profiling_token(x_admin_token: str = Header(None)):
+    """Profiling admin endpoints are only served when PROFILING_TOKEN is set and sent."""
+    if not request_profiler.token:
+        raise HTTPException(status_code=404, detail="Not found")
+    if x_admin_token != request_profiler.token:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/profiles", dependencies=[Depends(require_profiling_token)])
+async def list_profiles():
+    """Captured slow or flagged requests, newest first."""
+    return {"profiles": request_profiler.list()}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_profiling_token)])
+async def get_profile(profile_id: str, sort: str = "cumulative", limit: int = 30):
+    """Stage timings and the top functions of one captured request."""
+    entry = request_profiler.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if sort not in ("cumulative", "tottime", "ncalls"):
+        raise HTTPException(status_code=400, detail=f"Unsupported sort: {sort}")
+    summary = await asyncio.to_thread(request_profiler.summary, profile_id, limit, sort)
+    return dict(entry, summary=summary)
+
+@app.get("/admin/profiles/{profile_id}/download", dependencies=[Depends(require_profiling_token)])
+async def download_profile(profile_id: str):
+    """Download the raw cProfile data (open with pstats or snakeviz)."""
+    path = request_profiler.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms, request latency and Claude usage."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe; its latency under load measures event-loop lag."""
+    return {"status": "ok"}
+
+@app.get("/", include_in_schema=False)
+async def root(request: Request):
+    return static_assets.response(static_assets.index, request)
+
+@app.get("/static/{filename}", include_in_schema=False)
+async def static_file(filename: str, request: Request):
+    """Content-hashed UI assets; unknown or stale hashes are 404s."""
+    asset = static_assets.get(filename)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return static_assets.response(asset, request)
 
 def extract_text_from_image(image_path: str) -> str:
     """Extract text from an image using Tesseract OCR."""
     try:
-        return pytesseract.image_to_string(Image.open(image_path))
+        with stage("ocr"):
+            return pytesseract.image_to_string(Image.open(image_path))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
 
@@ -756,183 +185,53 @@ def extract_text_from_pdf(pdf_path: str) -> str:
     """Extract text from a PDF using Tesseract OCR."""
     try:
         # Convert PDF to images
-        images = convert_from_path(pdf_path)
+        with stage("rasterize"):
+            images = convert_from_path(pdf_path)
         text = ""
         for image in images:
-            text += pytesseract.image_to_string(image)
+            with stage("ocr"):
+                text += pytesseract.image_to_string(image)
         return text
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PDF processing failed: {str(e)}")
 
-def extract_text_from_pdf_by_boxes(pdf_path: str, form_type: str) -> dict:
-    """Extract text from a PDF by specific box regions based on form type."""
+def create_claude_message(call: str, **kwargs):
+    """Call the Messages API, recording latency, outcome and token usage for ``call``."""
+    with stage(f"llm_{call}"):
+        try:
+            response = client.messages.create(**kwargs)
+        except Exception as e:
+            record_llm_call(call, error=e)
+            raise
+    record_llm_call(call, response)
+    return response
+
+def complete_field_repair(prompt: str, max_tokens: int) -> str:
+    """Ask Claude to correct a handful of OCR'd fields."""
+    response = create_claude_message(
+        "field_repair",
+        model=FIELD_REPAIR_MODEL,
+        max_tokens=max_tokens,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    return response.content[0].text
+
+def extract_fields_hybrid(file_path: str, form_type: str) -> Optional[dict]:
+    """Box OCR with Claude repairing only failing fields; None if the layout does not match."""
     try:
-        # Convert PDF to images
-        images = convert_from_path(pdf_path)
-        result = {}
-        
-        # Define box regions for different form types
-        if form_type.lower() == "w-2":
-            # W-2 box coordinates (x, y, width, height)
-            boxes = {
-                "employee_ssn": (100, 100, 200, 30),  # Box a
-                "employer_ein": (100, 150, 200, 30),  # Box b
-                "wages_tips_other": (100, 200, 200, 30),  # Box 1
-                "federal_income_tax": (100, 250, 200, 30),  # Box 2
-                "social_security_wages": (100, 300, 200, 30),  # Box 3
-                "social_security_tax": (100, 350, 200, 30),  # Box 4
-                "medicare_wages": (100, 400, 200, 30),  # Box 5
-                "medicare_tax": (100, 450, 200, 30),  # Box 6
-                "social_security_tips": (100, 500, 200, 30),  # Box 7
-                "allocated_tips": (100, 550, 200, 30),  # Box 8
-                "dependent_care_benefits": (100, 600, 200, 30),  # Box 10
-                "nonqualified_plans": (100, 650, 200, 30),  # Box 11
-                "statutory_employee": (100, 700, 30, 30),  # Box 13 checkbox
-                "retirement_plan": (150, 700, 30, 30),  # Box 13 checkbox
-                "third_party_sick_pay": (200, 700, 30, 30),  # Box 13 checkbox
-                "state": (100, 750, 200, 30),  # Box 15
-                "state_id": (100, 800, 200, 30),  # Box 15
-                "state_wages": (100, 850, 200, 30),  # Box 16
-                "state_income_tax": (100, 900, 200, 30),  # Box 17
-                "local_wages": (100, 950, 200, 30),  # Box 18
-                "local_income_tax": (100, 1000, 200, 30),  # Box 19
-                "locality_name": (100, 1050, 200, 30),  # Box 20
-            }
-        elif form_type.lower() == "1099-nec":
-            # 1099-NEC box coordinates
-            boxes = {
-                "payer_name": (100, 100, 200, 30),
-                "payer_address": (100, 150, 200, 60),
-                "payer_tin": (100, 250, 200, 30),
-                "recipient_name": (100, 300, 200, 30),
-                "recipient_address": (100, 350, 200, 60),
-                "recipient_tin": (100, 450, 200, 30),
-                "nonemployee_compensation": (100, 500, 200, 30),
-                "federal_income_tax": (100, 550, 200, 30),
-                "state": (100, 600, 200, 30),
-                "state_income": (100, 650, 200, 30),
-                "state_tax_withheld": (100, 700, 200, 30),
-                "local_income": (100, 750, 200, 30),
-                "local_tax_withheld": (100, 800, 200, 30),
-            }
-        elif form_type.lower() == "1099-misc":
-            # 1099-MISC box coordinates
-            boxes = {
-                "payer_name": (100, 100, 200, 30),
-                "payer_address": (100, 150, 200, 60),
-                "payer_tin": (100, 250, 200, 30),
-                "recipient_name": (100, 300, 200, 30),
-                "recipient_address": (100, 350, 200, 60),
-                "recipient_tin": (100, 450, 200, 30),
-                "rents": (100, 500, 200, 30),
-                "royalties": (100, 550, 200, 30),
-                "other_income": (100, 600, 200, 30),
-                "federal_income_tax": (100, 650, 200, 30),
-                "fishing_boat_proceeds": (100, 700, 200, 30),
-                "medical_health_care_payments": (100, 750, 200, 30),
-                "nonemployee_compensation": (100, 800, 200, 30),
-                "substitute_payments": (100, 850, 200, 30),
-                "crop_insurance_proceeds": (100, 900, 200, 30),
-                "state": (100, 950, 200, 30),
-                "state_income": (100, 1000, 200, 30),
-                "state_tax_withheld": (100, 1050, 200, 30),
-            }
-        elif form_type.lower() == "1099-int":
-            # 1099-INT box coordinates
-            boxes = {
-                "payer_name": (100, 100, 200, 30),
-                "payer_address": (100, 150, 200, 60),
-                "payer_tin": (100, 250, 200, 30),
-                "recipient_name": (100, 300, 200, 30),
-                "recipient_address": (100, 350, 200, 60),
-                "recipient_tin": (100, 450, 200, 30),
-                "interest_income": (100, 500, 200, 30),
-                "early_withdrawal_penalty": (100, 550, 200, 30),
-                "federal_income_tax": (100, 600, 200, 30),
-                "state": (100, 650, 200, 30),
-                "state_income": (100, 700, 200, 30),
-                "state_tax_withheld": (100, 750, 200, 30),
-            }
-        elif form_type.lower() == "1099-div":
-            # 1099-DIV box coordinates
-            boxes = {
-                "payer_name": (100, 100, 200, 30),
-                "payer_address": (100, 150, 200, 60),
-                "payer_tin": (100, 250, 200, 30),
-                "recipient_name": (100, 300, 200, 30),
-                "recipient_address": (100, 350, 200, 60),
-                "recipient_tin": (100, 450, 200, 30),
-                "ordinary_dividends": (100, 500, 200, 30),
-                "qualified_dividends": (100, 550, 200, 30),
-                "capital_gain_distributions": (100, 600, 200, 30),
-                "federal_income_tax": (100, 650, 200, 30),
-                "state": (100, 700, 200, 30),
-                "state_income": (100, 750, 200, 30),
-                "state_tax_withheld": (100, 800, 200, 30),
-            }
-        elif form_type.lower() == "1099-b":
-            # 1099-B box coordinates
-            boxes = {
-                "payer_name": (100, 100, 200, 30),
-                "payer_address": (100, 150, 200, 60),
-                "payer_tin": (100, 250, 200, 30),
-                "recipient_name": (100, 300, 200, 30),
-                "recipient_address": (100, 350, 200, 60),
-                "recipient_tin": (100, 450, 200, 30),
-                "description": (100, 500, 200, 30),
-                "date_acquired": (100, 550, 200, 30),
-                "date_sold": (100, 600, 200, 30),
-                "proceeds": (100, 650, 200, 30),
-                "cost_basis": (100, 700, 200, 30),
-                "wash_sale_loss_disallowed": (100, 750, 200, 30),
-                "federal_income_tax": (100, 800, 200, 30),
-            }
-        elif form_type.lower() == "1099-r":
-            # 1099-R box coordinates
-            boxes = {
-                "payer_name": (100, 100, 200, 30),
-                "payer_address": (100, 150, 200, 60),
-                "payer_tin": (100, 250, 200, 30),
-                "recipient_name": (100, 300, 200, 30),
-                "recipient_address": (100, 350, 200, 60),
-                "recipient_tin": (100, 450, 200, 30),
-                "gross_distribution": (100, 500, 200, 30),
-                "taxable_amount": (100, 550, 200, 30),
-                "federal_income_tax": (100, 600, 200, 30),
-                "employee_contributions": (100, 650, 200, 30),
-                "state": (100, 700, 200, 30),
-                "state_distribution": (100, 750, 200, 30),
-                "state_tax_withheld": (100, 800, 200, 30),
-            }
-        else:
-            raise ValueError(f"Unsupported form type: {form_type}")
-        
-        # Process each page
-        for image in images:
-            for box_name, (x, y, width, height) in boxes.items():
-                # Crop the image to the box region
-                box_image = image.crop((x, y, x + width, y + height))
-                
-                # Extract text from the box
-                text = pytesseract.image_to_string(box_image).strip()
-                
-                # For checkbox fields, detect if checked
-                if box_name in ["statutory_employee", "retirement_plan", "third_party_sick_pay"]:
-                    # Convert to boolean based on presence of marks
-                    result[box_name] = bool(re.search(r'[Xx✓]', text))
-                else:
-                    result[box_name] = text
-        
-        return result
-        
+        return hybrid_parser.parse(file_path, form_type, complete_field_repair)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PDF box processing failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Box processing failed: {str(e)}")
 
-def process_with_claude(text: str) -> dict:
+def process_with_claude(text: str, form_type: str = "W-2") -> dict:
     """Process OCR text with Claude AI to extract structured data."""
-    # Get relevant context from IRS guides
-    context = rag_handler.get_relevant_context(text)
+    # Attach the precomputed IRS guide context for this form type; per-document
+    # retrieval over the raw OCR text is opt-in via RAG_PER_DOCUMENT_RETRIEVAL
+    with stage("retrieval"):
+        per_document = os.getenv("RAG_PER_DOCUMENT_RETRIEVAL", "").lower() in ("1", "true", "yes")
+        context = rag_handler.get_form_context(form_type, text if per_document else None)
     
+    prompt_start = time.perf_counter()
     prompt = f"""You are a tax document parser with access to IRS tax guides. Given raw OCR output from a scanned tax form, extract the following fields and return them in strict JSON format. Make sure all property names are enclosed in double quotes.
 
 For checkbox fields, use true/false instead of strings. A checkbox is considered checked (true) if:
@@ -1073,9 +372,11 @@ IMPORTANT: Return ONLY valid JSON. Do not include any additional text or explana
 
 Here is the OCR text to process:
 {text}"""
+    observe_stage("prompt", time.perf_counter() - prompt_start)
 
     try:
-        response = client.messages.create(
+        response = create_claude_message(
+            "extraction",
             model="claude-3-opus-20240229",
             max_tokens=1000,
             messages=[{"role": "user", "content": prompt}]
@@ -1153,13 +454,15 @@ async def parse_tax_form(file: UploadFile, form_type: str = "W-2", conversation_
         temp_file_path = temp_file.name
     
     try:
-        # Extract text based on file type
-        if file.filename.lower().endswith('.pdf'):
-            result = extract_text_from_pdf_by_boxes(temp_file_path, form_type)
-        else:
-            # For non-PDF files, use the existing image processing
-            text = extract_text_from_image(temp_file_path)
-            result = process_with_claude(text)
+        # Box OCR first; Claude only sees the fields that failed validation
+        result = extract_fields_hybrid(temp_file_path, form_type)
+        if result is None:
+            # The upload does not match the box layout; extract from the full page
+            if file.filename.lower().endswith('.pdf'):
+                text = extract_text_from_pdf(temp_file_path)
+            else:
+                text = extract_text_from_image(temp_file_path)
+            result = process_with_claude(text, form_type)
         
         # If conversation_id is provided, store the parsed form data
         if conversation_id:
@@ -1186,8 +489,44 @@ async def get_tax_guidance(request: TaxGuidanceRequest):
     # Add user message to conversation history
     conversation.add_message("user", request.message)
     
+    # Static facts (deadlines, limits, standard deductions) come from the local table
+    with stage("fact_router"):
+        fact_answer = tax_fact_router.answer(request.message)
+    if fact_answer:
+        GUIDANCE_ANSWERS.labels("fact_table").inc()
+        conversation.add_message("assistant", fact_answer)
+        return {
+            "response": fact_answer,
+            "conversation_id": request.conversation_id or "default"
+        }
+    
     # Get conversation history and parsed forms
     history = conversation.get_messages()
+
+    # Exact totals over the forms in play: the ones sent with the request,
+    # otherwise the ones uploaded to this conversation
+    if request.parsed_forms:
+        forms = [(form.get('type'), form.get('data', {})) for form in request.parsed_forms.values()]
+    else:
+        forms = [
+            (form_type, form_data)
+            for form_type, items in conversation.get_parsed_forms().items() for form_data in items
+        ]
+    with stage("aggregation"):
+        summary = tax_aggregator.aggregate(forms)
+        direct_answer = tax_aggregator.answer(request.message, summary)
+    if direct_answer:
+        # Plain "how much" questions about the forms need no model call
+        GUIDANCE_ANSWERS.labels("aggregation").inc()
+        conversation.add_message("assistant", direct_answer)
+        return {
+            "response": direct_answer,
+            "conversation_id": request.conversation_id or "default"
+        }
+    tax_facts = tax_aggregator.prompt_facts(summary)
+    facts_context = ""
+    if tax_facts:
+        facts_context = f"\nPrecomputed totals (exact, computed locally from the parsed forms):\n{tax_facts}\n"
     
     # Format parsed forms for context
     form_context = ""
@@ -1197,8 +536,11 @@ async def get_tax_guidance(request: TaxGuidanceRequest):
             form_type = form_data.get('type', 'Unknown')
             form_context += f"\n{form_type} Form:\n"
             for key, value in form_data.get('data', {}).items():
+                if key.startswith('_'):
+                    continue
                 form_context += f"{key}: {value}\n"
     
+    prompt_start = time.perf_counter()
     prompt = f"""You are a personalized tax advisor for the 2024 tax year (filing in 2025). You have access to the user's specific tax documents and should provide tailored advice based on their actual tax situation.
 
 The user has asked the following question: "{request.message}"
@@ -1207,7 +549,7 @@ Previous conversation context:
 {json.dumps(history[:-1], indent=2) if len(history) > 1 else "No previous context"}
 
 {form_context}
-
+{facts_context}
 Your role is to provide **comprehensive, personalized, and actionable** tax advice based on:
 1. The user's specific tax situation as shown in their uploaded forms
 2. Current IRS guidelines (as of 2024)
@@ -1218,7 +560,7 @@ Your role is to provide **comprehensive, personalized, and actionable** tax advi
 When structuring your response:
 1. Start with a clear, direct answer to the user's question
 2. Reference specific data from their uploaded tax forms when relevant
-3. Calculate and show totals based on their actual forms
+3. Quote the precomputed totals for any sums rather than recalculating them
 4. Follow with detailed explanations and relevant examples
 5. Include specific numbers, percentages, and thresholds when applicable
 6. Use clear formatting:
@@ -1232,7 +574,7 @@ When structuring your response:
 IMPORTANT:
 - ALWAYS check the parsed forms data first before responding
 - If forms are present in the parsed_forms data, reference the specific numbers and data from those forms
-- For income-related questions, calculate and show the total based on all uploaded forms
+- For income-related questions, use the precomputed totals, which already cover all uploaded forms
 - If no forms are present in the parsed_forms data, then state that you need the forms to provide specific numbers
 - Never say you don't have access to the forms if they are present in the parsed_forms data
 - Maintain context from previous messages when relevant
@@ -1240,9 +582,11 @@ IMPORTANT:
 - Use the parsed form data to provide tailored advice specific to their situation
 
 Remember: You are their personal tax advisor. Your advice should be specific to their situation, not generic tax information."""
+    observe_stage("prompt", time.perf_counter() - prompt_start)
 
     try:
-        response = client.messages.create(
+        response = create_claude_message(
+            "guidance",
             model="claude-3-opus-20240229",
             max_tokens=2000,
             temperature=0.7,
@@ -1251,6 +595,7 @@ Remember: You are their personal tax advisor. Your advice should be specific to
         
         # Add assistant's response to conversation history
         conversation.add_message("assistant", response.content[0].text)
+        GUIDANCE_ANSWERS.labels("llm").inc()
         
         return {
             "response": response.content[0].text,
@@ -1263,44 +608,126 @@ Remember: You are their personal tax advisor. Your advice should be specific to
             detail=f"Tax guidance generation failed: {str(e)}"
         )
 
+@app.get("/tax-facts/stats")
+async def tax_facts_stats():
+    """Fact table version and how many guidance questions it answered."""
+    return tax_fact_router.stats()
+
+@app.get("/rag/cache-stats")
+async def rag_cache_stats():
+    """Hit-rate metrics for the RAG query caches."""
+    return rag_handler.cache_stats()
+
+@app.get("/rag/context-stats")
+async def rag_context_stats():
+    """Tokens saved by context assembly compared to concatenating raw chunks."""
+    return rag_handler.context_stats()
+
+def _export_job_response(job: dict) -> dict:
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "formats": job["formats"],
+        "status_url": f"/exports/{job['job_id']}",
+        "download_url": f"/exports/{job['job_id']}/download"
+    }
+
 @app.post("/export-tax-data")
 async def export_tax_data(
     data: dict,
     form_type: str,
-    export_format: str = "json",
-    output_path: Optional[str] = None
+    export_format: str = "json"
 ):
-    """Export parsed tax data to various formats."""
+    """Export parsed tax data in the background; export_format may list several formats."""
     try:
-        # Generate output path if not provided
-        if not output_path:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"export_{form_type}_{timestamp}.{export_format.lower()}"
-        
-        # Export based on format
-        if export_format.lower() == "proseries":
-            result_path = tax_export.export_to_proseries(data, form_type, output_path)
-        elif export_format.lower() == "lacerte":
-            result_path = tax_export.export_to_lacerte(data, form_type, output_path)
-        elif export_format.lower() == "json":
-            result_path = tax_export.export_to_json(data, output_path)
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported export format: {export_format}"
-            )
-        
-        return {
-            "message": "Export successful",
-            "path": result_path,
-            "format": export_format
-        }
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Export failed: {str(e)}"
-        )
+        job = export_jobs.submit({form_type: [data]}, export_format.split(","))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _export_job_response(job)
+
+class ExportArchiveRequest(BaseModel):
+    export_formats: List[str] = ["json"]
+    forms: Optional[Dict[str, List[dict]]] = None
+    conversation_ids: Optional[List[str]] = None
+
+@app.post("/exports")
+async def create_export_archive(request: ExportArchiveRequest):
+    """Package forms from many clients into one compressed archive in the background."""
+    forms: Dict[str, List[dict]] = {}
+    for form_type, items in (request.forms or {}).items():
+        forms.setdefault(form_type, []).extend(items)
+    for conversation_id in request.conversation_ids or []:
+        if conversation_id not in conversations:
+            raise HTTPException(status_code=404, detail=f"Unknown conversation: {conversation_id}")
+        for form_type, items in conversations[conversation_id].get_parsed_forms().items():
+            forms.setdefault(form_type, []).extend(items)
+    if not forms:
+        raise HTTPException(status_code=400, detail="No forms to export")
+    
+    try:
+        job = export_jobs.submit(forms, request.export_formats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _export_job_response(job)
+
+@app.get("/exports/{job_id}")
+async def get_export_status(job_id: str):
+    """Status, archive size and per-format timings of an export job."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+@app.get("/exports/{job_id}/download")
+async def download_export(job_id: str):
+    """Download the compressed archive of a finished export job."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+    export_jobs.mark_accessed(job)
+    return FileResponse(
+        export_jobs.archive_path(job),
+        media_type="application/zstd" if job["compression"] == "zstd" else "application/gzip",
+        filename=job["archive"]
+    )
+
+class BulkExportRequest(BaseModel):
+    form_type: str
+    export_format: str = "proseries"
+    forms: Optional[List[dict]] = None
+    conversation_id: Optional[str] = None
+
+@app.post("/export-tax-data/bulk")
+async def export_tax_data_bulk(request: BulkExportRequest):
+    """Stream many parsed forms of one type as a single ProSeries/Lacerte CSV download."""
+    if request.forms is not None:
+        forms = request.forms
+    elif request.conversation_id and request.conversation_id in conversations:
+        forms = conversations[request.conversation_id].get_parsed_forms().get(request.form_type, [])
+    else:
+        raise HTTPException(status_code=400, detail="Provide forms or a known conversation_id")
+    
+    export_format = request.export_format.lower()
+    try:
+        rows = tax_export.iter_bulk_csv(forms, request.form_type, export_format)
+        # Produce the header eagerly so mapping errors surface as a 400, not a broken stream
+        first_chunk = next(rows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def stream():
+        yield first_chunk
+        yield from rows
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"export_{request.form_type}_{export_format}_{timestamp}.csv"
+    return StreamingResponse(
+        stream(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,81 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Stage durations range from sub-millisecond crops to multi-second Claude calls
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "taxai_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "taxai_request_seconds", "HTTP request latency", ["method", "route", "status"], buckets=STAGE_BUCKETS
+)
+LLM_CALLS = Counter("taxai_llm_calls_total", "Claude API calls", ["call", "outcome"])
+LLM_TOKENS = Counter("taxai_llm_tokens_total", "Claude tokens used", ["call", "direction"])
+# How uploads were parsed: "ocr" (no LLM), "repaired" (failing fields only) or "full_page"
+PARSE_PATHS = Counter("taxai_parse_path_total", "Uploads by parsing path", ["path"])
+LLM_REPAIRED_FIELDS = Counter("taxai_llm_repaired_fields_total", "Fields sent to Claude for repair")
+# How /tax-guidance questions were answered: "fact_table", "aggregation" (local totals) or "llm"
+GUIDANCE_ANSWERS = Counter("taxai_guidance_answers_total", "Tax guidance answers by source", ["source"])
+DUPLICATE_COPIES = Counter("taxai_duplicate_copies_total", "Form copies whose OCR was reused from an identical copy")
+
+# Per-request stage totals; None outside a request (e.g. background export jobs)
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def observe_stage(name: str, seconds: float):
+    """Record ``seconds`` spent in pipeline stage ``name``.
+
+    The duration is observed in the stage histogram and, inside a request,
+    added to that request's timing breakdown. Repeated stages (one OCR call
+    per box) accumulate.
+    """
+    STAGE_SECONDS.labels(name).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as pipeline stage ``name``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def record_llm_call(call: str, response=None, error: Optional[Exception] = None):
+    """Count a Claude call and, when it succeeded, its input/output tokens."""
+    if error is not None:
+        LLM_CALLS.labels(call, type(error).__name__).inc()
+        return
+    LLM_CALLS.labels(call, "ok").inc()
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.labels(call, "input").inc(getattr(usage, "input_tokens", 0) or 0)
+        LLM_TOKENS.labels(call, "output").inc(getattr(usage, "output_tokens", 0) or 0)
+
+
+def start_request_timings() -> Dict[str, float]:
+    """Begin collecting stage timings for the current request."""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    """Format stage timings as a Server-Timing header (durations in milliseconds)."""
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def render_metrics():
+    """Prometheus exposition body and content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,151 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROFILE_ID_PATTERN = re.compile(r"^\d{13}-[0-9a-f]{8}$")
+
+
+class RequestProfiler:
+    """Captures cProfile data for slow or flagged requests into an on-disk ring buffer.
+
+    A request is profiled when it carries the debug header with the
+    configured token, or when it is picked by ``sample_rate``. Sampled
+    profiles are kept only if the request took at least ``threshold_ms``;
+    slow requests that were not profiled are still recorded with their stage
+    timings, so there is always a trail to the stage that was slow.
+
+    cProfile only sees the thread it was enabled on. The upload and chat
+    handlers run their OCR and prompt building on the event loop thread, so
+    that is where profiling happens; work handed to thread pools shows up as
+    the time spent waiting for it. Only one request is profiled at a time,
+    and each profile records how many other requests were in flight.
+    """
+
+    def __init__(self, directory: str = "profiles", max_entries: int = 50,
+                 threshold_ms: float = 5000.0, sample_rate: float = 0.0,
+                 token: Optional[str] = None):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.token = token
+        self._active = False
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def requested(self, header_value: Optional[str]) -> bool:
+        return bool(self.token) and header_value == self.token
+
+    def start(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """Begin a request; returns a capture handle for ``finish``."""
+        with self._lock:
+            self._in_flight += 1
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+            if not (force or sampled) or self._active:
+                return {"profiler": None, "forced": force, "concurrent": self._in_flight - 1}
+            self._active = True
+            concurrent = self._in_flight - 1
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return {"profiler": profiler, "forced": force, "concurrent": concurrent}
+
+    def finish(self, capture: Dict[str, Any], method: str, path: str, status: int,
+               total_seconds: float, timings: Dict[str, float]) -> Optional[Dict[str, Any]]:
+        """Stop profiling and store the capture if it was forced or the request was slow."""
+        profiler = capture["profiler"]
+        if profiler is not None:
+            profiler.disable()
+        with self._lock:
+            self._in_flight -= 1
+            if profiler is not None:
+                self._active = False
+
+        total_ms = total_seconds * 1000
+        if not capture["forced"] and total_ms < self.threshold_ms:
+            return None
+        entry = {
+            "id": f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}",
+            "method": method,
+            "path": path,
+            "status": status,
+            "total_ms": round(total_ms, 2),
+            "stage_ms": {name: round(seconds * 1000, 2) for name, seconds in timings.items()},
+            "reason": "header" if capture["forced"] else "slow",
+            "has_profile": profiler is not None,
+            "concurrent_requests": capture["concurrent"]
+        }
+        self._store(entry, profiler)
+        return entry
+
+    def _store(self, entry: Dict[str, Any], profiler: Optional[cProfile.Profile]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if profiler is not None:
+            profiler.dump_stats(self.directory / f"{entry['id']}.prof")
+        temp_path = self.directory / f"{entry['id']}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(entry, f, indent=2)
+        os.replace(temp_path, self.directory / f"{entry['id']}.json")
+        self._evict()
+
+    def _evict(self):
+        """Drop the oldest entries beyond ``max_entries``; ids sort by capture time."""
+        entries = sorted(self.directory.glob("*.json"))
+        for path in entries[:max(0, len(entries) - self.max_entries)]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".prof").unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        if not self.directory.exists():
+            return []
+        entries = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                with open(path, "r") as f:
+                    entries.append(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                # Evicted or half-written by another worker
+                continue
+        return entries
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.json"
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def profile_path(self, profile_id: str) -> Optional[Path]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.prof"
+        return path if path.exists() else None
+
+    def summary(self, profile_id: str, limit: int = 30, sort: str = "cumulative") -> Optional[str]:
+        """Top functions of a stored profile as pstats text."""
+        path = self.profile_path(profile_id)
+        if path is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(str(path), stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+# Initialize request profiler
+request_profiler = RequestProfiler(
+    directory=os.getenv("PROFILING_DIR", "profiles"),
+    max_entries=int(os.getenv("PROFILING_MAX_ENTRIES", "50")),
+    threshold_ms=float(os.getenv("PROFILING_THRESHOLD_MS", "5000")),
+    sample_rate=float(os.getenv("PROFILING_SAMPLE_RATE", "0")),
+    token=os.getenv("PROFILING_TOKEN") or None
+)
@@ -1,139 +1,589 @@
+import argparse
+import hashlib
+import heapq
+import io
 import os
-from typing import List, Dict
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Hashable, List, Dict, Iterator, Optional, Tuple
 import chromadb
 from chromadb.config import Settings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import json
 from pathlib import Path
+from index_manifest import IndexManifest
+from embeddings import DEFAULT_EMBEDDING_MODEL, LazyEmbeddings
+from vector_index import NumpyVectorIndex
+from bm25_index import BM25Index
+from chunking import StructureAwareChunker
+from context_assembler import ContextAssembler
+
+# IRS Publication URLs for relevant guides
+IRS_GUIDES = [
+    {
+        "url": "https://www.irs.gov/pub/irs-pdf/p15.pdf",
+        "title": "Employer's Tax Guide"
+    },
+    {
+        "url": "https://www.irs.gov/pub/irs-pdf/i1040gi.pdf",
+        "title": "IRS Tax Guide for Individuals"
+    },
+    {
+        "url": "https://www.irs.gov/pub/irs-pdf/p17.pdf",
+        "title": "Your Federal Income Tax"
+    },
+    {
+        "url": "https://www.irs.gov/pub/irs-pdf/p334.pdf",
+        "title": "Tax Guide for Small Business"
+    },
+    {
+        "url": "https://www.irs.gov/pub/irs-pdf/p525.pdf",
+        "title": "Taxable and Nontaxable Income"
+    }
+]
+
+# Retrieval queries used to precompute the guide context bundle for each form type
+FORM_CONTEXT_QUERIES = {
+    "W-2": [
+        "Form W-2 wage and tax statement box 1 wages tips other compensation",
+        "W-2 box 12 codes and box 13 statutory employee retirement plan third-party sick pay",
+        "social security and Medicare wages and tax withheld"
+    ],
+    "1099-NEC": [
+        "Form 1099-NEC nonemployee compensation reporting",
+        "self-employment income and backup withholding for independent contractors"
+    ],
+    "1099-INT": [
+        "Form 1099-INT interest income reporting",
+        "early withdrawal penalty on savings deduction"
+    ],
+    "1099-DIV": [
+        "Form 1099-DIV ordinary and qualified dividends",
+        "capital gain distributions reporting"
+    ],
+    "1099-B": [
+        "Form 1099-B proceeds from broker transactions cost basis",
+        "wash sale loss disallowed and date acquired date sold"
+    ],
+    "1099-R": [
+        "Form 1099-R distributions from pensions annuities retirement plans IRAs",
+        "taxable amount of distribution and employee contributions"
+    ],
+    "1099-MISC": [
+        "Form 1099-MISC rents royalties other income",
+        "fishing boat proceeds medical and health care payments crop insurance"
+    ]
+}
+
+# Bump when FORM_CONTEXT_QUERIES change so stored bundles are rebuilt
+FORM_CONTEXT_VERSION = 3
+
+# Retrieval modes: embedding similarity, BM25 only, or a fusion of both
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+
+# Rank offset for reciprocal-rank fusion in hybrid retrieval
+RRF_K = 60
+
+# Pages with less embedded text than this are treated as scanned images
+MIN_TEXT_LAYER_CHARS = 20
+
+class LRUCache:
+    """Small thread-safe LRU cache that tracks its hit rate."""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
 
 class TaxGuideRAG:
-    def __init__(self):
-        # Initialize embeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+    def __init__(self, mirror_dir: Optional[str] = None, max_workers: int = 4, batch_size: int = 64):
+        # Initialize embeddings (backend, batch size and threads come from the
+        # environment). The model is loaded on first use, so lexical-only
+        # retrieval never loads it
+        self.embedding_model = DEFAULT_EMBEDDING_MODEL
+        self.embeddings = LazyEmbeddings(self.embedding_model)
         
-        # Initialize ChromaDB
+        # Initialize the vector index: ChromaDB (default) or the in-memory NumPy
+        # exact-search index selected with RAG_INDEX_BACKEND=numpy
         self.persist_directory = "tax_guides_db"
-        self.vectorstore = Chroma(
-            persist_directory=self.persist_directory,
-            embedding_function=self.embeddings
-        )
+        self.index_backend = os.getenv("RAG_INDEX_BACKEND", "chroma").lower()
+        if self.index_backend == "numpy":
+            self.index_directory = os.path.join(self.persist_directory, "numpy_index")
+            self.vectorstore = NumpyVectorIndex(self.index_directory, self.embeddings)
+        elif self.index_backend == "chroma":
+            self.index_directory = self.persist_directory
+            self.vectorstore = Chroma(
+                persist_directory=self.persist_directory,
+                embedding_function=self.embeddings
+            )
+        else:
+            raise ValueError(f"Unsupported RAG index backend: {self.index_backend}")
+        
+        # BM25 lexical index over the same chunks, persisted alongside the vectors
+        self.lexical_index = BM25Index(os.path.join(self.index_directory, "bm25.json"))
+        self.retrieval_mode = os.getenv("RAG_RETRIEVAL_MODE", "vector").lower()
+        self.hybrid_weight = float(os.getenv("RAG_HYBRID_VECTOR_WEIGHT", "0.5"))
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unsupported retrieval mode: {self.retrieval_mode}")
+        
+        # Initialize the section-aware chunker (strips running headers/footers,
+        # drops near-duplicate chunks)
+        self.chunker = StructureAwareChunker(chunk_size=1000)
+        self.chunker_settings = self.chunker.settings()
         
-        # Initialize text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
+        # Manifest of indexed documents, stored alongside the vector store
+        self.manifest = IndexManifest(os.path.join(self.index_directory, "manifest.json"))
+        
+        # Memoized query embeddings and top-k results (keyed by index version)
+        cache_size = int(os.getenv("RAG_CACHE_SIZE", "1024"))
+        self.embedding_cache = LRUCache(cache_size)
+        self.result_cache = LRUCache(cache_size)
+        
+        # Token-budgeted, diversity-aware assembly of retrieved chunks
+        self.context_assembler = ContextAssembler(
+            token_budget=int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1000"))
         )
+        self.context_totals = {"calls": 0, "baseline_tokens": 0, "context_tokens": 0, "tokens_saved": 0}
+        self.last_context_stats = {}
+        
+        # Precomputed per-form-type context bundles
+        self.form_contexts_path = os.path.join(self.index_directory, "form_contexts.json")
+        self.form_contexts = None
+        self.form_contexts_mtime = None
+        
+        # Ingestion settings; IRS_GUIDES_MIRROR points at a local copy of the PDFs
+        self.mirror_dir = mirror_dir or os.getenv("IRS_GUIDES_MIRROR")
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.session = None
     
-    def download_irs_guides(self) -> List[Dict]:
-        """Download and parse IRS tax guides."""
-        # IRS Publication URLs for relevant guides
-        guides = [
-            {
-                "url": "https://www.irs.gov/pub/irs-pdf/p15.pdf",
-                "title": "Employer's Tax Guide"
-            },
-            {
-                "url": "https://www.irs.gov/pub/irs-pdf/i1040gi.pdf",
-                "title": "IRS Tax Guide for Individuals"
-            },
-            {
-                "url": "https://www.irs.gov/pub/irs-pdf/p17.pdf",
-                "title": "Your Federal Income Tax"
-            },
-            {
-                "url": "https://www.irs.gov/pub/irs-pdf/p334.pdf",
-                "title": "Tax Guide for Small Business"
-            },
+    def _get_session(self) -> requests.Session:
+        """Return a pooled HTTP session shared by the download workers."""
+        if self.session is None:
+            adapter = HTTPAdapter(
+                pool_connections=self.max_workers,
+                pool_maxsize=self.max_workers,
+                max_retries=2
+            )
+            self.session = requests.Session()
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+        return self.session
+    
+    def _fetch_guide(self, guide: Dict) -> bytes:
+        """Fetch a guide PDF from the local mirror or from irs.gov."""
+        if self.mirror_dir:
+            mirror_path = Path(self.mirror_dir) / Path(guide["url"]).name
+            return mirror_path.read_bytes()
+        
+        response = self._get_session().get(guide["url"], timeout=60)
+        response.raise_for_status()
+        return response.content
+    
+    def _fetch_guides(self, guides: List[Dict]) -> Iterator[Tuple[Dict, bytes]]:
+        """Fetch guides concurrently, yielding each one as soon as it arrives."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._fetch_guide, guide): guide for guide in guides}
+            for future in as_completed(futures):
+                guide = futures[future]
+                try:
+                    yield guide, future.result()
+                except Exception as e:
+                    print(f"Error downloading {guide['title']}: {str(e)}")
+    
+    def _pdf_pages(self, pdf_bytes: bytes) -> Iterator[str]:
+        """Yield the text of each page, using OCR only for image-only pages."""
+        from pypdf import PdfReader
+        
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        for page_number, page in enumerate(reader.pages, 1):
+            text = page.extract_text() or ""
+            if len(text.strip()) < MIN_TEXT_LAYER_CHARS:
+                text = self._ocr_page(pdf_bytes, page_number)
+            yield text
+    
+    def _ocr_page(self, pdf_bytes: bytes, page_number: int) -> str:
+        """OCR a single page of a PDF with pdf2image and pytesseract."""
+        from pdf2image import convert_from_bytes
+        import pytesseract
+        
+        images = convert_from_bytes(pdf_bytes, first_page=page_number, last_page=page_number)
+        return "".join(pytesseract.image_to_string(image) for image in images)
+    
+    def _chunk_guide(self, guide: Dict, pdf_bytes: bytes) -> List[Dict]:
+        """Extract and chunk a single publication."""
+        chunks = self.chunker.split_pages(list(self._pdf_pages(pdf_bytes)))
+        print(f"Chunked {guide['title']}: {self.chunker.last_stats}")
+        
+        # Add metadata to each chunk
+        return [
             {
-                "url": "https://www.irs.gov/pub/irs-pdf/p525.pdf",
-                "title": "Taxable and Nontaxable Income"
+                "text": chunk["text"],
+                "metadata": {
+                    "source": guide["url"],
+                    "title": guide["title"],
+                    "section": chunk["section"],
+                    "chunk": i
+                }
             }
+            for i, chunk in enumerate(chunks)
         ]
-        
-        documents = []
-        for guide in guides:
+    
+    def iter_guide_documents(self, guides: Optional[List[Dict]] = None) -> Iterator[Dict]:
+        """Stream chunked IRS guide documents, one publication at a time."""
+        for guide, pdf_bytes in self._fetch_guides(guides or IRS_GUIDES):
             try:
-                response = requests.get(guide["url"])
-                if response.status_code == 200:
-                    # Save the PDF temporarily
-                    temp_path = f"temp_{guide['title']}.pdf"
-                    with open(temp_path, "wb") as f:
-                        f.write(response.content)
-                    
-                    # Convert PDF to text
-                    text = self._pdf_to_text(temp_path)
-                    
-                    # Split text into chunks
-                    chunks = self.text_splitter.split_text(text)
-                    
-                    # Add metadata and chunks to documents
-                    for i, chunk in enumerate(chunks):
-                        documents.append({
-                            "text": chunk,
-                            "metadata": {
-                                "source": guide["url"],
-                                "title": guide["title"],
-                                "chunk": i
-                            }
-                        })
-                    
-                    # Clean up
-                    os.remove(temp_path)
+                yield from self._chunk_guide(guide, pdf_bytes)
             except Exception as e:
                 print(f"Error processing {guide['title']}: {str(e)}")
-        
-        return documents
     
-    def _pdf_to_text(self, pdf_path: str) -> str:
-        """Convert PDF to text using pdf2image and pytesseract."""
-        from pdf2image import convert_from_path
-        import pytesseract
+    def download_irs_guides(self) -> List[Dict]:
+        """Download and parse IRS tax guides."""
+        return list(self.iter_guide_documents())
+    
+    def _chunk_ids(self, source: str, checksum: str, count: int) -> List[str]:
+        """Deterministic chunk ids that change whenever content or settings change."""
+        key = json.dumps([source, checksum, self.chunker_settings, self.embedding_model])
+        prefix = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return [f"{prefix}-{i}" for i in range(count)]
+    
+    def _add_documents(self, documents: List[Dict], ids: List[str]):
+        """Embed and add documents to the vector store in batches."""
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            texts = [doc["text"] for doc in batch]
+            metadatas = [doc["metadata"] for doc in batch]
+            batch_ids = ids[start:start + self.batch_size]
+            self.vectorstore.add_texts(texts=texts, metadatas=metadatas, ids=batch_ids)
+            self.lexical_index.add(batch_ids, texts, metadatas)
+    
+    def _delete_chunks(self, ids: List[str]):
+        if ids:
+            self.vectorstore.delete(ids=ids)
+            self.lexical_index.delete(ids)
+    
+    def _persist_index(self):
+        """Flush staged writes (Chroma persists automatically)."""
+        if hasattr(self.vectorstore, "persist"):
+            self.vectorstore.persist()
+        self.lexical_index.save()
+    
+    def _sync_lexical_index(self):
+        """Rebuild the BM25 index from the vector store if it is missing chunks."""
+        indexed_ids = {
+            chunk_id
+            for entry in self.manifest.documents.values()
+            for chunk_id in entry["chunk_ids"]
+        }
+        if indexed_ids == set(self.lexical_index.ids()):
+            return
+        print("Rebuilding BM25 lexical index from the vector store.")
+        stored = self.vectorstore.get(include=["documents", "metadatas"])
+        self.lexical_index.delete(self.lexical_index.ids())
+        self.lexical_index.add(stored["ids"], stored["documents"], stored["metadatas"])
+        self.lexical_index.save()
+    
+    def _drop_untracked_chunks(self):
+        """Remove chunks from indexes built before the manifest existed."""
+        if self.manifest.documents:
+            return
+        existing_ids = self.vectorstore.get(include=[])["ids"]
+        if existing_ids:
+            print(f"Removing {len(existing_ids)} untracked chunks from legacy index.")
+            self._delete_chunks(existing_ids)
+            self._persist_index()
+    
+    def refresh_vector_store(self, force: bool = False, only_missing: bool = False) -> Dict[str, int]:
+        """Incrementally sync the vector store with the configured IRS guides.
+        
+        Only documents whose checksum, chunker settings or embedding model changed
+        are re-chunked and re-embedded; guides no longer configured are removed.
+        """
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "failed": 0}
+        self._drop_untracked_chunks()
+        
+        configured = {guide["url"] for guide in IRS_GUIDES}
+        for source in self.manifest.sources():
+            if source not in configured:
+                self._delete_chunks(self.manifest.remove(source))
+                stats["removed"] += 1
+        self._persist_index()
         
-        text = ""
-        images = convert_from_path(pdf_path)
-        for image in images:
-            text += pytesseract.image_to_string(image)
-        return text
+        guides = IRS_GUIDES
+        if only_missing:
+            guides = [guide for guide in IRS_GUIDES if self.manifest.get(guide["url"]) is None]
+        
+        for guide, pdf_bytes in self._fetch_guides(guides):
+            source = guide["url"]
+            checksum = hashlib.sha256(pdf_bytes).hexdigest()
+            if not force and self.manifest.is_current(
+                source, checksum, self.chunker_settings, self.embedding_model
+            ):
+                stats["unchanged"] += 1
+                continue
+            
+            try:
+                documents = self._chunk_guide(guide, pdf_bytes)
+                ids = self._chunk_ids(source, checksum, len(documents))
+                self._add_documents(documents, ids)
+                
+                # Delete chunks from the previous version of this document
+                previous = self.manifest.get(source)
+                stale_ids = set(previous["chunk_ids"]) - set(ids) if previous else set()
+                self._delete_chunks(sorted(stale_ids))
+                self._persist_index()
+                
+                self.manifest.record(
+                    source, guide["title"], checksum,
+                    self.chunker_settings, self.embedding_model, ids
+                )
+                self.manifest.save()
+                stats["updated" if previous else "added"] += 1
+            except Exception as e:
+                print(f"Error processing {guide['title']}: {str(e)}")
+                stats["failed"] += 1
+        
+        self.manifest.save()
+        self.result_cache.clear()
+        self.build_form_contexts()
+        return stats
     
     def build_vector_store(self):
-        """Build the vector store from IRS guides."""
-        # Check if vector store already exists
-        if os.path.exists(self.persist_directory):
-            print("Vector store already exists. Skipping rebuild.")
+        """Build the vector store from IRS guides, indexing only guides not yet present."""
+        if all(self.manifest.get(guide["url"]) for guide in IRS_GUIDES):
+            print("Vector store is up to date. Run `python rag_handler.py --refresh` to check for updated guides.")
+            self._sync_lexical_index()
+            if not self._form_contexts_current():
+                self.build_form_contexts()
             return
         
-        # Download and process IRS guides
-        documents = self.download_irs_guides()
+        stats = self.refresh_vector_store(only_missing=True)
+        print(f"Vector store build finished: {stats}")
+    
+    def _index_version(self) -> int:
+        """Current index version, picking up refreshes made by other processes."""
+        if self.manifest.reload_if_changed():
+            if hasattr(self.vectorstore, "reload"):
+                self.vectorstore.reload()
+            self.lexical_index.load()
+            self.result_cache.clear()
+        return self.manifest.version
+    
+    def _embed_query(self, query: str) -> List[float]:
+        key = (self.embedding_model, query)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(query)
+            self.embedding_cache.put(key, embedding)
+        return embedding
+    
+    def search(self, query: str, k: int = 3, mode: Optional[str] = None) -> List:
+        """Top-k retrieval, memoized by normalized query, k, mode and index version.
         
-        # Add documents to vector store
-        texts = [doc["text"] for doc in documents]
-        metadatas = [doc["metadata"] for doc in documents]
+        ``mode`` is "vector" (embedding similarity), "lexical" (BM25 only; never
+        touches the embedding model) or "hybrid" (reciprocal-rank fusion of both).
+        """
+        mode = (mode or self.retrieval_mode).lower()
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unsupported retrieval mode: {mode}")
         
-        self.vectorstore.add_texts(
-            texts=texts,
-            metadatas=metadatas
+        normalized = " ".join(query.lower().split())
+        key = (normalized, k, mode, self._index_version())
+        docs = self.result_cache.get(key)
+        if docs is None:
+            if mode == "lexical":
+                docs = [doc for doc, _ in self.lexical_index.search(normalized, k)]
+            elif mode == "hybrid":
+                docs = self._hybrid_search(normalized, k)
+            else:
+                docs = self.vectorstore.similarity_search_by_vector(self._embed_query(normalized), k=k)
+            self.result_cache.put(key, docs)
+        return docs
+    
+    def _hybrid_search(self, query: str, k: int) -> List:
+        """Fuse vector and BM25 rankings with weighted reciprocal-rank fusion."""
+        candidates = k * 4
+        rankings = (
+            (self.hybrid_weight,
+             self.vectorstore.similarity_search_by_vector(self._embed_query(query), k=candidates)),
+            (1 - self.hybrid_weight,
+             [doc for doc, _ in self.lexical_index.search(query, candidates)])
         )
         
-        # Persist the vector store
-        self.vectorstore.persist()
+        scores, docs_by_key = {}, {}
+        for weight, docs in rankings:
+            for rank, doc in enumerate(docs, 1):
+                key = (doc.metadata.get("source"), doc.metadata.get("chunk"))
+                docs_by_key.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + weight / (RRF_K + rank)
+        
+        return [docs_by_key[key] for key in heapq.nlargest(k, scores, key=scores.get)]
     
-    def get_relevant_context(self, query: str, k: int = 3) -> str:
-        """Retrieve relevant context from IRS guides."""
-        docs = self.vectorstore.similarity_search(query, k=k)
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit-rate metrics for the query embedding and result caches."""
+        return {
+            "index_version": self.manifest.version,
+            "embeddings": self.embedding_cache.stats(),
+            "results": self.result_cache.stats()
+        }
+    
+    def _assemble_context(self, docs: List, k: int) -> str:
+        """Assemble retrieved chunks into a prompt block and record token savings."""
+        context, stats = self.context_assembler.assemble(docs, k)
+        self.last_context_stats = stats
+        self.context_totals["calls"] += 1
+        for key in ("baseline_tokens", "context_tokens", "tokens_saved"):
+            self.context_totals[key] += stats[key]
+        return context
+    
+    def get_relevant_context(self, query: str, k: int = 3, mode: Optional[str] = None) -> str:
+        """Retrieve relevant context from IRS guides.
+        
+        Twice as many candidates as needed are retrieved so the assembler can
+        choose k diverse chunks and trim them to the token budget.
+        """
+        return self._assemble_context(self.search(query, k=k * 2, mode=mode), k)
+    
+    def context_stats(self) -> Dict[str, Any]:
+        """Token totals for assembled contexts and the most recent assembly."""
+        return {
+            "token_budget": self.context_assembler.token_budget,
+            "totals": dict(self.context_totals),
+            "last": self.last_context_stats
+        }
+    
+    def _load_form_contexts(self):
+        """Load the stored bundles, again whenever another process rewrote them."""
+        try:
+            mtime = os.path.getmtime(self.form_contexts_path)
+        except OSError:
+            return
+        if mtime == self.form_contexts_mtime:
+            return
+        with open(self.form_contexts_path, "r") as f:
+            form_contexts = json.load(f)
+        self.form_contexts_mtime = mtime
+        if form_contexts.get("version") == FORM_CONTEXT_VERSION:
+            self.form_contexts = form_contexts
+    
+    def _form_contexts_current(self) -> bool:
+        self._load_form_contexts()
+        return (
+            self.form_contexts is not None
+            and self.form_contexts["index_version"] == self._index_version()
+        )
+    
+    def build_form_contexts(self, k: int = 2):
+        """Precompute the guide context bundle for every supported form type.
         
-        # Format the context
-        context = "Relevant IRS Tax Guide Information:\n\n"
-        for i, doc in enumerate(docs, 1):
-            context += f"Source {i} ({doc.metadata['title']}):\n"
-            context += doc.page_content + "\n\n"
+        The bundle's chunks are stored with it so per-document retrieval can
+        add its own chunks under the same header and token budget.
+        """
+        contexts, documents = {}, {}
+        for form_type, queries in FORM_CONTEXT_QUERIES.items():
+            docs, seen = [], set()
+            for query in queries:
+                for doc in self.search(query, k=k):
+                    key = (doc.metadata.get("source"), doc.metadata.get("chunk"))
+                    if key not in seen:
+                        seen.add(key)
+                        docs.append(doc)
+            contexts[form_type] = self._assemble_context(docs, len(docs))
+            documents[form_type] = [{"text": doc.page_content, "metadata": doc.metadata} for doc in docs]
         
-        return context
+        self.form_contexts = {
+            "version": FORM_CONTEXT_VERSION,
+            "index_version": self.manifest.version,
+            "contexts": contexts,
+            "documents": documents
+        }
+        os.makedirs(self.index_directory, exist_ok=True)
+        temp_path = self.form_contexts_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.form_contexts, f, indent=2)
+        os.replace(temp_path, self.form_contexts_path)
+        self.form_contexts_mtime = os.path.getmtime(self.form_contexts_path)
+    
+    def get_form_context(self, form_type: str, text: Optional[str] = None, k: int = 3) -> str:
+        """Return the precomputed guide context for a form type.
+        
+        With ``text``, chunks retrieved for the document join the bundle's in a
+        single assembled context. Bundles are built at startup and by
+        ``python rag_handler.py --refresh``, never while serving a request; until
+        a rebuild, the latest stored bundles are used.
+        """
+        self._load_form_contexts()
+        if self.form_contexts is None:
+            return self.get_relevant_context(text, k=k) if text else ""
+        form_type = form_type.upper()
+        if not text:
+            return self.form_contexts["contexts"].get(form_type, "")
+        
+        bundle = [
+            Document(page_content=doc["text"], metadata=doc["metadata"])
+            for doc in self.form_contexts["documents"].get(form_type, [])
+        ]
+        seen = {(doc.metadata.get("source"), doc.metadata.get("chunk")) for doc in bundle}
+        retrieved = [
+            doc for doc in self.search(text, k=k * 2)
+            if (doc.metadata.get("source"), doc.metadata.get("chunk")) not in seen
+        ]
+        return self._assemble_context(bundle + retrieved, len(bundle) + k)
 
 # Initialize RAG handler
-rag_handler = TaxGuideRAG() 
\ No newline at end of file
+rag_handler = TaxGuideRAG()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the IRS tax guide vector store.")
+    parser.add_argument("--refresh", action="store_true", help="Re-index guides whose content or settings changed")
+    parser.add_argument("--force", action="store_true", help="Re-embed every guide even if unchanged")
+    parser.add_argument("--mirror", help="Directory of local IRS PDFs to index instead of downloading")
+    parser.add_argument("--form-contexts", action="store_true", help="Rebuild only the per-form-type context bundles")
+    args = parser.parse_args()
+    
+    if args.mirror:
+        rag_handler.mirror_dir = args.mirror
+    
+    if args.form_contexts:
+        rag_handler.build_form_contexts()
+    elif args.refresh or args.force:
+        print(rag_handler.refresh_vector_store(force=args.force))
+    else:
+        rag_handler.build_vector_store()
@@ -0,0 +1,259 @@
+let conversationId = "default";
+let parsedForms = {};
+let filesToUpload = [];
+
+function autoResize(textarea) {
+    textarea.style.height = 'auto';
+    textarea.style.height = textarea.scrollHeight + 'px';
+}
+
+function createFormTypeSelect() {
+    const select = document.createElement('select');
+    select.className = 'form-type-select';
+    select.innerHTML = `
+        <option value="W-2">W-2</option>
+        <option value="1099-NEC">1099-NEC</option>
+        <option value="1099-INT">1099-INT</option>
+        <option value="1099-DIV">1099-DIV</option>
+        <option value="1099-B">1099-B</option>
+        <option value="1099-R">1099-R</option>
+        <option value="1099-MISC">1099-MISC</option>
+    `;
+    return select;
+}
+
+function addFileToList(file) {
+    const fileList = document.getElementById('file-list');
+    const fileItem = document.createElement('div');
+    fileItem.className = 'file-item';
+
+    const fileName = document.createElement('div');
+    fileName.className = 'file-name';
+    fileName.textContent = file.name;
+
+    const formTypeSelect = createFormTypeSelect();
+
+    const removeButton = document.createElement('button');
+    removeButton.className = 'remove-file';
+    removeButton.textContent = '×';
+    removeButton.onclick = () => {
+        fileItem.remove();
+        filesToUpload = filesToUpload.filter(f => f !== file);
+    };
+
+    fileItem.appendChild(fileName);
+    fileItem.appendChild(formTypeSelect);
+    fileItem.appendChild(removeButton);
+
+    fileList.appendChild(fileItem);
+    filesToUpload.push(file);
+}
+
+document.getElementById('file-input').addEventListener('change', function(e) {
+    const fileList = document.getElementById('file-list');
+    fileList.innerHTML = ''; // Clear existing files
+    filesToUpload = []; // Reset files array
+
+    Array.from(e.target.files).forEach(file => {
+        addFileToList(file);
+    });
+});
+
+async function uploadForm(event) {
+    event.preventDefault();
+
+    if (filesToUpload.length === 0) {
+        alert('Please select at least one file');
+        return;
+    }
+
+    const uploadButton = document.querySelector('.upload-button');
+    const originalButtonText = uploadButton.textContent;
+
+    // Show loading state
+    uploadButton.classList.add('loading');
+    uploadButton.disabled = true;
+    uploadButton.innerHTML = `
+        <div class="loading-spinner"></div>
+        Uploading...
+    `;
+
+    try {
+        for (const file of filesToUpload) {
+            const fileItem = Array.from(document.querySelectorAll('.file-item')).find(
+                item => item.querySelector('.file-name').textContent === file.name
+            );
+            const formType = fileItem.querySelector('.form-type-select').value;
+
+            const formData = new FormData();
+            formData.append('file', file);
+            formData.append('form_type', formType);
+            formData.append('conversation_id', conversationId);
+
+            const response = await fetch('/parse-tax-form', {
+                method: 'POST',
+                body: formData
+            });
+
+            const data = await response.json();
+
+            // Store form data
+            const formId = Date.now() + Math.random().toString(36).substr(2, 9);
+            parsedForms[formId] = { type: formType, data: data };
+
+            // Display parsed form data
+            displayParsedForm(formId, formType, data);
+        }
+
+        // Clear file input and list
+        document.getElementById('file-input').value = '';
+        document.getElementById('file-list').innerHTML = '';
+        filesToUpload = [];
+
+    } catch (error) {
+        console.error('Error:', error);
+        alert('Error uploading files. Please try again.');
+    } finally {
+        // Reset button state
+        uploadButton.classList.remove('loading');
+        uploadButton.disabled = false;
+        uploadButton.textContent = originalButtonText;
+    }
+}
+
+function displayParsedForm(formId, formType, data) {
+    const parsedForms = document.getElementById('parsed-forms');
+    const formCard = document.createElement('div');
+    formCard.className = 'form-card';
+    formCard.id = `form-${formId}`;
+
+    let html = `
+        <h3>
+            ${formType}
+            <button class="delete-form" onclick="deleteForm('${formId}')">×</button>
+        </h3>
+        <div class="form-data">
+    `;
+
+    for (const [key, value] of Object.entries(data)) {
+        // Underscore keys (e.g. _confidence) are metadata, not form fields
+        if (key.startsWith('_')) continue;
+        html += `
+            <div class="data-item">
+                <div class="data-label">${key.replace(/_/g, ' ').toUpperCase()}</div>
+                <div class="data-value">${value}</div>
+            </div>
+        `;
+    }
+
+    html += '</div>';
+    formCard.innerHTML = html;
+    parsedForms.appendChild(formCard);
+}
+
+function deleteForm(formId) {
+    // Remove from DOM
+    const formElement = document.getElementById(`form-${formId}`);
+    if (formElement) {
+        formElement.remove();
+    }
+
+    // Remove from storage
+    delete parsedForms[formId];
+}
+
+async function sendMessage() {
+    const input = document.getElementById('chat-input');
+    const sendButton = document.getElementById('send-button');
+    const message = input.value.trim();
+    if (!message) return;
+
+    // Disable input and button while processing
+    input.classList.add('input-disabled');
+    sendButton.disabled = true;
+
+    // Add user message to chat
+    const chatContainer = document.getElementById('chat-container');
+    chatContainer.innerHTML += `
+        <div class="message user-message">
+            ${message}
+        </div>
+    `;
+
+    // Show typing indicator
+    chatContainer.innerHTML += `
+        <div class="typing-indicator" id="typing-indicator">
+            <div class="typing-dot"></div>
+            <div class="typing-dot"></div>
+            <div class="typing-dot"></div>
+        </div>
+    `;
+
+    // Clear input and reset height
+    input.value = '';
+    input.style.height = 'auto';
+
+    try {
+        // Get all parsed forms data
+        const parsedFormsData = {};
+        for (const [formId, formData] of Object.entries(parsedForms)) {
+            parsedFormsData[formId] = formData;
+        }
+
+        const response = await fetch('/tax-guidance', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ 
+                message: message,
+                conversation_id: conversationId,
+                parsed_forms: parsedFormsData
+            })
+        });
+
+        const data = await response.json();
+
+        // Update conversation ID if provided
+        if (data.conversation_id) {
+            conversationId = data.conversation_id;
+        }
+
+        // Remove typing indicator
+        document.getElementById('typing-indicator').remove();
+
+        // Add bot response to chat
+        chatContainer.innerHTML += `
+            <div class="message bot-message">
+                ${data.response}
+            </div>
+        `;
+
+        // Scroll to bottom
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    } catch (error) {
+        console.error('Error:', error);
+        document.getElementById('typing-indicator').remove();
+        chatContainer.innerHTML += `
+            <div class="message bot-message">
+                Sorry, there was an error processing your request. Please try again.
+            </div>
+        `;
+    } finally {
+        // Re-enable input and button
+        input.classList.remove('input-disabled');
+        sendButton.disabled = false;
+        input.focus();
+    }
+}
+
+// Allow sending message with Enter key
+document.getElementById('chat-input').addEventListener('keypress', function(e) {
+    if (e.key === 'Enter' && !e.shiftKey) {
+        e.preventDefault();
+        sendMessage();
+    }
+});
+
+// Handle form upload
+document.getElementById('upload-form').addEventListener('submit', uploadForm);
@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# Hashed assets never change under the same URL
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# The page itself is revalidated on every load so new asset hashes are picked up
+REVALIDATE_CACHE = "no-cache"
+
+INDEX_PAGE = "index.html"
+
+
+def _brotli_available() -> bool:
+    try:
+        import brotli  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class Asset:
+    """One static file with its precompressed encodings and ETags."""
+
+    __slots__ = ("name", "media_type", "digest", "cache_control", "bodies")
+
+    def __init__(self, name: str, data: bytes, media_type: str, cache_control: str, use_brotli: bool):
+        self.name = name
+        self.media_type = media_type
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        self.cache_control = cache_control
+        self.bodies: Dict[str, bytes] = {"identity": data}
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            self.bodies["gzip"] = compressed
+        if use_brotli:
+            import brotli
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data):
+                self.bodies["br"] = compressed
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+
+class StaticAssets:
+    """Web UI assets, content-hashed and precompressed once at startup.
+
+    Every file in ``directory`` except the index page is served under
+    ``/static/<stem>.<hash><suffix>`` with a one-year immutable cache header.
+    ``{{name}}`` placeholders in the index page are replaced with those hashed
+    URLs, so a deploy only invalidates the files that changed. Responses pick
+    the smallest encoding the client accepts (brotli when the ``brotli``
+    package is installed, then gzip) and answer matching If-None-Match
+    requests with 304.
+    """
+
+    def __init__(self, directory: str = "static"):
+        self.directory = Path(directory)
+        self.use_brotli = _brotli_available()
+        self.assets: Dict[str, Asset] = {}
+        self.index: Optional[Asset] = None
+        self.build()
+
+    def build(self):
+        assets, urls = {}, {}
+        for path in sorted(self.directory.iterdir()):
+            if not path.is_file() or path.name == INDEX_PAGE:
+                continue
+            media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            asset = Asset(path.name, path.read_bytes(), media_type, IMMUTABLE_CACHE, self.use_brotli)
+            hashed_name = f"{path.stem}.{asset.digest}{path.suffix}"
+            assets[hashed_name] = asset
+            urls[path.name] = f"/static/{hashed_name}"
+
+        page = (self.directory / INDEX_PAGE).read_text()
+        for name, url in urls.items():
+            page = page.replace("{{" + name + "}}", url)
+        self.index = Asset(INDEX_PAGE, page.encode(), "text/html; charset=utf-8", REVALIDATE_CACHE, self.use_brotli)
+        self.assets = assets
+
+    def get(self, hashed_name: str) -> Optional[Asset]:
+        return self.assets.get(hashed_name)
+
+    def _encoding(self, asset: Asset, accept_encoding: str) -> str:
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in asset.bodies and encoding in accepted:
+                return encoding
+        return "identity"
+
+    def response(self, asset: Asset, request: Request) -> Response:
+        encoding = self._encoding(asset, request.headers.get("accept-encoding", ""))
+        headers = {
+            "ETag": asset.etag(encoding),
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding"
+        }
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match:
+            # Any representation of the same content is still valid for the client
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or tags & {asset.etag(name) for name in asset.bodies}:
+                return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=asset.bodies[encoding], media_type=asset.media_type, headers=headers)
+
+
+# Initialize static assets
+static_assets = StaticAssets(os.getenv("STATIC_DIR", os.path.join(os.path.dirname(__file__), "static")))
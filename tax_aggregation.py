@@ -0,0 +1,280 @@
+import html
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from form_schemas import normalize_form_fields, parse_money_cents
+
+# 2024 Social Security wage base and employee rate; withholding above
+# RATE * BASE across several employers is refundable as excess Social Security
+# tax (over-withholding by a single employer is not)
+SOCIAL_SECURITY_WAGE_BASE_CENTS = 168_600_00
+SOCIAL_SECURITY_RATE = 0.062
+
+# Totals summed across forms: name -> (label, [(form type or None for any, field)])
+TOTALS = {
+    "wages": ("Wages, tips, other compensation (W-2 box 1)", [("W-2", "wages_tips_other")]),
+    "federal_withholding": ("Federal income tax withheld", [(None, "federal_income_tax")]),
+    "social_security_wages": ("Social Security wages", [("W-2", "social_security_wages")]),
+    "social_security_tax": ("Social Security tax withheld", [("W-2", "social_security_tax")]),
+    "medicare_wages": ("Medicare wages", [("W-2", "medicare_wages")]),
+    "medicare_tax": ("Medicare tax withheld", [("W-2", "medicare_tax")]),
+    "state_withholding": ("State income tax withheld", [
+        ("W-2", "state_income_tax"), (None, "state_tax_withheld")
+    ]),
+    "local_withholding": ("Local income tax withheld", [
+        ("W-2", "local_income_tax"), (None, "local_tax_withheld")
+    ]),
+    "nonemployee_compensation": ("Nonemployee compensation (1099-NEC/MISC)", [
+        ("1099-NEC", "nonemployee_compensation"), ("1099-MISC", "nonemployee_compensation")
+    ]),
+    "misc_income": ("Rents, royalties and other income (1099-MISC)", [
+        ("1099-MISC", "rents"), ("1099-MISC", "royalties"), ("1099-MISC", "other_income")
+    ]),
+    "interest": ("Interest income (1099-INT)", [("1099-INT", "interest_income")]),
+    "early_withdrawal_penalty": ("Early withdrawal penalty (1099-INT)", [("1099-INT", "early_withdrawal_penalty")]),
+    "ordinary_dividends": ("Ordinary dividends (1099-DIV)", [("1099-DIV", "ordinary_dividends")]),
+    "qualified_dividends": ("Qualified dividends (1099-DIV)", [("1099-DIV", "qualified_dividends")]),
+    "capital_gain_distributions": ("Capital gain distributions (1099-DIV)", [("1099-DIV", "capital_gain_distributions")]),
+    "retirement_distributions": ("Gross retirement distributions (1099-R)", [("1099-R", "gross_distribution")]),
+    "taxable_retirement_distributions": ("Taxable retirement distributions (1099-R)", [("1099-R", "taxable_amount")]),
+    "broker_proceeds": ("Broker sale proceeds (1099-B)", [("1099-B", "proceeds")]),
+    "broker_cost_basis": ("Cost basis of sales (1099-B)", [("1099-B", "cost_basis")]),
+    "wash_sale_loss_disallowed": ("Wash sale loss disallowed (1099-B)", [("1099-B", "wash_sale_loss_disallowed")]),
+}
+
+DERIVED_LABELS = {
+    "capital_gain": "Net gain or loss on sales (proceeds - basis + wash sale adjustment)",
+    "total_income": "Total income reported on forms",
+    "payroll_taxes": "Social Security and Medicare tax withheld",
+    "total_withholding": "Total income tax withheld (federal, state and local)",
+    "excess_social_security": "Excess Social Security tax withheld (multiple employers)",
+}
+
+# Totals each derived figure is computed from
+DERIVED_INPUTS = {
+    "capital_gain": ["broker_proceeds", "broker_cost_basis"],
+    "total_income": [
+        "wages", "nonemployee_compensation", "misc_income", "interest", "ordinary_dividends",
+        "capital_gain_distributions", "taxable_retirement_distributions", "capital_gain"
+    ],
+    "payroll_taxes": ["social_security_tax", "medicare_tax"],
+    "total_withholding": ["federal_withholding", "state_withholding", "local_withholding"],
+}
+# Derived figures only known once every input is (a gain needs proceeds and basis)
+COMPLETE_INPUTS = {"capital_gain"}
+
+# Questions that ask for one of the totals: (pattern, total name). Checked in order
+QUESTION_TOTALS = [
+    (r"excess social security", "excess_social_security"),
+    (r"social security (?:tax|withh)", "social_security_tax"),
+    (r"social security wages", "social_security_wages"),
+    (r"medicare (?:tax|withh)", "medicare_tax"),
+    (r"medicare wages", "medicare_wages"),
+    (r"payroll tax|fica", "payroll_taxes"),
+    (r"state (?:income )?tax|state withh", "state_withholding"),
+    (r"local (?:income )?tax|local withh", "local_withholding"),
+    (r"federal (?:income )?tax|federal withh", "federal_withholding"),
+    (r"total withh|all withh|tax(?:es)? withheld|withholding", "total_withholding"),
+    (r"qualified dividend", "qualified_dividends"),
+    (r"capital gain distribution", "capital_gain_distributions"),
+    (r"dividend", "ordinary_dividends"),
+    (r"interest income|interest (?:earned|received)|interest did (?:i|we) (?:earn|receive|get)", "interest"),
+    (r"taxable (?:retirement|pension|ira|401)", "taxable_retirement_distributions"),
+    (r"retirement|pension|ira\b|401\(?k", "retirement_distributions"),
+    (r"nonemployee|1099-nec|self.employ|freelance|contract(?:or)? (?:income|pay)", "nonemployee_compensation"),
+    (r"rent(?:s|al)?\b|royalt", "misc_income"),
+    (r"capital gain|gain or loss|stock sales?|brokerage", "capital_gain"),
+    (r"proceeds", "broker_proceeds"),
+    (r"cost basis", "broker_cost_basis"),
+    (r"wages|salary|w-2 income", "wages"),
+    # Generic earnings span every income form, not just W-2 box 1
+    (r"total income|all (?:my )?income|income in total|how much (?:did i make|income)|\bearn", "total_income"),
+]
+QUESTION_TOTAL_PATTERNS = [(re.compile(pattern, re.IGNORECASE), name) for pattern, name in QUESTION_TOTALS]
+# "How much income ... from my business" names a source no total covers; only
+# "total"/"all" questions may mean every source at once
+INCOME_SOURCE_PATTERN = re.compile(r"\bfrom\b|\bon (?:my|the|our)\b", re.IGNORECASE)
+ALL_INCOME_PATTERN = re.compile(r"total|all (?:my )?income|income in total", re.IGNORECASE)
+# A direct answer is only given to plain "what is my total X" / "how much X" questions
+NUMERIC_QUESTION_PATTERN = re.compile(
+    r"^\s*(?:what(?:'s| is| are| was| were)|how much|show|tell me|total|sum)\b", re.IGNORECASE
+)
+# "What is ..." must be about the user's own figures; "what is excess Social Security?" wants an explanation
+DEFINITION_QUESTION_PATTERN = re.compile(r"^\s*what", re.IGNORECASE)
+OWN_FIGURES_PATTERN = re.compile(r"\b(?:my|i|me|our|we)\b", re.IGNORECASE)
+# Anything asking for advice, explanation or a what-if goes to the model, as do
+# amounts the user paid (mortgage or student loan interest), which no form here reports
+ADVICE_PATTERN = re.compile(
+    r"\b(?:should|why|can i|could|would|explain|deduct|owe|refund|if i|plan|strategy|"
+    r"reduce|avoid|report|file|form \d|where|when|which|compare|versus|vs|pay|paid|pays|paying)\b",
+    re.IGNORECASE
+)
+# Totals cover the uploaded forms only; a question about a specific year may mean another one
+YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b")
+
+
+def format_cents(cents: int) -> str:
+    """Integer cents as a dollar string, e.g. -123456 -> "-$1,234.56"."""
+    sign = "-" if cents < 0 else ""
+    dollars, remainder = divmod(abs(cents), 100)
+    return f"{sign}${dollars:,}.{remainder:02d}"
+
+
+class TaxAggregator:
+    """Exact totals over a conversation's parsed forms.
+
+    Money fields are parsed to integer cents and summed per total, so the
+    guidance prompt can quote precomputed figures instead of asking the
+    model to add up raw OCR strings, and plain "how much" questions about
+    those figures can be answered without a model call at all. Values that
+    do not parse as amounts are skipped and listed under ``unparsed``.
+    """
+
+    def aggregate(self, forms: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Totals (in cents) over ``(form_type, fields)`` pairs."""
+        totals = {name: 0 for name in TOTALS}
+        sources: Dict[str, List[Tuple[str, str, int]]] = {name: [] for name in TOTALS}
+        counts: Dict[str, int] = {}
+        unparsed: List[Tuple[str, str, str]] = []
+        social_security_by_employer: Dict[str, int] = {}
+        for form_type, data in forms:
+            form_type = str(form_type or data.get("form_type") or "").upper()
+            data = normalize_form_fields(data)
+            counts[form_type] = counts.get(form_type, 0) + 1
+            issuer = str(data.get("employer_ein") or data.get("payer_name") or f"{form_type} #{counts[form_type]}").strip()
+            for name, (_, fields) in TOTALS.items():
+                for total_form, field in fields:
+                    if total_form not in (None, form_type) or field not in data:
+                        continue
+                    value = data[field]
+                    if value in (None, ""):
+                        continue
+                    cents = parse_money_cents(value)
+                    if cents is None:
+                        unparsed.append((form_type, field, str(value)))
+                        continue
+                    if name == "broker_cost_basis":
+                        # Basis is never negative; parentheses are OCR noise here
+                        cents = abs(cents)
+                    totals[name] += cents
+                    sources[name].append((form_type, issuer, cents))
+            # Employers are told apart by EIN; a W-2 without one could be a copy of another
+            employer = re.sub(r"\D", "", str(data.get("employer_ein") or ""))
+            if form_type == "W-2" and employer:
+                social_security_by_employer[employer] = (
+                    social_security_by_employer.get(employer, 0)
+                    + (parse_money_cents(data.get("social_security_tax")) or 0)
+                )
+
+        derived = {
+            "capital_gain": totals["broker_proceeds"] - totals["broker_cost_basis"] + totals["wash_sale_loss_disallowed"],
+            "total_income": (
+                totals["wages"] + totals["nonemployee_compensation"] + totals["misc_income"]
+                + totals["interest"] + totals["ordinary_dividends"] + totals["capital_gain_distributions"]
+                + totals["taxable_retirement_distributions"]
+            ),
+            "payroll_taxes": totals["social_security_tax"] + totals["medicare_tax"],
+            "total_withholding": totals["federal_withholding"] + totals["state_withholding"] + totals["local_withholding"],
+            "excess_social_security": 0,
+        }
+        # Each employer's withholding counts up to the limit; only the sum across
+        # several employers can exceed it
+        if len(social_security_by_employer) > 1:
+            limit = round(SOCIAL_SECURITY_WAGE_BASE_CENTS * SOCIAL_SECURITY_RATE)
+            creditable = sum(min(cents, limit) for cents in social_security_by_employer.values())
+            derived["excess_social_security"] = max(0, creditable - limit)
+        # Income from sales is only known once basis is; a 1099-B without it is left out
+        if sources["broker_proceeds"] and sources["broker_cost_basis"]:
+            derived["total_income"] += derived["capital_gain"]
+        return {
+            "forms": counts, "totals": totals, "derived": derived, "sources": sources,
+            "unparsed": unparsed, "social_security_employers": len(social_security_by_employer)
+        }
+
+    def prompt_facts(self, summary: Dict[str, Any]) -> str:
+        """Compact fact lines for the guidance prompt; empty when there are no forms."""
+        if not summary["forms"]:
+            return ""
+        forms = ", ".join(f"{count} {form_type}" for form_type, count in sorted(summary["forms"].items()))
+        lines = [f"Forms: {forms}"]
+        for name, (label, _) in TOTALS.items():
+            if summary["sources"][name]:
+                lines.append(f"{label}: {format_cents(summary['totals'][name])}")
+        for name, label in DERIVED_LABELS.items():
+            if self._has_figure(summary, name):
+                lines.append(f"{label}: {format_cents(summary['derived'][name])}")
+        if summary["unparsed"]:
+            lines.append("Unreadable amounts (not included): " + self._unparsed_text(summary["unparsed"]))
+        return "\n".join(lines)
+
+    def _unparsed_text(self, unparsed: List[Tuple[str, str, str]]) -> str:
+        return "; ".join(f"{form_type} {field}: {value}" for form_type, field, value in unparsed)
+
+    def _has_input(self, summary: Dict[str, Any], name: str) -> bool:
+        """Whether any form supplied an input to figure ``name``."""
+        if name in TOTALS:
+            return bool(summary["sources"][name])
+        return any(self._has_input(summary, total) for total in DERIVED_INPUTS[name])
+
+    def _has_figure(self, summary: Dict[str, Any], name: str) -> bool:
+        """Whether figure ``name`` is known exactly from the forms.
+
+        A derived figure needs at least one known input and no input that is
+        only partly known, so sale proceeds without their basis keep both the
+        gain and total income from being stated.
+        """
+        if name == "excess_social_security":
+            return summary["social_security_employers"] > 1
+        if name in TOTALS:
+            return bool(summary["sources"][name])
+        inputs = DERIVED_INPUTS[name]
+        if name in COMPLETE_INPUTS:
+            return all(self._has_figure(summary, total) for total in inputs)
+        if any(self._has_input(summary, total) and not self._has_figure(summary, total) for total in inputs):
+            return False
+        return any(self._has_figure(summary, total) for total in inputs)
+
+    def question_total(self, question: str) -> Optional[str]:
+        """The total a plain numeric question asks for, if it is one."""
+        if not NUMERIC_QUESTION_PATTERN.match(question):
+            return None
+        if DEFINITION_QUESTION_PATTERN.match(question) and not OWN_FIGURES_PATTERN.search(question):
+            return None
+        if ADVICE_PATTERN.search(question) or YEAR_PATTERN.search(question):
+            return None
+        for pattern, name in QUESTION_TOTAL_PATTERNS:
+            if pattern.search(question):
+                if (name == "total_income" and INCOME_SOURCE_PATTERN.search(question)
+                        and not ALL_INCOME_PATTERN.search(question)):
+                    return None
+                return name
+        return None
+
+    def answer(self, question: str, summary: Dict[str, Any]) -> Optional[str]:
+        """HTML answer to a plain numeric question about the forms, or None for the model."""
+        name = self.question_total(question)
+        if name is None or not self._has_figure(summary, name):
+            return None
+        if name in TOTALS:
+            label, amount = TOTALS[name][0], summary["totals"][name]
+        else:
+            label, amount = DERIVED_LABELS[name], summary["derived"][name]
+        response = f"<h3>{label}</h3>\n<p>Based on your uploaded forms: <strong>{format_cents(amount)}</strong></p>"
+        breakdown = summary["sources"].get(name, [])
+        if len(breakdown) > 1:
+            items = "".join(
+                f"<li>{html.escape(form_type)} ({html.escape(issuer)}): {format_cents(cents)}</li>"
+                for form_type, issuer, cents in breakdown
+            )
+            response += f"\n<ul>{items}</ul>"
+        # Derived figures can be affected by any unreadable amount
+        fields = {field for _, field in TOTALS[name][1]} if name in TOTALS else None
+        unparsed = [entry for entry in summary["unparsed"] if fields is None or entry[1] in fields]
+        if unparsed:
+            unreadable = html.escape(self._unparsed_text(unparsed))
+            response += f"\n<p>Some amounts could not be read and are not included: {unreadable}</p>"
+        return response
+
+
+# Initialize tax aggregator
+tax_aggregator = TaxAggregator()
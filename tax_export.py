@@ -1,131 +1,66 @@
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator, List, Optional
 import csv
+import io
+import uuid
 from datetime import datetime
+from form_schemas import (
+    CHECKBOX_FIELDS, MONEY_FIELDS, form_fields, normalize_form_fields, parse_money_cents
+)
+from field_mappings import MappingRegistry, mapping_registry
+
+# Rows buffered per chunk when streaming bulk CSV exports
+BULK_EXPORT_ROWS_PER_CHUNK = 500
+
+# Rows per Arrow record batch when writing Parquet datasets
+PARQUET_BATCH_ROWS = 10000
 
 class TaxSoftwareExport:
-    def __init__(self):
-        self.proseries_mappings = {
-            "W-2": {
-                "employee_ssn": "SSN",
-                "employer_ein": "EIN",
-                "wages_tips_other": "Wages",
-                "federal_income_tax": "FederalWithholding",
-                "social_security_wages": "SocialSecurityWages",
-                "social_security_tax": "SocialSecurityWithheld",
-                "medicare_wages": "MedicareWages",
-                "medicare_tax": "MedicareWithheld",
-                "social_security_tips": "SocialSecurityTips",
-                "allocated_tips": "AllocatedTips",
-                "dependent_care_benefits": "DependentCareBenefits",
-                "nonqualified_plans": "NonqualifiedPlans",
-                "statutory_employee": "StatutoryEmployee",
-                "retirement_plan": "RetirementPlan",
-                "third_party_sick_pay": "ThirdPartySickPay",
-                "state": "State",
-                "state_id": "StateID",
-                "state_wages": "StateWages",
-                "state_income_tax": "StateWithholding",
-                "local_wages": "LocalWages",
-                "local_income_tax": "LocalWithholding",
-                "locality_name": "LocalityName"
-            },
-            "1099-NEC": {
-                "payer_name": "PayerName",
-                "payer_address": "PayerAddress",
-                "payer_tin": "PayerTIN",
-                "recipient_name": "RecipientName",
-                "recipient_address": "RecipientAddress",
-                "recipient_tin": "RecipientTIN",
-                "nonemployee_compensation": "NonemployeeCompensation",
-                "federal_income_tax": "FederalWithholding",
-                "state": "State",
-                "state_income": "StateIncome",
-                "state_tax_withheld": "StateWithholding",
-                "local_income": "LocalIncome",
-                "local_tax_withheld": "LocalWithholding"
-            }
-        }
-        
-        self.lacerte_mappings = {
-            "W-2": {
-                "employee_ssn": "SSN",
-                "employer_ein": "EIN",
-                "wages_tips_other": "Wages",
-                "federal_income_tax": "FederalWithholding",
-                "social_security_wages": "SocialSecurityWages",
-                "social_security_tax": "SocialSecurityWithheld",
-                "medicare_wages": "MedicareWages",
-                "medicare_tax": "MedicareWithheld",
-                "social_security_tips": "SocialSecurityTips",
-                "allocated_tips": "AllocatedTips",
-                "dependent_care_benefits": "DependentCareBenefits",
-                "nonqualified_plans": "NonqualifiedPlans",
-                "statutory_employee": "StatutoryEmployee",
-                "retirement_plan": "RetirementPlan",
-                "third_party_sick_pay": "ThirdPartySickPay",
-                "state": "State",
-                "state_id": "StateID",
-                "state_wages": "StateWages",
-                "state_income_tax": "StateWithholding",
-                "local_wages": "LocalWages",
-                "local_income_tax": "LocalWithholding",
-                "locality_name": "LocalityName"
-            },
-            "1099-NEC": {
-                "payer_name": "PayerName",
-                "payer_address": "PayerAddress",
-                "payer_tin": "PayerTIN",
-                "recipient_name": "RecipientName",
-                "recipient_address": "RecipientAddress",
-                "recipient_tin": "RecipientTIN",
-                "nonemployee_compensation": "NonemployeeCompensation",
-                "federal_income_tax": "FederalWithholding",
-                "state": "State",
-                "state_income": "StateIncome",
-                "state_tax_withheld": "StateWithholding",
-                "local_income": "LocalIncome",
-                "local_tax_withheld": "LocalWithholding"
-            }
-        }
+    def __init__(self, registry: MappingRegistry = mapping_registry):
+        # Compiled field mappings shared by the single-form and bulk export paths
+        self.registry = registry
     
-    def export_to_proseries(self, data: Dict[str, Any], form_type: str, output_path: str):
-        """Export data to ProSeries format."""
-        if form_type not in self.proseries_mappings:
-            raise ValueError(f"Unsupported form type for ProSeries: {form_type}")
+    def _export_csv(self, data: Dict[str, Any], form_type: str, target: str, output_path: str):
+        mapping = self.registry.get(target, form_type)
         
-        # Map the data to ProSeries format
-        mapped_data = {}
-        for key, value in data.items():
-            if key in self.proseries_mappings[form_type]:
-                mapped_data[self.proseries_mappings[form_type][key]] = value
-        
-        # Create CSV file
+        # Create CSV file with the mapping's fixed column order
         with open(output_path, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=mapped_data.keys())
-            writer.writeheader()
-            writer.writerow(mapped_data)
+            writer = csv.writer(csvfile)
+            writer.writerow(mapping.columns)
+            writer.writerow(mapping.project(data))
         
         return output_path
     
+    def export_to_proseries(self, data: Dict[str, Any], form_type: str, output_path: str):
+        """Export data to ProSeries format."""
+        return self._export_csv(data, form_type, "proseries", output_path)
+    
     def export_to_lacerte(self, data: Dict[str, Any], form_type: str, output_path: str):
         """Export data to Lacerte format."""
-        if form_type not in self.lacerte_mappings:
-            raise ValueError(f"Unsupported form type for Lacerte: {form_type}")
+        return self._export_csv(data, form_type, "lacerte", output_path)
+    
+    def iter_bulk_csv(self, forms: Iterable[Dict[str, Any]], form_type: str, target: str) -> Iterator[str]:
+        """Stream many forms as one CSV with a fixed, form-type-wide column order.
         
-        # Map the data to Lacerte format
-        mapped_data = {}
-        for key, value in data.items():
-            if key in self.lacerte_mappings[form_type]:
-                mapped_data[self.lacerte_mappings[form_type][key]] = value
+        The header comes from the target mapping rather than from any single
+        record, and rows are yielded in chunks so large exports never have to be
+        held in memory.
+        """
+        mapping = self.registry.get(target, form_type)
+        project = mapping.project
         
-        # Create CSV file
-        with open(output_path, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=mapped_data.keys())
-            writer.writeheader()
-            writer.writerow(mapped_data)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(mapping.columns)
         
-        return output_path
+        for count, data in enumerate(forms, 1):
+            writer.writerow(project(data))
+            if count % BULK_EXPORT_ROWS_PER_CHUNK == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        
+        yield buffer.getvalue()
     
     def export_to_json(self, data: Dict[str, Any], output_path: str):
         """Export data to JSON format."""
@@ -134,5 +69,74 @@ class TaxSoftwareExport:
         
         return output_path
 
+    def arrow_schema(self, form_type: str):
+        """Typed Arrow schema for a form type; money fields are int64 cents."""
+        import pyarrow as pa
+        
+        fields = [pa.field("tax_year", pa.int16()), pa.field("form_type", pa.string())]
+        for name in form_fields(form_type):
+            if name in MONEY_FIELDS:
+                fields.append(pa.field(f"{name}_cents", pa.int64()))
+            elif name in CHECKBOX_FIELDS:
+                fields.append(pa.field(name, pa.bool_()))
+            else:
+                fields.append(pa.field(name, pa.string()))
+        return pa.schema(fields)
+    
+    def _iter_record_batches(self, forms: Iterable[Dict[str, Any]], form_type: str,
+                             tax_year: int, schema) -> Iterator:
+        import pyarrow as pa
+        
+        names = form_fields(form_type)
+        columns: Dict[str, List] = {field.name: [] for field in schema}
+        rows = 0
+        for data in forms:
+            data = normalize_form_fields(data)
+            columns["tax_year"].append(int(data.get("tax_year") or tax_year))
+            columns["form_type"].append(form_type.upper())
+            for name in names:
+                value = data.get(name)
+                if name in MONEY_FIELDS:
+                    columns[f"{name}_cents"].append(parse_money_cents(value))
+                elif name in CHECKBOX_FIELDS:
+                    columns[name].append(None if value is None else bool(value))
+                else:
+                    columns[name].append(None if value is None else str(value))
+            rows += 1
+            if rows == PARQUET_BATCH_ROWS:
+                yield pa.RecordBatch.from_pydict(columns, schema=schema)
+                columns = {field.name: [] for field in schema}
+                rows = 0
+        if rows:
+            yield pa.RecordBatch.from_pydict(columns, schema=schema)
+    
+    def export_to_parquet(self, forms: Iterable[Dict[str, Any]], form_type: str, output_dir: str,
+                          tax_year: Optional[int] = None, compression: str = "zstd") -> str:
+        """Append forms to a Parquet dataset partitioned by tax year and form type.
+        
+        Rows are written in batches of PARQUET_BATCH_ROWS with compression; each
+        call adds new uniquely named files, so repeated exports append to the
+        dataset under ``tax_year=YYYY/form_type=XXX/``.
+        """
+        try:
+            import pyarrow.dataset as ds
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+        
+        schema = self.arrow_schema(form_type)
+        tax_year = tax_year or datetime.now().year - 1
+        ds.write_dataset(
+            self._iter_record_batches(forms, form_type, tax_year, schema),
+            output_dir,
+            schema=schema,
+            format="parquet",
+            partitioning=["tax_year", "form_type"],
+            partitioning_flavor="hive",
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(compression=compression)
+        )
+        return output_dir
+
 # Initialize export handler
 tax_export = TaxSoftwareExport() 
\ No newline at end of file
@@ -0,0 +1,107 @@
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+# Questions that want advice or reasoning rather than a figure go to the model;
+# "can I deduct ..." asks about eligibility, not a limit
+ADVICE_PATTERN = re.compile(
+    r"\b(?:should|would|better|worth|recommend|explain|why|compare|versus|vs\.?|"
+    r"my situation|based on my|my forms?|if i|in my case|strategy|plan|can i|deduct)\b",
+    re.IGNORECASE
+)
+YEAR_PATTERN = re.compile(r"\b20\d{2}\b")
+# Longer questions usually carry personal detail the fact table cannot use
+MAX_QUESTION_WORDS = 25
+
+
+class TaxFactRouter:
+    """Answers static tax-fact questions from a versioned local table.
+
+    Each fact lists keyword groups (regular expressions); a question matches
+    when every group has a hit, and the fact with the most groups wins, so
+    "standard deduction for head of household" picks the head-of-household
+    entry over the general one. Each fact lists the years it answers for:
+    the table's tax year, plus the filing year for deadlines. Questions
+    asking for advice, mentioning a year no matching fact covers, or
+    running long fall through to the model. Lookups and hits are counted
+    for the hit rate.
+    """
+
+    def __init__(self, path: str = "tax_facts.json"):
+        self.path = path
+        self.version = None
+        self.tax_year = None
+        self.facts: List[Dict[str, Any]] = []
+        self._lookups = 0
+        self._hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                table = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error loading tax fact table {self.path}: {str(e)}")
+            return
+        facts = []
+        for fact in table["facts"]:
+            groups = [
+                re.compile(r"\b(?:" + "|".join(group) + r")", re.IGNORECASE)
+                for group in fact["match"]
+            ]
+            facts.append({
+                "id": fact["id"],
+                "groups": groups,
+                "years": set(fact.get("years", [table["tax_year"]])),
+                "answer": fact["answer"]
+            })
+        self.version = table["version"]
+        self.tax_year = table["tax_year"]
+        self.facts = facts
+
+    def match(self, question: str) -> Optional[Dict[str, Any]]:
+        """The most specific fact answering ``question``, if it is a static-fact question."""
+        if not self.facts or len(question.split()) > MAX_QUESTION_WORDS or ADVICE_PATTERN.search(question):
+            return None
+        years = {int(year) for year in YEAR_PATTERN.findall(question)}
+        best = None
+        for fact in self.facts:
+            if not years <= fact["years"]:
+                continue
+            if all(group.search(question) for group in fact["groups"]):
+                if best is None or len(fact["groups"]) > len(best["groups"]):
+                    best = fact
+        return best
+
+    def answer(self, question: str) -> Optional[str]:
+        """HTML answer for a static-fact question, or None to ask the model."""
+        fact = self.match(question)
+        with self._lock:
+            self._lookups += 1
+            if fact is not None:
+                self._hits[fact["id"]] = self._hits.get(fact["id"], 0) + 1
+        if fact is None:
+            return None
+        return f"{fact['answer']}\n<p><em>{self.tax_year} tax year figures (fact table {self.version}).</em></p>"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = sum(self._hits.values())
+            return {
+                "version": self.version,
+                "tax_year": self.tax_year,
+                "facts": len(self.facts),
+                "lookups": self._lookups,
+                "hits": hits,
+                "hit_rate": round(hits / self._lookups, 4) if self._lookups else 0.0,
+                "hits_by_fact": dict(sorted(self._hits.items(), key=lambda item: -item[1]))
+            }
+
+
+# Initialize tax fact router
+tax_fact_router = TaxFactRouter(
+    os.getenv("TAX_FACTS_PATH", os.path.join(os.path.dirname(__file__), "tax_facts.json"))
+)
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class NumpyVectorIndex:
+    """Exact-search vector index backed by a memory-mapped .npy matrix.
+
+    Embeddings are stored L2-normalized in ``vectors.npy`` with ids, texts and
+    metadata in a JSON sidecar. The matrix is opened with ``mmap_mode="r"`` so
+    every worker process shares the same pages through the OS page cache, and a
+    query is a single matrix-vector product followed by a partial sort.
+
+    Writes are buffered in memory and applied by ``persist()``, which rewrites
+    both files atomically; readers pick up the new files via ``reload()``.
+    The matrix and its metadata are published together as one snapshot, so a
+    search running during a reload keeps using a consistent pair.
+    """
+
+    def __init__(self, directory: str, embedding_function):
+        self.directory = Path(directory)
+        self.matrix_path = self.directory / "vectors.npy"
+        self.meta_path = self.directory / "vectors_meta.json"
+        self.embedding_function = embedding_function
+        self._lock = threading.Lock()
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_meta: List[Dict] = []
+        self._deleted = set()
+        self._snapshot: Tuple[Optional[np.ndarray], Dict[str, List]] = (None, self._empty_meta())
+        self.reload()
+
+    @staticmethod
+    def _empty_meta() -> Dict[str, List]:
+        return {"ids": [], "texts": [], "metadatas": []}
+
+    def _read_files(self) -> Tuple[Optional[np.ndarray], Dict[str, List]]:
+        matrix = np.load(self.matrix_path, mmap_mode="r") if self.matrix_path.exists() else None
+        if self.meta_path.exists():
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+        else:
+            meta = self._empty_meta()
+        return matrix, meta
+
+    def reload(self, attempts: int = 3):
+        """Load the matrix and metadata from disk and publish them as one snapshot.
+
+        A writer in another process replaces the matrix before the metadata, so
+        a pair whose row counts differ is read again; if it never settles, the
+        previous snapshot stays in place.
+        """
+        with self._lock:
+            for attempt in range(attempts):
+                matrix, meta = self._read_files()
+                rows = matrix.shape[0] if matrix is not None else 0
+                if rows == len(meta["ids"]):
+                    self._snapshot = (matrix, meta)
+                    return
+                time.sleep(0.05 * (attempt + 1))
+            print(f"Vector index files in {self.directory} are out of sync; keeping the loaded index.")
+
+    @property
+    def matrix(self) -> Optional[np.ndarray]:
+        return self._snapshot[0]
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict]] = None,
+                  ids: Optional[List[str]] = None) -> List[str]:
+        """Embed texts and stage them for the next ``persist()``."""
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        vectors = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+        with self._lock:
+            self._pending_vectors.append(self._normalize(vectors))
+            for id_, text, metadata in zip(ids, texts, metadatas):
+                self._deleted.discard(id_)
+                self._pending_meta.append({"id": id_, "text": text, "metadata": metadata})
+        return ids
+
+    def delete(self, ids: List[str]):
+        """Stage ids for removal on the next ``persist()``."""
+        with self._lock:
+            self._deleted.update(ids)
+
+    def get(self, include: Optional[List[str]] = None) -> Dict[str, List]:
+        """Chroma-style ``get``; ``include`` may name "documents" and "metadatas"."""
+        meta = self._snapshot[1]
+        result = {"ids": list(meta["ids"])}
+        if include is None or "documents" in include:
+            result["documents"] = list(meta["texts"])
+        if include is None or "metadatas" in include:
+            result["metadatas"] = list(meta["metadatas"])
+        return result
+
+    def persist(self):
+        """Apply staged adds and deletes and atomically rewrite the index files."""
+        with self._lock:
+            current, meta = self._snapshot
+            pending_ids = {entry["id"] for entry in self._pending_meta}
+            keep = [
+                i for i, id_ in enumerate(meta["ids"])
+                if id_ not in self._deleted and id_ not in pending_ids
+            ]
+
+            blocks = []
+            if current is not None and keep:
+                blocks.append(np.asarray(current[keep], dtype=np.float32))
+            blocks.extend(self._pending_vectors)
+            dimension = current.shape[1] if current is not None else 0
+            if blocks:
+                matrix = np.concatenate(blocks, axis=0)
+            else:
+                matrix = np.zeros((0, dimension), dtype=np.float32)
+
+            new_meta = {
+                "ids": [meta["ids"][i] for i in keep] + [e["id"] for e in self._pending_meta],
+                "texts": [meta["texts"][i] for i in keep] + [e["text"] for e in self._pending_meta],
+                "metadatas": [meta["metadatas"][i] for i in keep] + [e["metadata"] for e in self._pending_meta]
+            }
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            temp_matrix = self.directory / "vectors.tmp.npy"
+            np.save(temp_matrix, matrix)
+            temp_meta = self.meta_path.with_suffix(".tmp")
+            with open(temp_meta, "w") as f:
+                json.dump(new_meta, f)
+            os.replace(temp_matrix, self.matrix_path)
+            os.replace(temp_meta, self.meta_path)
+
+            self._pending_vectors, self._pending_meta = [], []
+            self._deleted = set()
+            self._snapshot = (np.load(self.matrix_path, mmap_mode="r"), new_meta)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        """Exact top-k cosine similarity search."""
+        matrix, meta = self._snapshot
+        if matrix is None or matrix.shape[0] == 0:
+            return []
+
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        scores = matrix @ query
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            Document(page_content=meta["texts"][i], metadata=meta["metadatas"][i])
+            for i in top
+        ]
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k=k)